@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connects the receivers that push committed changes to streams and
+        # time the queries of every new connection
+        from . import metrics, streaming  # noqa: F401
@@ -0,0 +1,277 @@
+import os
+import time
+from datetime import timedelta
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Min
+
+from .caching import invalidate_all
+from .catalog import rebuild_catalog
+from .changes import reset_change_log
+from .columnar_store import COLUMNS, DTYPES
+from .models import ArchivedRange, StockData, StockDataArchive
+from .partitioning import (create_partition, is_partitioned, partition_name,
+                           partitions, periods)
+
+RANGES_KEY = 'stock-archive:ranges'
+ARCHIVE_COLUMNS = ['id', 'date', 'trade_code', 'high', 'low', 'open', 'close',
+                   'volume', 'seq']
+FILE_DTYPES = {'id': 'i8', 'seq': 'i8', **DTYPES}
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def _columns():
+    return ', '.join(_qn(column) for column in ARCHIVE_COLUMNS)
+
+
+def write_file(path, df):
+    """
+    Write rows as a compressed .npz with one array per symbol and column,
+    so reading one symbol only inflates that symbol's arrays.
+    """
+    df = df.sort_values(['trade_code', 'date'])
+    arrays = {}
+    for trade_code, rows in df.groupby('trade_code', sort=False):
+        prefix = quote(trade_code, safe='')
+        arrays[f'{prefix}/date'] = pd.to_datetime(rows['date']).to_numpy().astype(
+            'datetime64[D]')
+        for column, dtype in FILE_DTYPES.items():
+            arrays[f'{prefix}/{column}'] = rows[column].to_numpy().astype(dtype)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+
+def _symbol_frame(archive, prefix, columns, start_date=None, end_date=None):
+    dates = archive[f'{prefix}/date']
+    lo = np.searchsorted(dates, np.datetime64(start_date, 'D')) if start_date else 0
+    hi = (np.searchsorted(dates, np.datetime64(end_date, 'D'), side='right')
+          if end_date else len(dates))
+    frame = {'date': dates[lo:hi].astype('datetime64[ns]')}
+    for column in columns:
+        frame[column] = archive[f'{prefix}/{column}'][lo:hi]
+    return pd.DataFrame(frame)
+
+
+def read_file(path, trade_code, start_date=None, end_date=None):
+    """One symbol's rows of an archive file, shaped like timeseries.load_frame."""
+    prefix = quote(trade_code, safe='')
+    with np.load(path) as archive:
+        if f'{prefix}/date' not in archive.files:
+            return None
+        return _symbol_frame(archive, prefix, COLUMNS, start_date, end_date)
+
+
+def read_file_rows(path):
+    """Every row of an archive file, with all of ARCHIVE_COLUMNS."""
+    with np.load(path) as archive:
+        prefixes = sorted({name.rsplit('/', 1)[0] for name in archive.files})
+        frames = [_symbol_frame(archive, prefix, list(FILE_DTYPES)).assign(
+            trade_code=unquote(prefix)) for prefix in prefixes]
+    df = pd.concat(frames, ignore_index=True)
+    df['date'] = df['date'].dt.date
+    return df[ARCHIVE_COLUMNS]
+
+
+def archived_ranges():
+    """The archived ranges in date order, cached until the archive changes."""
+    return cache.get_or_set(
+        RANGES_KEY,
+        lambda: list(ArchivedRange.objects.values(
+            'storage', 'first_date', 'last_date', 'path')),
+        settings.RESPONSE_CACHE_SECONDS)
+
+
+def _table_frame(trade_code, start_date, end_date):
+    queryset = StockDataArchive.objects.filter(trade_code=trade_code)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    df = pd.DataFrame.from_records(
+        list(queryset.order_by('date').values_list('date', *COLUMNS)),
+        columns=['date'] + COLUMNS)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def archived_frame(trade_code, start_date=None, end_date=None):
+    """
+    Archived rows of trade_code between the dates, shaped like
+    timeseries.load_frame, or None if there are none. Only the archived
+    ranges overlapping the dates are read.
+    """
+    frames, in_table = [], False
+    for archived in archived_ranges():
+        if ((start_date and archived['last_date'] < start_date)
+                or (end_date and archived['first_date'] > end_date)):
+            continue
+        if archived['storage'] == ArchivedRange.FILE:
+            frames.append(read_file(archived['path'], trade_code,
+                                    start_date, end_date))
+        else:
+            in_table = True
+    if in_table:
+        # One query covers every overlapping range of the archive table
+        frames.append(_table_frame(trade_code, start_date, end_date))
+    frames = [df for df in frames if df is not None and len(df)]
+    if not frames:
+        return None
+    # Overlapping ranges must not return a date twice
+    df = pd.concat(frames, ignore_index=True).sort_values('date', kind='stable')
+    return df.drop_duplicates('date', keep='last').reset_index(drop=True)
+
+
+async def aarchived_frame(trade_code, start_date=None, end_date=None):
+    """archived_frame for async views."""
+    # Nothing archived is the usual case; skip the thread hop for it
+    if await cache.aget(RANGES_KEY) == []:
+        return None
+    return await sync_to_async(archived_frame)(trade_code, start_date, end_date)
+
+
+def _remove_on_commit(path):
+    def remove():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    transaction.on_commit(remove)
+
+
+def _changed():
+    rebuild_catalog()
+    invalidate_all()
+    transaction.on_commit(lambda: cache.delete(RANGES_KEY))
+
+
+def _archive_partition(cursor, name, lo, hi):
+    """Write a partition to a columnar file, then detach and drop it."""
+    cursor.execute(f'SELECT {_columns()} FROM {_qn(name)}')
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=ARCHIVE_COLUMNS)
+    cursor.execute(f'ALTER TABLE {_qn(StockData._meta.db_table)} '
+                   f'DETACH PARTITION {_qn(name)}')
+    cursor.execute(f'DROP TABLE {_qn(name)}')
+    if df.empty:
+        return None
+
+    # Rows written into the range after an earlier archive join its file
+    existing = ArchivedRange.objects.filter(name=name).first()
+    if existing:
+        df = pd.concat([read_file_rows(existing.path), df], ignore_index=True)
+        df = df.drop_duplicates(['trade_code', 'date'], keep='first')
+        _remove_on_commit(existing.path)
+    # A new file per run, so a rolled back run never touches a live one
+    path = os.path.join(str(settings.STOCK_ARCHIVE_DIR), f'{name}.{time.time_ns()}.npz')
+    write_file(path, df)
+    archived, _ = ArchivedRange.objects.update_or_create(name=name, defaults={
+        'storage': ArchivedRange.FILE, 'first_date': lo,
+        'last_date': hi - timedelta(days=1), 'row_count': len(df), 'path': path})
+    return archived
+
+
+def _archive_to_table(cursor, cutoff, interval):
+    """Move rows into StockDataArchive, one ArchivedRange per whole period."""
+    first = StockData.objects.aggregate(first=Min('date'))['first']
+    if first is None:
+        return []
+    hot = _qn(StockData._meta.db_table)
+    cold = _qn(StockDataArchive._meta.db_table)
+    archived = []
+    for lo, hi in periods(first, cutoff - timedelta(days=1), interval):
+        if hi > cutoff:
+            break
+        # A key archived by an earlier run keeps its archived row
+        cursor.execute(f'INSERT INTO {cold} ({_columns()}) SELECT {_columns()} '
+                       f'FROM {hot} WHERE date >= %s AND date < %s '
+                       f'ON CONFLICT (trade_code, date) DO NOTHING', [lo, hi])
+        added = cursor.rowcount
+        cursor.execute(f'DELETE FROM {hot} WHERE date >= %s AND date < %s', [lo, hi])
+        if not cursor.rowcount:
+            continue
+        name = partition_name(lo, interval, StockDataArchive._meta.db_table)
+        existing = ArchivedRange.objects.filter(name=name).first()
+        row, _ = ArchivedRange.objects.update_or_create(name=name, defaults={
+            'storage': ArchivedRange.TABLE, 'first_date': lo,
+            'last_date': hi - timedelta(days=1),
+            'row_count': added + (existing.row_count if existing else 0)})
+        archived.append(row)
+    return archived
+
+
+def archive_before(cutoff, interval='year'):
+    """
+    Move the StockData rows of whole periods ending by cutoff out of the
+    hot table, so its indexes and scans only cover recent history.
+
+    On a table partitioned by partition_stock_data, each partition that
+    ends by cutoff is written to a compressed columnar file under
+    STOCK_ARCHIVE_DIR, then detached and dropped. Otherwise (SQLite, or
+    PostgreSQL before partitioning) the rows move into the StockDataArchive
+    table, one year or month at a time. Either way load_frame keeps
+    returning archived rows to history reads whose range reaches back to
+    them; lists, filters and the catalog cover the hot table only.
+    Archived rows get no tombstones, so the change feed keeps them.
+    Returns the ArchivedRange rows written.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            archived = [_archive_partition(cursor, name, lo, hi)
+                        for name, lo, hi in partitions(cursor) if hi and hi <= cutoff]
+            archived = [row for row in archived if row]
+        else:
+            archived = _archive_to_table(cursor, cutoff, interval)
+        if archived:
+            _changed()
+    return archived
+
+
+def restore_range(name):
+    """
+    Put an archived range back into StockData and forget it, recreating
+    its partition first if the table is partitioned. Like any bulk load,
+    this resets the change feed. Returns the rows restored.
+    """
+    archived = ArchivedRange.objects.get(name=name)
+    lo, hi = archived.first_date, archived.last_date + timedelta(days=1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if archived.storage == ArchivedRange.FILE:
+            if is_partitioned(cursor) and not any(
+                    other_lo and other_lo < hi and lo < other_hi
+                    for _, other_lo, other_hi in partitions(cursor)):
+                create_partition(cursor, name, lo, hi)
+            # The bulk loader also rebuilds the catalog and cached reads.
+            # Imported here as snapshot imports ingest, which needs timeseries.
+            from .snapshot import load_frames
+            df = read_file_rows(archived.path)
+            # A hot row written into the range since wins, as in load_frame
+            hot_keys = set(StockData.objects.filter(
+                date__gte=lo, date__lt=hi).values_list('trade_code', 'date'))
+            if hot_keys:
+                keys = pd.Series(list(zip(df['trade_code'], df['date'])), index=df.index)
+                df = df[~keys.isin(hot_keys)]
+            restored, _ = load_frames([df])
+            _remove_on_commit(archived.path)
+            transaction.on_commit(lambda: cache.delete(RANGES_KEY))
+        else:
+            hot = _qn(StockData._meta.db_table)
+            cold = _qn(StockDataArchive._meta.db_table)
+            # A hot row written into the range since wins, as in load_frame
+            cursor.execute(f'INSERT INTO {hot} ({_columns()}) SELECT {_columns()} '
+                           f'FROM {cold} WHERE date >= %s AND date < %s '
+                           f'ON CONFLICT (trade_code, date) DO NOTHING', [lo, hi])
+            restored = cursor.rowcount
+            cursor.execute(f'DELETE FROM {cold} WHERE date >= %s AND date < %s', [lo, hi])
+            reset_change_log()
+            _changed()
+        archived.delete()
+    return restored
@@ -0,0 +1,132 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .caching import async_cached_read
+from .catalog import aget_catalog
+from .models import StockData
+from .pagination import _page_size
+from .renderers import COLUMNAR_FIELDS
+from .timeseries import (aload_frame, downsample_series, frame_to_records,
+                         resample_ohlcv)
+
+
+class InvalidDate(ValueError):
+    def __init__(self, name):
+        super().__init__('Date must be in YYYY-MM-DD format.')
+        self.name = name
+
+
+def _error(exc):
+    # Same bodies as the DRF views: bad dates are reported per parameter
+    key = exc.name if isinstance(exc, InvalidDate) else 'error'
+    return JsonResponse({key: str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _date_arg(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidDate(name)
+
+
+# pandas work is CPU-bound; keep it off the event loop
+_downsample = sync_to_async(downsample_series, thread_sensitive=False)
+_resample = sync_to_async(resample_ohlcv, thread_sensitive=False)
+
+
+@async_cached_read
+async def stock_list(request):
+    """Page through StockData like /api/stocks/, newest first."""
+    queryset = StockData.objects.order_by('-date', '-id')
+    trade_code = request.GET.get('trade_code')
+    if trade_code:
+        queryset = queryset.filter(trade_code=trade_code)
+    try:
+        start_date = _date_arg(request, 'start_date')
+        end_date = _date_arg(request, 'end_date')
+        page = int(request.GET.get('page', 1))
+    except ValueError as e:
+        return _error(e)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+
+    size = _page_size(request, settings.REST_FRAMEWORK['PAGE_SIZE'])
+    count = await queryset.acount()
+    if page < 1 or (page - 1) * size >= max(count, 1):
+        return JsonResponse({'detail': 'Invalid page.'},
+                            status=status.HTTP_404_NOT_FOUND)
+    rows = queryset.values(*COLUMNAR_FIELDS)[(page - 1) * size:page * size]
+
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = (replace_query_param(url, 'page', page - 1) if page > 2
+                    else remove_query_param(url, 'page'))
+    return {
+        'count': count,
+        'next': (replace_query_param(url, 'page', page + 1)
+                 if page * size < count else None),
+        'previous': previous,
+        'results': [row async for row in rows.aiterator()],
+    }
+
+
+@async_cached_read
+async def catalog(request):
+    """Async /api/stocks/catalog/."""
+    return await aget_catalog()
+
+
+@async_cached_read
+async def ohlcv(request):
+    """Async /api/stocks/ohlcv/."""
+    trade_code = request.GET.get('trade_code')
+    interval = request.GET.get('interval', '1W')
+    if not trade_code:
+        return _error(ValueError('trade_code is required'))
+    try:
+        df = await aload_frame(trade_code, _date_arg(request, 'start_date'),
+                               _date_arg(request, 'end_date'))
+        bars = await _resample(df, interval)
+    except ValueError as e:
+        return _error(e)
+    return {
+        'trade_code': trade_code,
+        'interval': interval.upper(),
+        'bars': frame_to_records(bars),
+    }
+
+
+@async_cached_read
+async def series(request):
+    """Async /api/stocks/series/."""
+    trade_code = request.GET.get('trade_code')
+    if not trade_code:
+        return _error(ValueError('trade_code is required'))
+    try:
+        max_points = int(request.GET.get(
+            'max_points', settings.SERIES_DEFAULT_POINTS))
+        if max_points < 3:
+            raise ValueError('max_points must be at least 3')
+        max_points = min(max_points, settings.SERIES_MAX_POINTS)
+        df = await aload_frame(trade_code, _date_arg(request, 'start_date'),
+                               _date_arg(request, 'end_date'))
+    except ValueError as e:
+        return _error(e)
+
+    points = await _downsample(df[['date', 'close', 'volume']], max_points)
+    return {
+        'trade_code': trade_code,
+        'total_points': len(df),
+        'points': frame_to_records(points),
+    }
@@ -0,0 +1,184 @@
+import hashlib
+
+import pandas as pd
+from django.db import IntegrityError, transaction
+from rest_framework import status
+
+from .caching import invalidate
+from .catalog import refresh_symbols
+from .changes import record_deletes, stamp
+from .indicators import invalidate_backfills, invalidate_history
+from .models import StockData
+from .serializers import BulkStockDataSerializer, StockDataSerializer
+
+ROW_FIELDS = StockDataSerializer.Meta.fields
+
+
+def row_etag(instance):
+    """Content hash of a row, used as its version for optimistic concurrency."""
+    values = '|'.join(str(getattr(instance, field)) for field in ROW_FIELDS)
+    return hashlib.md5(values.encode()).hexdigest()
+
+
+def _occupied_keys(keys):
+    """Map the (trade_code, date) keys already stored to their row ids."""
+    if not keys:
+        return {}
+    codes = {code for code, _ in keys}
+    days = [day for _, day in keys]
+    rows = StockData.objects.filter(
+        trade_code__in=codes, date__range=(min(days), max(days)),
+    ).values_list('trade_code', 'date', 'id')
+    return {(code, day): pk for code, day, pk in rows if (code, day) in keys}
+
+
+def _prepare(operations):
+    """
+    Validate operations against the stored rows without writing anything.
+
+    Returns one result dict per operation; those that fail carry an error
+    and a 4xx status. Rows to write are attached under '_row'.
+    """
+    existing = StockData.objects.in_bulk(
+        {op['id'] for op in operations if 'id' in op})
+    results, seen = [], set()
+    for index, op in enumerate(operations):
+        result = {'index': index, 'op': op['op']}
+        results.append(result)
+
+        instance = None
+        if op['op'] != 'create':
+            result['id'] = op['id']
+            if op['id'] in seen:
+                result.update(status=status.HTTP_400_BAD_REQUEST,
+                              error='id appears more than once in the batch.')
+                continue
+            seen.add(op['id'])
+            instance = existing.get(op['id'])
+            if instance is None:
+                result.update(status=status.HTTP_404_NOT_FOUND,
+                              error='No row with this id.')
+                continue
+            if 'if_match' in op and op['if_match'].strip('"') != row_etag(instance):
+                result.update(status=status.HTTP_412_PRECONDITION_FAILED,
+                              error='Row was modified since it was read.',
+                              etag=row_etag(instance))
+                continue
+
+        if op['op'] == 'delete':
+            result['_row'] = instance
+            continue
+
+        serializer = BulkStockDataSerializer(
+            instance, data=op['data'], partial=op['op'] == 'update')
+        if not serializer.is_valid():
+            result.update(status=status.HTTP_400_BAD_REQUEST,
+                          error=serializer.errors)
+            continue
+        if instance is None:
+            instance = StockData(**serializer.validated_data)
+        else:
+            result['_old_key'] = (instance.trade_code, instance.date)
+            for field, value in serializer.validated_data.items():
+                setattr(instance, field, value)
+        result['_row'] = instance
+    return results
+
+
+def _check_unique(results):
+    """Flag creates/updates whose (trade_code, date) would be taken after the batch."""
+    writes = [r for r in results if '_row' in r and r['op'] != 'delete']
+    occupied = _occupied_keys(
+        {(r['_row'].trade_code, r['_row'].date) for r in writes})
+
+    # Keys held by rows this batch deletes or moves are free to reuse
+    freed = {r['_row'].id for r in results if '_row' in r and r['op'] != 'create'}
+    occupied = {key: pk for key, pk in occupied.items() if pk not in freed}
+
+    for result in writes:
+        row = result['_row']
+        key = (row.trade_code, row.date)
+        if key in occupied:
+            del result['_row']
+            result.update(status=status.HTTP_409_CONFLICT,
+                          error=f'A row for {key[0]} on {key[1]} already exists.')
+        else:
+            occupied[key] = row.id
+
+
+def _apply(results):
+    deletes = [r['_row'] for r in results if r['op'] == 'delete']
+    updates = [r['_row'] for r in results if r['op'] == 'update']
+    creates = [r['_row'] for r in results if r['op'] == 'create']
+
+    with transaction.atomic():
+        # Appended days keep cached indicators; anything else drops them
+        invalidate_backfills(pd.DataFrame(
+            [{'trade_code': row.trade_code, 'date': row.date} for row in creates],
+            columns=['trade_code', 'date']))
+        old_keys = {r['_old_key'] for r in results if '_old_key' in r}
+        invalidate_history({row.trade_code for row in deletes + updates}
+                           | {code for code, _ in old_keys})
+
+        record_deletes(deletes)
+        stamp(updates + creates)
+        if deletes:
+            StockData.objects.filter(id__in=[row.id for row in deletes]).delete()
+        if updates:
+            StockData.objects.bulk_update(
+                updates, [field for field in ROW_FIELDS if field != 'id'] + ['seq'])
+        if creates:
+            StockData.objects.bulk_create(creates)
+
+        touched = {(row.trade_code, row.date) for row in deletes + updates + creates}
+        touched |= old_keys
+        codes = {code for code, _ in touched}
+        refresh_symbols(codes)
+        invalidate(codes, {day for _, day in touched})
+
+
+def apply_operations(operations):
+    """
+    Apply a batch of validated bulk operations all-or-nothing.
+
+    Returns (results, http_status). Every operation gets a result with its
+    index, status and, for rows that now exist, the id and etag. When any
+    operation fails, nothing is written: the failing items say why and the
+    others are reported with status 424 (failed dependency).
+    """
+    results = _prepare(operations)
+    _check_unique(results)
+
+    failed = [r for r in results if '_row' not in r]
+    if not failed:
+        try:
+            _apply(results)
+        except IntegrityError:
+            # A concurrent writer took one of the keys after the check above
+            for result in results:
+                result.pop('_row')
+                result.update(status=status.HTTP_409_CONFLICT,
+                              error='Batch conflicted with a concurrent write.')
+            return results, status.HTTP_409_CONFLICT
+
+    for result in results:
+        row = result.pop('_row', None)
+        result.pop('_old_key', None)
+        if failed:
+            result.setdefault('status', status.HTTP_424_FAILED_DEPENDENCY)
+        elif result['op'] == 'delete':
+            result['status'] = status.HTTP_204_NO_CONTENT
+        else:
+            result.update(
+                status=(status.HTTP_201_CREATED if result['op'] == 'create'
+                        else status.HTTP_200_OK),
+                id=row.id, etag=row_etag(row))
+
+    if not failed:
+        return results, status.HTTP_200_OK
+    codes = {r['status'] for r in failed}
+    if codes == {status.HTTP_412_PRECONDITION_FAILED}:
+        return results, status.HTTP_412_PRECONDITION_FAILED
+    if codes == {status.HTTP_409_CONFLICT}:
+        return results, status.HTTP_409_CONFLICT
+    return results, status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,227 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponseNotModified, JsonResponse
+from django.http.response import HttpResponseBase
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import registry, serializing
+
+EPOCH_KEY = 'resp:epoch'
+GLOBAL_KEY = 'resp:v:all'
+# Writes touching more trade codes and days than this (a bulk import, say)
+# expire everything with one epoch bump instead of a bump per key
+MAX_TARGETED_BUMPS = 50
+
+
+def _code_key(trade_code):
+    return f'resp:v:code:{trade_code}'
+
+
+def _date_key(day):
+    return f'resp:v:date:{day.isoformat()}'
+
+
+def _modified_key(version_key):
+    return f'{version_key}:modified'
+
+
+def _version(key):
+    # A missing counter starts at the current time rather than 1, so an
+    # evicted counter can never fall back onto a version already used
+    return cache.get_or_set(key, time.time_ns(), None)
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+    cache.set(_modified_key(key), time.time(), None)
+
+
+def invalidate(trade_codes, dates=()):
+    """
+    Expire cached reads touching trade_codes once the transaction commits.
+
+    dates are the trading days written to, which date-keyed caches such as
+    the market snapshot depend on.
+    """
+    codes = set(trade_codes)
+    days = set(dates)
+    if len(codes) + len(days) > MAX_TARGETED_BUMPS:
+        invalidate_all()
+        return
+
+    def bump():
+        for code in codes:
+            _bump(_code_key(code))
+        for day in days:
+            _bump(_date_key(day))
+        _bump(GLOBAL_KEY)
+
+    transaction.on_commit(bump)
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def epoch_version():
+    """Return the counter bumped by invalidate_all()."""
+    return _version(EPOCH_KEY)
+
+
+def code_versions(trade_codes):
+    """Return {trade_code: version}; a version changes on every write to it."""
+    keys = {code: _code_key(code) for code in trade_codes}
+    versions = _versions(list(keys.values()))
+    return {code: versions[key] for code, key in keys.items()}
+
+
+def dates_version(days):
+    """Return a token that changes whenever any of days is written to."""
+    keys = [_date_key(day) for day in days]
+    versions = _versions(keys)
+    raw = ':'.join(str(versions[key]) for key in keys)
+    return f'{_version(EPOCH_KEY)}:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def invalidate_all():
+    """Expire every cached read, e.g. after a reset or a full reload."""
+    transaction.on_commit(lambda: _bump(EPOCH_KEY))
+
+
+def cache_stats():
+    """Hits and misses of cached reads served by this process."""
+    hits, misses = registry.cache_results('hit'), registry.cache_results('miss')
+    total = hits + misses
+    return {
+        'backend': settings.CACHES['default']['BACKEND'],
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def _validators(request):
+    """Return the cache key and Last-Modified time for a read request."""
+    # Reads for one trade code only change when that code is written to;
+    # anything else depends on every write
+    trade_code = request.GET.get('trade_code')
+    version_key = _code_key(trade_code) if trade_code else GLOBAL_KEY
+    epoch = _version(EPOCH_KEY)
+    version = _version(version_key)
+
+    raw = f'{epoch}:{version}:{request.build_absolute_uri()}'
+    key = 'resp:' + hashlib.md5(raw.encode()).hexdigest()
+
+    modified = max(
+        cache.get(_modified_key(EPOCH_KEY), 0),
+        cache.get(_modified_key(version_key), 0),
+    )
+    if not modified:
+        modified = time.time()
+        cache.add(_modified_key(version_key), modified, None)
+    return key, int(modified)
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return etag in tags or '*' in tags
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and last_modified <= since
+
+
+def _lookup(request):
+    """
+    Resolve a read request against the cache.
+
+    Returns (key, etag, last_modified, not_modified, data); data is None on
+    a miss, and is not looked up when the client's copy is current.
+    """
+    key, last_modified = _validators(request)
+    etag = quote_etag(key[len('resp:'):])
+    if _not_modified(request, etag, last_modified):
+        # The client's copy is current; no need to even look at the data
+        registry.record_cache('hit')
+        return key, etag, last_modified, True, None
+    data = cache.get(key)
+    registry.record_cache('hit' if data is not None else 'miss')
+    return key, etag, last_modified, False, data
+
+
+def _finish(response, etag, last_modified, hit):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['X-Cache'] = hit
+    return response
+
+
+def cached_read(view_method):
+    """
+    Cache the data of a successful GET handler under a versioned key.
+
+    Responses carry ETag and Last-Modified headers and are answered with 304
+    when the client already holds the current version. X-Cache reports
+    whether the data came from the cache.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key, etag, last_modified, not_modified, data = _lookup(request)
+        if not_modified:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            return _finish(response, etag, last_modified, 'HIT')
+        hit = 'HIT'
+        if data is None:
+            hit = 'MISS'
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RESPONSE_CACHE_SECONDS)
+        return _finish(Response(data), etag, last_modified, hit)
+
+    return wrapper
+
+
+def async_cached_read(view):
+    """
+    cached_read for async Django views, sharing its keys and validators.
+
+    The view returns the response data, or an HttpResponse for errors,
+    which is passed through uncached.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Cache lookups don't touch the database, so any thread will do
+        key, etag, last_modified, not_modified, data = await sync_to_async(
+            _lookup, thread_sensitive=False)(request)
+        if not_modified:
+            return _finish(HttpResponseNotModified(), etag, last_modified, 'HIT')
+        hit = 'HIT'
+        if data is None:
+            hit = 'MISS'
+            data = await view(request, *args, **kwargs)
+            if isinstance(data, HttpResponseBase):
+                return data
+            await cache.aset(key, data, settings.RESPONSE_CACHE_SECONDS)
+        with serializing():
+            response = JsonResponse(data, safe=False)
+        return _finish(response, etag, last_modified, hit)
+
+    return wrapper
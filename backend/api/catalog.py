@@ -0,0 +1,125 @@
+import time
+from datetime import timedelta
+
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from .models import StockData, TradeCodeSummary
+from .validation import _no_trade
+
+VERSION_KEY = 'symbol-catalog:version'
+SUMMARY_FIELDS = ['first_date', 'last_date', 'row_count', 'latest_close',
+                  'high_52w', 'low_52w']
+
+
+def _summaries(queryset):
+    """Build unsaved TradeCodeSummary objects for the rows in queryset."""
+    totals = {
+        row['trade_code']: row for row in queryset.values('trade_code').annotate(
+            first_date=Min('date'), last_date=Max('date'), row_count=Count('id'))
+    }
+    if not totals:
+        return []
+
+    # Only the last year of each symbol matters for the close and 52w range
+    earliest = min(row['last_date'] for row in totals.values()) - timedelta(days=365)
+    columns = ['trade_code', 'date', 'high', 'low', 'open', 'close', 'volume']
+    recent = pd.DataFrame.from_records(
+        list(queryset.filter(date__gte=earliest).values_list(*columns)),
+        columns=columns)
+    last_dates = pd.Series(
+        {code: row['last_date'] for code, row in totals.items()}, name='last_date')
+    recent = recent.join(pd.to_datetime(last_dates), on='trade_code')
+    recent['date'] = pd.to_datetime(recent['date'])
+    recent = recent[recent['date'] >= recent['last_date'] - pd.Timedelta(days=365)]
+
+    latest = recent[recent['date'] == recent['last_date']].set_index(
+        'trade_code')['close']
+    # Untraded days report zero prices, so they stay out of the 52w range;
+    # a symbol that did not trade all year gets a range of its latest close
+    window = recent[~_no_trade(recent)].groupby('trade_code').agg(
+        high_52w=('high', 'max'), low_52w=('low', 'min')).reindex(latest.index)
+    window = window.fillna({'high_52w': latest, 'low_52w': latest})
+
+    return [
+        TradeCodeSummary(
+            trade_code=code,
+            first_date=row['first_date'],
+            last_date=row['last_date'],
+            row_count=row['row_count'],
+            latest_close=float(latest[code]),
+            high_52w=float(window.at[code, 'high_52w']),
+            low_52w=float(window.at[code, 'low_52w']),
+        )
+        for code, row in totals.items()
+    ]
+
+
+def _save(summaries, stale_codes):
+    with transaction.atomic():
+        if stale_codes is None:
+            TradeCodeSummary.objects.exclude(
+                trade_code__in=[s.trade_code for s in summaries]).delete()
+        elif stale_codes:
+            TradeCodeSummary.objects.filter(trade_code__in=stale_codes).delete()
+        TradeCodeSummary.objects.bulk_create(
+            summaries, update_conflicts=True, unique_fields=['trade_code'],
+            # updated_at marks the refresh for the columnar store's freshness check
+            update_fields=SUMMARY_FIELDS + ['updated_at'])
+        # Readers must not cache the old catalog under the new version
+        transaction.on_commit(bump_version)
+
+
+def refresh_symbols(trade_codes):
+    """Recompute the catalog rows of the given trade codes after a write."""
+    codes = set(trade_codes)
+    if not codes:
+        return
+    summaries = _summaries(StockData.objects.filter(trade_code__in=codes))
+    _save(summaries, codes - {s.trade_code for s in summaries})
+
+
+def rebuild_catalog():
+    """Recompute the whole catalog, e.g. after a bulk load or reset."""
+    summaries = _summaries(StockData.objects.all())
+    _save(summaries, None)
+    return len(summaries)
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # A missing version starts at the current time rather than 1, so an
+        # evicted counter can never fall back onto a version already used
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def get_catalog():
+    """
+    Return the catalog as a list of dicts, served from the versioned cache.
+    Entries also expire, bounding how long a lost bump can leave it stale.
+    """
+    version = cache.get_or_set(VERSION_KEY, time.time_ns(), None)
+    key = f'symbol-catalog:{version}'
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = list(TradeCodeSummary.objects.values(
+            'trade_code', *SUMMARY_FIELDS))
+        cache.set(key, catalog, settings.RESPONSE_CACHE_SECONDS)
+    return catalog
+
+
+async def aget_catalog():
+    """get_catalog for async views."""
+    version = await cache.aget_or_set(VERSION_KEY, time.time_ns(), None)
+    key = f'symbol-catalog:{version}'
+    catalog = await cache.aget(key)
+    if catalog is None:
+        catalog = [row async for row in TradeCodeSummary.objects.values(
+            'trade_code', *SUMMARY_FIELDS)]
+        await cache.aset(key, catalog, settings.RESPONSE_CACHE_SECONDS)
+    return catalog
@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models import F, Max
+from django.dispatch import Signal
+
+from .models import ChangeCounter, StockData, StockDataTombstone
+
+CHANGE_FIELDS = ['id', 'date', 'trade_code', 'high', 'low', 'open', 'close',
+                 'volume', 'seq']
+
+
+# Sent after commit with the first and last seq a transaction wrote
+changes_committed = Signal()
+# Sent after a full reload renumbered every row
+change_log_reset = Signal()
+
+
+class ResyncRequired(Exception):
+    """The requested token predates tombstones that have been pruned."""
+
+
+def allocate_seqs(count=1):
+    """
+    Reserve count consecutive change sequence numbers and return the first.
+
+    Call this inside the transaction that writes the rows. The counter row
+    stays locked until that transaction commits, so sequence numbers become
+    visible in the order they were handed out and a reader never skips a
+    change that commits late.
+    """
+    with transaction.atomic():
+        updated = ChangeCounter.objects.filter(pk=1).update(
+            value=F('value') + count)
+        if not updated:
+            ChangeCounter.objects.create(pk=1, value=count)
+        value = ChangeCounter.objects.values_list('value', flat=True).get(pk=1)
+    first = value - count + 1
+    if count:
+        transaction.on_commit(lambda: changes_committed.send(
+            sender=ChangeCounter, first=first, last=value))
+    return first
+
+
+def stamp(rows):
+    """Give each unsaved or modified StockData instance a fresh seq."""
+    rows = list(rows)
+    if rows:
+        first = allocate_seqs(len(rows))
+        for offset, row in enumerate(rows):
+            row.seq = first + offset
+
+
+def record_deletes(rows):
+    """Write tombstones for StockData rows about to be deleted."""
+    rows = list(rows)
+    if not rows:
+        return
+    first = allocate_seqs(len(rows))
+    StockDataTombstone.objects.bulk_create([
+        StockDataTombstone(row_id=row.id, trade_code=row.trade_code,
+                           date=row.date, seq=first + offset)
+        for offset, row in enumerate(rows)
+    ])
+
+
+def current_token():
+    counter = ChangeCounter.objects.filter(pk=1).values('value', 'pruned_through').first()
+    return counter or {'value': 0, 'pruned_through': 0}
+
+
+def changes_since(since, limit, trade_codes=None):
+    """
+    Return the rows written and deleted after change token since.
+
+    At most limit changes are returned in sequence order. The returned
+    token is what the client passes as since next time; has_more says
+    whether it should do so straight away. Only the latest state of a row
+    is reported, however often it changed.
+    """
+    counter = current_token()
+    if 0 < since < counter['pruned_through']:
+        raise ResyncRequired(
+            f"Changes up to {counter['pruned_through']} are no longer kept; "
+            'reload the data and start again from a fresh token.')
+    high = counter['value']
+
+    rows = StockData.objects.filter(seq__gt=since, seq__lte=high)
+    tombstones = StockDataTombstone.objects.filter(seq__gt=since, seq__lte=high)
+    if trade_codes:
+        rows = rows.filter(trade_code__in=trade_codes)
+        tombstones = tombstones.filter(trade_code__in=trade_codes)
+    upserts = list(rows.order_by('seq').values(*CHANGE_FIELDS)[:limit + 1])
+    deletes = list(tombstones.order_by('seq').values(
+        'row_id', 'trade_code', 'date', 'seq')[:limit + 1])
+
+    # Both lists are in seq order; keep the first limit changes overall
+    seqs = sorted([row['seq'] for row in upserts] + [row['seq'] for row in deletes])
+    has_more = len(seqs) > limit
+    token = seqs[limit - 1] if has_more else high
+    return {
+        'since': since,
+        'token': token,
+        'has_more': has_more,
+        'upserts': [row for row in upserts if row['seq'] <= token],
+        'deletes': [{'id': row.pop('row_id'), **row}
+                    for row in deletes if row['seq'] <= token],
+    }
+
+
+def reset_change_log():
+    """
+    Renumber every row after a bulk reload that bypassed the change feed.
+
+    Tokens handed out before the reset are rejected afterwards, so clients
+    reload instead of trying to patch their copy.
+    """
+    with transaction.atomic():
+        base = allocate_seqs(0) - 1
+        last = StockData.objects.aggregate(last=Max('id'))['last'] or 0
+        StockData.objects.update(seq=F('id') + base)
+        StockDataTombstone.objects.all().delete()
+        ChangeCounter.objects.filter(pk=1).update(
+            value=base + last, pruned_through=base + 1)
+        transaction.on_commit(lambda: change_log_reset.send(sender=ChangeCounter))
+
+
+def prune_tombstones(before):
+    """Drop tombstones for deletions older than before; returns the number dropped."""
+    with transaction.atomic():
+        old = StockDataTombstone.objects.filter(deleted_at__lt=before)
+        newest = old.aggregate(newest=Max('seq'))['newest']
+        if newest is None:
+            return 0
+        count, _ = old.delete()
+        ChangeCounter.objects.filter(pk=1, pruned_through__lt=newest).update(
+            pruned_through=newest)
+    return count
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .models import StockData, TradeCodeSummary
+
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+DTYPES = {'open': 'f8', 'high': 'f8', 'low': 'f8', 'close': 'f8', 'volume': 'i8'}
+
+
+def _freshness(trade_code):
+    """Token that changes whenever the catalog row of trade_code is refreshed."""
+    row = TradeCodeSummary.objects.filter(trade_code=trade_code).values_list(
+        'updated_at', 'row_count', 'last_date').first()
+    if row is None:
+        return None
+    updated_at, row_count, last_date = row
+    return f'{updated_at.isoformat()}|{row_count}|{last_date.isoformat()}'
+
+
+class ColumnarStore:
+    """
+    Read-only snapshots of StockData as one set of .npy files per trade code.
+
+    Each snapshot holds a sorted datetime64 date index plus one array per
+    OHLCV column. Reads memory-map the files and slice them at the
+    searchsorted positions of the requested range, so nothing is copied
+    until the caller touches the values. The ORM stays the source of truth:
+    a snapshot remembers the catalog row it was built from, and read()
+    returns None for a symbol that was written to since, so callers fall
+    back to the database until build_columnar_store refreshes it.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._open = {}
+
+    def _symbol_dir(self, trade_code):
+        return os.path.join(self.root, quote(trade_code, safe=''))
+
+    def _current(self, trade_code):
+        try:
+            with open(os.path.join(self._symbol_dir(trade_code), 'current.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, trade_code, df, freshness):
+        """Write a snapshot of df (date plus OHLCV columns) for trade_code."""
+        symbol_dir = self._symbol_dir(trade_code)
+        stamp = str(time.time_ns())
+        target = os.path.join(symbol_dir, stamp)
+        os.makedirs(target)
+
+        np.save(os.path.join(target, 'date.npy'),
+                pd.to_datetime(df['date']).to_numpy().astype('datetime64[ns]'))
+        for column in COLUMNS:
+            np.save(os.path.join(target, f'{column}.npy'),
+                    df[column].to_numpy().astype(DTYPES[column]))
+
+        # Switch readers over atomically, then drop older snapshots. Files
+        # that are still mapped stay readable until they are unmapped.
+        pointer = os.path.join(symbol_dir, 'current.json')
+        with open(pointer + '.tmp', 'w') as f:
+            json.dump({'stamp': stamp, 'freshness': freshness,
+                       'rows': len(df)}, f)
+        os.replace(pointer + '.tmp', pointer)
+        for entry in os.listdir(symbol_dir):
+            if entry != stamp and os.path.isdir(os.path.join(symbol_dir, entry)):
+                shutil.rmtree(os.path.join(symbol_dir, entry), ignore_errors=True)
+
+    def _arrays(self, trade_code, stamp):
+        with self._lock:
+            cached = self._open.get(trade_code)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            base = os.path.join(self._symbol_dir(trade_code), stamp)
+            arrays = {name: np.load(os.path.join(base, f'{name}.npy'), mmap_mode='r')
+                      for name in ['date'] + COLUMNS}
+            self._open[trade_code] = (stamp, arrays)
+            return arrays
+
+    def read(self, trade_code, start_date=None, end_date=None):
+        """Return a frame like timeseries.load_frame, or None if not servable."""
+        current = self._current(trade_code)
+        if current is None or current['freshness'] != _freshness(trade_code):
+            return None
+        arrays = self._arrays(trade_code, current['stamp'])
+
+        dates = arrays['date']
+        lo = np.searchsorted(dates, np.datetime64(start_date, 'ns')) if start_date else 0
+        hi = (np.searchsorted(dates, np.datetime64(end_date, 'ns') + np.timedelta64(1, 'D'))
+              if end_date else len(dates))
+        return pd.DataFrame(
+            {name: arrays[name][lo:hi] for name in ['date'] + COLUMNS},
+            copy=False)
+
+    def build(self, trade_codes=None, changed_only=False):
+        """
+        Snapshot the given trade codes (all of them by default).
+
+        With changed_only, symbols whose snapshot is still current are
+        skipped. Returns the number of snapshots written.
+        """
+        catalog = TradeCodeSummary.objects.all()
+        if trade_codes:
+            catalog = catalog.filter(trade_code__in=trade_codes)
+        written = 0
+        for trade_code in catalog.values_list('trade_code', flat=True):
+            freshness = _freshness(trade_code)
+            current = self._current(trade_code)
+            if changed_only and current and current['freshness'] == freshness:
+                continue
+            rows = StockData.objects.filter(trade_code=trade_code).order_by(
+                'date').values_list('date', *COLUMNS)
+            df = pd.DataFrame.from_records(list(rows), columns=['date'] + COLUMNS)
+            self.write(trade_code, df, freshness)
+            written += 1
+        return written
+
+
+columnar_store = ColumnarStore(settings.COLUMNAR_STORE_DIR)
+
+
+def read_columnar(trade_code, start_date=None, end_date=None):
+    """Serve a range from the columnar store when it is the read backend."""
+    if settings.STOCK_READ_BACKEND != 'columnar':
+        return None
+    return columnar_store.read(trade_code, start_date, end_date)
@@ -0,0 +1,24 @@
+import itertools
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class FileCache(FileBasedCache):
+    """
+    FileBasedCache that decides whether to cull on every CULL_EVERY-th set
+    rather than on every one.
+
+    Deciding lists the whole cache directory, so a write invalidating a
+    few hundred trade codes at once spent seconds listing it. The cache
+    can now run over MAX_ENTRIES by up to CULL_EVERY entries per process
+    before it is culled.
+    """
+    CULL_EVERY = 100
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._sets = itertools.count()
+
+    def _cull(self):
+        if next(self._sets) % self.CULL_EVERY == 0:
+            super()._cull()
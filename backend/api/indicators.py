@@ -0,0 +1,262 @@
+import abc
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import TradeCodeSummary
+from .timeseries import load_frame
+
+# Cached results live for a day; appends extend them, back-fills drop them
+ENTRY_TIMEOUT = 24 * 60 * 60
+
+
+def _ema(values, alpha, seed=None):
+    """EMA with adjust=False, continuing from seed when one is given."""
+    series = pd.Series(values, dtype=float)
+    if seed is None:
+        return series.ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    series = pd.concat([pd.Series([seed], dtype=float), series],
+                       ignore_index=True)
+    return series.ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def _warm(values, seen, warmup):
+    """Blank out the outputs produced before warmup observations were seen."""
+    position = seen + np.arange(len(values))
+    values = values.astype(float)
+    values[position < warmup - 1] = np.nan
+    return values
+
+
+class Indicator(abc.ABC):
+    """
+    Base class for an indicator over the close price.
+
+    compute() takes the new closes plus the state returned by the previous
+    call (None the first time) and returns the output columns for just the
+    new closes along with the state to carry forward. This is what lets an
+    appended day be handled without revisiting the full history.
+    """
+    name = None
+    defaults = ()
+
+    def __init__(self, *params):
+        self.params = params or self.defaults
+
+    @property
+    def key(self):
+        return ':'.join([self.name] + [str(p) for p in self.params])
+
+    @abc.abstractmethod
+    def compute(self, close, state):
+        """Return ({column: values for close}, state) for the new closes."""
+
+
+class SMA(Indicator):
+    name = 'sma'
+    defaults = (20,)
+
+    def compute(self, close, state):
+        (n,) = self.params
+        history = state['tail'] if state else np.empty(0)
+        values = np.concatenate([history, close])
+        out = pd.Series(values).rolling(n).mean().to_numpy()[len(history):]
+        return {f'sma_{n}': out}, {'tail': values[len(values) - (n - 1):]}
+
+
+class EMA(Indicator):
+    name = 'ema'
+    defaults = (20,)
+
+    def compute(self, close, state):
+        (n,) = self.params
+        seen = state['seen'] if state else 0
+        ema = _ema(close, 2 / (n + 1), state['ema'] if state else None)
+        state = {'ema': ema[-1], 'seen': seen + len(close)}
+        return {f'ema_{n}': _warm(ema, seen, n)}, state
+
+
+class RSI(Indicator):
+    """Wilder's RSI, smoothing gains and losses with alpha = 1/n."""
+    name = 'rsi'
+    defaults = (14,)
+
+    def compute(self, close, state):
+        (n,) = self.params
+        seen = state['seen'] if state else 0
+        previous = [state['close']] if state else [close[0]]
+        delta = np.diff(np.concatenate([previous, close]))
+        gain = _ema(np.clip(delta, 0, None), 1 / n,
+                    state['gain'] if state else None)
+        loss = _ema(np.clip(-delta, 0, None), 1 / n,
+                    state['loss'] if state else None)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        state = {'close': close[-1], 'gain': gain[-1], 'loss': loss[-1],
+                 'seen': seen + len(close)}
+        # The first close has no change, so n + 1 closes are needed
+        return {f'rsi_{n}': _warm(rsi, seen, n + 1)}, state
+
+
+class MACD(Indicator):
+    name = 'macd'
+    defaults = (12, 26, 9)
+
+    def compute(self, close, state):
+        fast_n, slow_n, signal_n = self.params
+        seen = state['seen'] if state else 0
+        fast = _ema(close, 2 / (fast_n + 1), state['fast'] if state else None)
+        slow = _ema(close, 2 / (slow_n + 1), state['slow'] if state else None)
+        macd = fast - slow
+        signal = _ema(macd, 2 / (signal_n + 1),
+                      state['signal'] if state else None)
+        state = {'fast': fast[-1], 'slow': slow[-1], 'signal': signal[-1],
+                 'seen': seen + len(close)}
+        signal_warmup = slow_n + signal_n - 1
+        return {
+            'macd': _warm(macd, seen, slow_n),
+            'macd_signal': _warm(signal, seen, signal_warmup),
+            'macd_hist': _warm(macd - signal, seen, signal_warmup),
+        }, state
+
+
+class Bollinger(Indicator):
+    name = 'bb'
+    defaults = (20, 2.0)
+
+    def compute(self, close, state):
+        n, k = self.params
+        history = state['tail'] if state else np.empty(0)
+        values = np.concatenate([history, close])
+        rolling = pd.Series(values).rolling(n)
+        mid = rolling.mean().to_numpy()[len(history):]
+        std = rolling.std(ddof=0).to_numpy()[len(history):]
+        return {
+            'bb_mid': mid,
+            'bb_upper': mid + k * std,
+            'bb_lower': mid - k * std,
+        }, {'tail': values[len(values) - (n - 1):]}
+
+
+INDICATORS = {cls.name: cls for cls in (SMA, EMA, RSI, MACD, Bollinger)}
+
+
+def parse_indicators(spec):
+    """Parse 'sma:20,rsi:14,macd' into Indicator instances."""
+    indicators = []
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, *raw = item.lower().split(':')
+        cls = INDICATORS.get(name)
+        if cls is None:
+            raise ValueError(
+                f"Unknown indicator '{name}'; choose from {', '.join(INDICATORS)}")
+        if len(raw) > len(cls.defaults):
+            raise ValueError(f"Too many parameters for '{name}'")
+        try:
+            params = tuple(type(default)(value) for default, value
+                           in zip(cls.defaults, raw)) + cls.defaults[len(raw):]
+        except ValueError:
+            raise ValueError(f"Invalid parameters for '{item}'")
+        if any(p <= 0 for p in params):
+            raise ValueError(f"Invalid parameters for '{item}'")
+        indicators.append(cls(*params))
+    if not indicators:
+        raise ValueError('ind is required, e.g. ind=sma:20,rsi:14')
+    return indicators
+
+
+def _generation(trade_code):
+    return cache.get_or_set(f'ind:gen:{trade_code}', time.time_ns(), None)
+
+
+def _entry_key(trade_code, indicator):
+    return f'ind:{trade_code}:{_generation(trade_code)}:{indicator.key}'
+
+
+def invalidate_history(trade_codes):
+    """Drop cached indicators of symbols whose past rows were edited."""
+    def bump():
+        for code in set(trade_codes):
+            cache.set(f'ind:gen:{code}', time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_backfills(new_rows):
+    """
+    Drop cached indicators where new rows land before a symbol's last date.
+
+    new_rows is a frame with trade_code and date columns. Rows dated after
+    the last stored day are plain appends and keep the cache; it is
+    extended on the next read. Call this before the catalog is refreshed.
+    """
+    if new_rows.empty:
+        return
+    first_new = new_rows.groupby('trade_code')['date'].min()
+    last_stored = dict(TradeCodeSummary.objects.filter(
+        trade_code__in=first_new.index.tolist()).values_list(
+        'trade_code', 'last_date'))
+    invalidate_history([
+        code for code, first in first_new.items()
+        if code in last_stored and first <= last_stored[code]
+    ])
+
+
+def _extend(entry, indicator, dates, close):
+    columns, state = indicator.compute(close, entry['state'] if entry else None)
+    if entry is None:
+        return {'dates': dates, 'columns': columns, 'state': state}
+    return {
+        'dates': np.concatenate([entry['dates'], dates]),
+        'columns': {name: np.concatenate([entry['columns'][name], values])
+                    for name, values in columns.items()},
+        'state': state,
+    }
+
+
+def compute_indicators(trade_code, indicators, start_date=None, end_date=None):
+    """
+    Return (dates, columns) for the requested indicators of one symbol.
+
+    Results are cached per (symbol, indicator, params). On a cache hit only
+    the days after the cached last date are fetched and fed through the
+    indicators' carried state.
+    """
+    keys = [_entry_key(trade_code, indicator) for indicator in indicators]
+    entries = [cache.get(key) for key in keys]
+
+    if any(entry is None for entry in entries):
+        since = None
+    else:
+        since = min(entry['dates'][-1] for entry in entries).astype(object)
+    df = load_frame(trade_code, since + timedelta(days=1) if since else None)
+    if since is None and df.empty:
+        return [], {}
+    dates = df['date'].to_numpy().astype('datetime64[D]')
+    close = df['close'].to_numpy(dtype=float)
+
+    for i, indicator in enumerate(indicators):
+        entry = entries[i]
+        newer = dates > entry['dates'][-1] if entry else slice(None)
+        if entry is None or len(dates[newer]):
+            entries[i] = _extend(entry, indicator, dates[newer], close[newer])
+            cache.set(keys[i], entries[i], ENTRY_TIMEOUT)
+
+    out_dates = entries[0]['dates']
+    mask = np.ones(len(out_dates), dtype=bool)
+    if start_date:
+        mask &= out_dates >= np.datetime64(start_date)
+    if end_date:
+        mask &= out_dates <= np.datetime64(end_date)
+
+    columns = {}
+    for entry in entries:
+        for name, values in entry['columns'].items():
+            values = values[mask]
+            columns[name] = [None if np.isnan(v) else round(float(v), 6)
+                             for v in values]
+    return [str(d) for d in out_dates[mask]], columns
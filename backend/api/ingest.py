@@ -0,0 +1,639 @@
+import json
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import OuterRef, Subquery
+
+from .archive import archived_ranges
+from .caching import invalidate
+from .catalog import refresh_symbols
+from .changes import allocate_seqs
+from .indicators import invalidate_backfills
+from .models import ImportCheckpoint, QuarantinedRow, StockData, TradeCodeSummary
+from .validation import (ANCHOR_COLUMNS, PRICE_COLUMNS, add_jumps, count_reasons,
+                         describe, find_problems)
+
+COLUMNS = ['date', 'trade_code'] + PRICE_COLUMNS + ['volume']
+
+# Whitespace and element separators between the records of a JSON array
+_JSON_SKIP = re.compile(r'[\s,]*')
+
+
+class IngestStats:
+    """Counters collected while loading rows into StockData."""
+
+    def __init__(self):
+        self.total = 0
+        self.created = 0
+        self.skipped = 0
+        self.invalid = 0
+        # Rows rejected per validation rule; one row may count under several
+        self.rejections = {}
+        self.resumed_from = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        if not self.elapsed:
+            return 0.0
+        return self.total / self.elapsed
+
+    def merge(self, other):
+        """Add the counters of another IngestStats into this one."""
+        self.total += other.total
+        self.created += other.created
+        self.skipped += other.skipped
+        self.invalid += other.invalid
+        for rule, count in other.rejections.items():
+            self.rejections[rule] = self.rejections.get(rule, 0) + count
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'created': self.created,
+            'skipped': self.skipped,
+            'invalid': self.invalid,
+            'rejections': dict(self.rejections),
+            'resumed_from': self.resumed_from,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+    def __str__(self):
+        return (f"{self.created} created, {self.skipped} already present, "
+                f"{self.invalid} invalid out of {self.total} rows "
+                f"in {self.elapsed:.2f}s ({self.rows_per_sec:.0f} rows/sec)")
+
+
+def _to_number(series):
+    if series.dtype == object:
+        try:
+            # Clean files parse several times faster as a plain float cast
+            return series.astype('float64')
+        except (TypeError, ValueError):
+            pass
+    numbers = pd.to_numeric(series, errors='coerce')
+    if series.dtype == object:
+        # Values such as "2,285,416" come in as strings; strip the
+        # separators from just the values that did not parse as they were
+        retry = numbers.isna() & series.notna()
+        if retry.any():
+            numbers[retry] = pd.to_numeric(
+                series[retry].astype(str).str.replace(',', '', regex=False),
+                errors='coerce')
+    return numbers
+
+
+def _normalise_columns(df):
+    df = df.rename(columns=lambda c: str(c).lstrip('\ufeff').strip())
+    return df[COLUMNS]
+
+
+def parse_frame(df):
+    """
+    Parse the columns of a raw frame of stock rows.
+
+    Values that cannot be parsed come back as NaN (NaT for dates) rather
+    than raising, so the validation rules can report them.
+    """
+    df = _normalise_columns(df).copy()
+    df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.date
+    df['trade_code'] = df['trade_code'].fillna('').astype(str).str.strip()
+    for column in PRICE_COLUMNS + ['volume']:
+        df[column] = _to_number(df[column])
+    return df
+
+
+def clean_frame(df):
+    """
+    Normalise a raw frame of stock rows.
+
+    Returns a tuple of the cleaned frame and the number of rows dropped
+    because a column was missing or could not be parsed.
+    """
+    df = parse_frame(df)
+
+    valid = df.notna().all(axis=1) & (df['trade_code'] != '')
+    invalid = int((~valid).sum())
+    df = df[valid]
+    df['volume'] = df['volume'].astype('int64')
+
+    return df, invalid
+
+
+def _existing_keys(df):
+    """Fetch the (trade_code, date) keys from df that are already stored."""
+    if df.empty:
+        return set()
+    codes = df['trade_code'].unique().tolist()
+    return set(StockData.objects.filter(
+        trade_code__in=codes,
+        date__range=(df['date'].min(), df['date'].max()),
+    ).values_list('trade_code', 'date'))
+
+
+def _jump_streaks(anchors, before):
+    """
+    Add how many traded rows of each symbol were quarantined as price
+    jumps since its anchor, and the latest of their closes, to anchors.
+    Rows accepted in between would have moved the anchor, so these
+    rejections are consecutive.
+    """
+    anchors['streak'], anchors['level'] = 0, None
+    data = list(QuarantinedRow.objects.filter(
+        reasons__contains='price_jump',
+        data__trade_code__in=anchors['trade_code'].tolist(),
+    ).values_list('data', flat=True))
+    if not data:
+        return anchors
+    rejected = parse_frame(pd.DataFrame.from_records(data))
+    rejected = rejected.join(anchors.set_index('trade_code')['date'].rename('anchor'),
+                             on='trade_code')
+    rejected = rejected[(rejected['date'] > rejected['anchor'])
+                        & (rejected['date'] < before)]
+    # The same row may sit in quarantine once per file it came from
+    rejected = rejected.drop_duplicates(['trade_code', 'date']).sort_values('date')
+    streaks = rejected.groupby('trade_code').agg(
+        streak=('date', 'size'), level=('close', 'last'))
+    anchors = anchors.set_index('trade_code')
+    anchors.update(streaks)
+    return anchors.reset_index()
+
+
+def _stored_anchors(df):
+    """
+    Each symbol's jump-check anchor from the database: the date and close
+    of its latest traded row before df starts, so no-trade rows (which
+    carry a stale close) never serve as one.
+    """
+    before = df['date'].dropna().min()
+    if pd.isna(before):
+        return pd.DataFrame(columns=ANCHOR_COLUMNS)
+    traded = StockData.objects.filter(
+        trade_code=OuterRef('trade_code'), date__lt=before,
+    ).exclude(volume=0, high=0, low=0, open=0).order_by('-date')
+    # The catalog has one row per stored symbol; each lookup is one
+    # descent of the (trade_code, -date) index
+    rows = TradeCodeSummary.objects.filter(
+        trade_code__in=df['trade_code'].unique().tolist(),
+    ).annotate(
+        anchor_date=Subquery(traded.values('date')[:1]),
+        anchor_close=Subquery(traded.values('close')[:1]),
+    ).filter(anchor_date__isnull=False).values_list(
+        'trade_code', 'anchor_date', 'anchor_close')
+    anchors = pd.DataFrame.from_records(list(rows), columns=['trade_code', 'date', 'close'])
+    if anchors.empty:
+        return pd.DataFrame(columns=ANCHOR_COLUMNS)
+    return _jump_streaks(anchors, before)[ANCHOR_COLUMNS]
+
+
+def _in_archived_range(df):
+    """
+    Rows dated inside a range api.archive moved out of the hot table.
+    Inserting them would put a second copy of an archived row in StockData.
+    """
+    archived = pd.Series(False, index=df.index)
+    for row in archived_ranges():
+        archived |= ((df['date'] >= row['first_date'])
+                     & (df['date'] <= row['last_date']))
+    return archived
+
+
+def _quarantine(raw, problems, source, first_row):
+    """Store the raw values of rejected rows together with their reasons."""
+    reasons = describe(problems)
+    numbers = pd.Series(np.arange(len(raw)) + first_row, index=raw.index)
+    raw = raw.loc[reasons.index].astype(object)
+    records = raw.where(raw.notna(), None).to_dict('records')
+    QuarantinedRow.objects.bulk_create([
+        QuarantinedRow(source=source, row_number=int(number), data=record,
+                       reasons=reason)
+        for record, number, reason in zip(
+            records, numbers[reasons.index], reasons)
+    ], batch_size=settings.STOCK_IMPORT_BATCH_SIZE)
+
+
+def _insert_rows(df, batch_size):
+    """
+    Insert clean rows, leaving any whose (trade_code, date) is already
+    stored untouched, each with a fresh change seq. Returns the number of
+    rows inserted.
+
+    Rows go in as plain parameter tuples; building and compiling a model
+    instance per row used to be most of an import's time.
+    """
+    if df.empty:
+        return 0
+    first = allocate_seqs(len(df))
+    df = df[COLUMNS].assign(date=df['date'].astype(str),
+                            seq=np.arange(first, first + len(df)))
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        # bulk_create cannot tell which rows a conflict dropped, so count
+        # the keys before and after
+        keys = StockData.objects.filter(
+            trade_code__in=df['trade_code'].unique().tolist(),
+            date__range=(df['date'].min(), df['date'].max()))
+        before = keys.count()
+        StockData.objects.bulk_create(
+            [StockData(**row) for row in df.to_dict('records')],
+            batch_size=batch_size, ignore_conflicts=True)
+        return keys.count() - before
+
+    table = connection.ops.quote_name(StockData._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(name) for name in df.columns)
+    placeholders = '(' + ', '.join(['%s'] * len(df.columns)) + ')'
+    conflict = 'ON CONFLICT (trade_code, date) DO NOTHING'
+    rows = list(df.itertuples(index=False, name=None))
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            if connection.vendor == 'sqlite':
+                cursor.executemany(
+                    f'INSERT INTO {table} ({names}) VALUES {placeholders} {conflict}',
+                    batch)
+            else:
+                # One statement per batch; psycopg2's executemany makes a
+                # round trip per row
+                values = ', '.join([placeholders] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} ({names}) VALUES {values} {conflict}',
+                    [value for row in batch for value in row])
+            # Rows ON CONFLICT dropped, written since the lookup in
+            # write_frame, are not counted
+            inserted += cursor.rowcount
+    return inserted
+
+
+def check_frame(df):
+    """
+    Parse a raw frame and run the validation rules that need no stored
+    data, i.e. all but the jump check. Touches no database, so it can run
+    in another process. Returns (raw, parsed, problems) for write_frame.
+    """
+    raw = _normalise_columns(df)
+    parsed = parse_frame(raw)
+    return raw, parsed, find_problems(parsed)
+
+
+def _refresh(df):
+    """Bring the catalog, indicator backfills and cached reads up to date."""
+    if not df.empty:
+        codes = df['trade_code'].unique()
+        invalidate_backfills(df[['trade_code', 'date']])
+        refresh_symbols(codes)
+        invalidate(codes, df['date'].unique())
+
+
+class _Closes:
+    """
+    Each symbol's jump-check anchor (see validation._jumps) as a series of
+    writes leaves it, read from the database the first time the symbol
+    comes up. Carrying it from one frame to the next lets a run's
+    rejections count towards the same streak, and lets ingest_files hold
+    the catalog refresh back until a group of files commits.
+    """
+
+    def __init__(self):
+        self.anchors = {}
+
+    def previous(self, df):
+        codes = df['trade_code'].unique().tolist()
+        missing = [code for code in codes if code not in self.anchors]
+        if missing:
+            self.anchors.update(dict.fromkeys(missing))
+            stored = _stored_anchors(df[df['trade_code'].isin(missing)])
+            self.update(stored)
+        return pd.DataFrame.from_records(
+            [(code,) + self.anchors[code] for code in codes if self.anchors[code]],
+            columns=ANCHOR_COLUMNS)
+
+    def update(self, anchors):
+        if anchors is None:
+            return
+        for code, *anchor in anchors[ANCHOR_COLUMNS].itertuples(index=False, name=None):
+            # Rows older than the anchor were checked without it
+            if not self.anchors.get(code) or anchor[0] >= self.anchors[code][0]:
+                self.anchors[code] = tuple(anchor)
+
+
+def write_frame(raw, df, problems, batch_size=None, stats=None, source='',
+                first_row=1, closes=None, refresh=True):
+    """
+    Finish validating a frame from check_frame against the stored closes,
+    then insert its rows that passed and are not yet in the database.
+
+    Rejected rows are moved to QuarantinedRow with their reasons, numbered
+    from first_row within source. Conflicts on the (trade_code, date)
+    unique key are resolved with a single set-based lookup, and the new
+    rows are written in batches inside one transaction. closes, a _Closes
+    shared by the frames of one run, carries the jump check's anchors
+    from frame to frame; without it they come from the database. With
+    refresh=False, updating derived state is left to the caller. Returns
+    the rows inserted.
+    """
+    batch_size = batch_size or settings.STOCK_IMPORT_BATCH_SIZE
+    stats = stats or IngestStats()
+    closes = closes or _Closes()
+
+    stats.total += len(df)
+    problems['archived_range'] = _in_archived_range(df) & ~problems.any(axis=1)
+    if settings.STOCK_IMPORT_MAX_DAILY_MOVE:
+        closes.update(add_jumps(df, problems, closes.previous(df),
+                                settings.STOCK_IMPORT_MAX_DAILY_MOVE,
+                                settings.STOCK_IMPORT_JUMP_STREAK))
+    rejected = problems.any(axis=1)
+    stats.invalid += int(rejected.sum())
+    for rule, count in count_reasons(problems).items():
+        stats.rejections[rule] = stats.rejections.get(rule, 0) + count
+    df = df[~rejected].astype({'volume': 'int64'})
+
+    existing = _existing_keys(df)
+    if existing:
+        keys = pd.Series(list(zip(df['trade_code'], df['date'])), index=df.index)
+        is_new = ~keys.isin(existing)
+        stats.skipped += int((~is_new).sum())
+        df = df[is_new]
+
+    with transaction.atomic():
+        if rejected.any():
+            _quarantine(raw, problems, source, first_row)
+        inserted = _insert_rows(df, batch_size)
+        if refresh:
+            _refresh(df)
+    stats.created += inserted
+    stats.skipped += len(df) - inserted
+    return df
+
+
+def ingest_frame(df, batch_size=None, stats=None, source='', first_row=1,
+                 closes=None):
+    """
+    Insert the rows of a raw frame that pass validation and are not yet in
+    the database; check_frame followed by write_frame.
+    """
+    stats = stats or IngestStats()
+    started = time.perf_counter()
+    write_frame(*check_frame(df), batch_size=batch_size, stats=stats,
+                source=source, first_row=first_row, closes=closes)
+    stats.elapsed += time.perf_counter() - started
+    return stats
+
+
+def iter_csv_chunks(path, chunksize, skip=0):
+    """Yield raw frames of at most chunksize rows from a CSV file."""
+    # A callable keeps skiprows constant-memory however far we resume
+    skiprows = (lambda i: 0 < i <= skip) if skip else None
+    yield from pd.read_csv(path, dtype=str, chunksize=chunksize,
+                           skiprows=skiprows)
+
+
+def iter_json_records(path, read_size=64 * 1024):
+    """Yield the objects of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8-sig') as file:
+        buffer, pos, eof, in_array = '', 0, False, False
+        while True:
+            pos = _JSON_SKIP.match(buffer, pos).end()
+            if pos < len(buffer):
+                if not in_array:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"{path} does not contain a JSON array")
+                    in_array = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # A value ending exactly at the buffer edge may be cut short
+                    if end < len(buffer) or eof:
+                        yield record
+                        pos = end
+                        continue
+            elif eof:
+                raise ValueError(f"Unexpected end of JSON array in {path}")
+
+            chunk = file.read(read_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = not chunk
+
+
+def iter_json_chunks(path, chunksize, skip=0):
+    """Yield raw frames of at most chunksize records from a JSON array file."""
+    records = []
+    for index, record in enumerate(iter_json_records(path)):
+        if index < skip:
+            continue
+        records.append(record)
+        if len(records) == chunksize:
+            yield pd.DataFrame(records, columns=COLUMNS)
+            records = []
+    if records:
+        yield pd.DataFrame(records, columns=COLUMNS)
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def ingest_stream(path, chunks, chunksize, batch_size=None, resume=True,
+                  progress=None):
+    """
+    Feed fixed-size chunks from a reader into the database.
+
+    chunks is one of the iter_*_chunks readers. Rows failing validation are
+    quarantined under the file's absolute path. After each chunk is written
+    the row offset is stored in ImportCheckpoint in the same transaction, so
+    an interrupted import restarts at the last committed chunk as long as the
+    file itself has not changed. progress, if given, is called with the
+    running IngestStats after every committed chunk.
+    """
+    source = os.path.abspath(path)
+    fingerprint = _fingerprint(path)
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+        source=source, defaults={'fingerprint': fingerprint})
+    if (not resume or checkpoint.completed
+            or checkpoint.fingerprint != fingerprint):
+        checkpoint.fingerprint = fingerprint
+        checkpoint.rows_committed = 0
+        checkpoint.completed = False
+        checkpoint.save()
+    if not checkpoint.rows_committed:
+        # Starting from the top; rows rejected by an earlier run come back
+        QuarantinedRow.objects.filter(source=source).delete()
+
+    stats = IngestStats()
+    stats.resumed_from = checkpoint.rows_committed
+    closes = _Closes()
+    for chunk in chunks(path, chunksize, skip=checkpoint.rows_committed):
+        with transaction.atomic():
+            ingest_frame(chunk, batch_size=batch_size, stats=stats,
+                         source=source,
+                         first_row=checkpoint.rows_committed + 1,
+                         closes=closes)
+            checkpoint.rows_committed += len(chunk)
+            checkpoint.save(update_fields=['rows_committed', 'updated_at'])
+        if progress:
+            progress(stats)
+
+    checkpoint.completed = True
+    checkpoint.save(update_fields=['completed', 'updated_at'])
+    return stats
+
+
+def ingest_csv(path, batch_size=None, chunksize=None, resume=True,
+               progress=None):
+    """Stream a CSV file of stock rows into the database."""
+    chunksize = chunksize or settings.STOCK_IMPORT_CHUNK_SIZE
+    return ingest_stream(path, iter_csv_chunks, chunksize,
+                         batch_size=batch_size, resume=resume,
+                         progress=progress)
+
+
+def ingest_json(path, batch_size=None, chunksize=None, resume=True,
+                progress=None):
+    """Stream a JSON array of stock rows into the database."""
+    chunksize = chunksize or settings.STOCK_IMPORT_CHUNK_SIZE
+    return ingest_stream(path, iter_json_chunks, chunksize,
+                         batch_size=batch_size, resume=resume,
+                         progress=progress)
+
+
+def ingest_file(path, **kwargs):
+    """Stream a .csv or .json file into the database."""
+    if path.lower().endswith('.json'):
+        return ingest_json(path, **kwargs)
+    return ingest_csv(path, **kwargs)
+
+
+def _check_file(path, chunksize):
+    """Read and check every chunk of one file; runs in a worker process."""
+    started = time.perf_counter()
+    chunks = iter_json_chunks if path.lower().endswith('.json') else iter_csv_chunks
+    checked = [check_frame(chunk) for chunk in chunks(path, chunksize)]
+    return checked, time.perf_counter() - started
+
+
+def ingest_files(paths, workers=None, batch_size=None, chunksize=None,
+                 progress=None):
+    """
+    Import many .csv/.json files, reading, parsing and checking them in a
+    pool of worker processes while this process alone writes the results.
+
+    Files are written in the order given, however the workers finish, so
+    the outcome (ids and change seqs included) does not depend on the
+    number of workers, and rows are accepted or rejected as if the files
+    were imported one after another. Files are committed in groups of
+    about chunksize rows, with the catalog and caches refreshed once per
+    group. A few files are checked ahead of the writer, keeping memory
+    bounded. Each file is handled whole by one worker, so a single big
+    file gains nothing; ingest_file streams it with checkpoints instead.
+    There are no checkpoints, so no resume option either: a rerun reads
+    every file again and skips the rows already stored.
+
+    Rejected rows are quarantined under each file's absolute path. A file
+    that cannot be read is reported and the others still go in. progress,
+    if given, is called with the running IngestStats after every group.
+    Returns the total IngestStats and one report dict per file.
+    """
+    workers = workers or os.cpu_count()
+    chunksize = chunksize or settings.STOCK_IMPORT_CHUNK_SIZE
+    total = IngestStats()
+    reports = []
+    closes = _Closes()
+    started = time.perf_counter()
+
+    def write_group(group):
+        written = []
+        with transaction.atomic():
+            for path, checked, report in group:
+                source = os.path.abspath(path)
+                stats = IngestStats()
+                writing = time.perf_counter()
+                QuarantinedRow.objects.filter(source=source).delete()
+                first_row = 1
+                for raw, parsed, problems in checked:
+                    rows = write_frame(
+                        raw, parsed, problems, batch_size=batch_size,
+                        stats=stats, source=source, first_row=first_row,
+                        closes=closes, refresh=False)
+                    written.append(rows)
+                    first_row += len(raw)
+                stats.elapsed = time.perf_counter() - writing
+                report.update({
+                    'rows': stats.total,
+                    'created': stats.created,
+                    'skipped': stats.skipped,
+                    'invalid': stats.invalid,
+                    'rejections': stats.rejections,
+                    'write_seconds': round(stats.elapsed, 3),
+                })
+                total.merge(stats)
+            if written:
+                _refresh(pd.concat(written, ignore_index=True))
+        total.elapsed = time.perf_counter() - started
+        if progress:
+            progress(total)
+
+    # Forked workers must not inherit a live database connection. Inside
+    # a caller's transaction the connection has to stay open, so workers
+    # are spawned instead, which is slower to start. Either way they need
+    # Django set up before unpickling their task
+    context = None
+    if connection.in_atomic_block:
+        context = multiprocessing.get_context('spawn')
+    else:
+        connections.close_all()
+    with ProcessPoolExecutor(workers, mp_context=context,
+                             initializer=django.setup) as pool:
+        queue = iter(paths)
+        pending = deque()
+
+        def submit():
+            path = next(queue, None)
+            if path is not None:
+                pending.append((path, pool.submit(_check_file, path, chunksize)))
+
+        for _ in range(workers * 2):
+            submit()
+        group, group_rows = [], 0
+        while pending:
+            path, future = pending.popleft()
+            submit()
+            waiting = time.perf_counter()
+            report = {'path': path}
+            reports.append(report)
+            try:
+                checked, parse_seconds = future.result()
+            except Exception as e:
+                report['error'] = str(e)
+                continue
+            # Time in a worker, and spent here waiting for it to finish
+            report['parse_seconds'] = round(parse_seconds, 3)
+            report['wait_seconds'] = round(time.perf_counter() - waiting, 3)
+            group.append((path, checked, report))
+            group_rows += sum(len(raw) for raw, _, _ in checked)
+            if group_rows >= chunksize:
+                write_group(group)
+                group, group_rows = [], 0
+        if group:
+            write_group(group)
+
+    total.elapsed = time.perf_counter() - started
+    return total, reports
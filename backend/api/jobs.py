@@ -0,0 +1,144 @@
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .ingest import ingest_file
+from .models import ImportJob
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.STOCK_IMPORT_THREADS,
+            thread_name_prefix='stock-import')
+    return _executor
+
+
+def _submit(job_id):
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job_id))
+
+
+def recover_stale_jobs():
+    """
+    Requeue running jobs whose heartbeat is older than
+    STOCK_IMPORT_JOB_TIMEOUT, as their process most likely died; the
+    import resumes from its checkpoint. Jobs already claimed
+    STOCK_IMPORT_JOB_MAX_ATTEMPTS times are marked failed instead.
+
+    With the thread runner, requeued jobs and pending ones that have waited
+    that long are handed to this process's pool, since the process that
+    queued them may be gone. A claim only succeeds once, so a job the
+    other process still holds is not run twice. Returns the requeued ids.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.STOCK_IMPORT_JOB_TIMEOUT)
+    # Jobs claimed before heartbeats were recorded only have started_at
+    silent = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True,
+                                            started_at__lt=cutoff)
+    stale = ImportJob.objects.filter(silent, status=ImportJob.RUNNING)
+    stale.filter(attempts__gte=settings.STOCK_IMPORT_JOB_MAX_ATTEMPTS).update(
+        status=ImportJob.FAILED, finished_at=now,
+        error='The import stopped reporting progress too many times.')
+    requeued = list(stale.values_list('pk', flat=True))
+    # Only jobs still stale at the update are requeued
+    ImportJob.objects.filter(silent, pk__in=requeued, status=ImportJob.RUNNING).update(
+        status=ImportJob.PENDING)
+
+    if settings.STOCK_IMPORT_JOB_RUNNER == 'thread':
+        waiting = ImportJob.objects.filter(
+            status=ImportJob.PENDING, created_at__lt=cutoff).values_list('pk', flat=True)
+        for job_id in set(requeued) | set(waiting):
+            _submit(job_id)
+    return requeued
+
+
+def enqueue_import(path):
+    """
+    Queue an import of path and return (job, created).
+
+    If the same file already has a pending or running job, that job is
+    returned instead of starting a second one, unless it is stale (see
+    recover_stale_jobs).
+    """
+    source = os.path.abspath(path)
+    recover_stale_jobs()
+    try:
+        with transaction.atomic():
+            job = ImportJob.objects.create(source=source)
+    except IntegrityError:
+        job = ImportJob.objects.filter(
+            source=source, status__in=ImportJob.ACTIVE_STATUSES).first()
+        if job is not None:
+            return job, False
+        # The active job finished in between; queue a fresh one
+        job = ImportJob.objects.create(source=source)
+
+    if settings.STOCK_IMPORT_JOB_RUNNER == 'thread':
+        _submit(job.pk)
+    return job, True
+
+
+def _claim(job_id):
+    # The conditional update makes the claim safe across worker processes
+    now = timezone.now()
+    return ImportJob.objects.filter(pk=job_id, status=ImportJob.PENDING).update(
+        status=ImportJob.RUNNING, started_at=now, heartbeat_at=now,
+        attempts=F('attempts') + 1)
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending job as running and return it, or None. Stale
+    running jobs are requeued first.
+    """
+    recover_stale_jobs()
+    for job_id in ImportJob.objects.filter(
+            status=ImportJob.PENDING).order_by('created_at').values_list(
+            'pk', flat=True)[:10]:
+        if _claim(job_id):
+            return ImportJob.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job to completion, recording progress as it goes."""
+    def progress(stats):
+        ImportJob.objects.filter(pk=job.pk).update(
+            rows_processed=stats.total,
+            rows_created=stats.created,
+            rows_skipped=stats.skipped,
+            rows_invalid=stats.invalid,
+            rows_per_sec=stats.rows_per_sec,
+            rejections=stats.rejections,
+            heartbeat_at=timezone.now(),
+        )
+
+    try:
+        stats = ingest_file(job.source, progress=progress)
+        progress(stats)
+        job.status = ImportJob.COMPLETED
+    except Exception:
+        job.status = ImportJob.FAILED
+        job.error = traceback.format_exc(limit=5)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    job.refresh_from_db()
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        if _claim(job_id):
+            run_job(ImportJob.objects.get(pk=job_id))
+    finally:
+        # Each pool thread has its own connection; don't leak it
+        connections.close_all()
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from api.archive import archive_before, restore_range
+from api.models import ArchivedRange
+from api.partitioning import INTERVALS
+
+
+class Command(BaseCommand):
+    help = ('Move old StockData out of the hot table: partitions into '
+            'compressed columnar files on PostgreSQL, rows into an archive '
+            'table elsewhere')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat, default=None,
+                            help='Archive whole periods ending by this date (YYYY-MM-DD)')
+        parser.add_argument('--keep-days', type=int, default=None,
+                            help='Archive whole periods older than this many days')
+        parser.add_argument('--interval', choices=INTERVALS, default='year',
+                            help='Period size when archiving to the archive table')
+        parser.add_argument('--restore', metavar='NAME', default=None,
+                            help='Move an archived range back into StockData')
+        parser.add_argument('--list', action='store_true',
+                            help='Only list the archived ranges')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            try:
+                restored = restore_range(options['restore'])
+            except ArchivedRange.DoesNotExist:
+                raise CommandError(f"No archived range named {options['restore']}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Restored {restored} rows from {options['restore']}"))
+        elif not options['list']:
+            if (options['before'] is None) == (options['keep_days'] is None):
+                raise CommandError('Give one of --before and --keep-days')
+            cutoff = options['before'] or (
+                date.today() - timedelta(days=options['keep_days']))
+            archived = archive_before(cutoff, options['interval'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {len(archived)} ranges ending by {cutoff}'))
+
+        for archived in ArchivedRange.objects.all():
+            self.stdout.write(
+                f'{archived.name}: {archived.first_date} to {archived.last_date}, '
+                f'{archived.row_count} rows in the {archived.get_storage_display().lower()}')
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def _get(url):
+    """Issue one GET over a fresh connection; return the status code."""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, port, ssl=parts.scheme == 'https')
+    target = parts.path + (f'?{parts.query}' if parts.query else '')
+    writer.write(
+        f'GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n'
+        'Connection: close\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+class Command(BaseCommand):
+    help = ('Load-test running servers, e.g. the WSGI deployment against the '
+            'ASGI one, reporting requests/sec and latency percentiles as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NAME=BASE_URL',
+            help='Server to test, e.g. wsgi=http://localhost:8000/api/stocks/ '
+                 'and asgi=http://localhost:8001/api/async/stocks/')
+        parser.add_argument(
+            '--paths', default='?trade_code=ACI,catalog/,series/?trade_code=ACI',
+            help='Comma separated paths appended to each base URL')
+        parser.add_argument('--concurrency', default='10,100,500',
+                            help='Comma separated numbers of concurrent clients')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per target, path and concurrency level')
+        parser.add_argument('--bust-cache', action='store_true',
+                            help='Make every URL unique so the response cache misses')
+        parser.add_argument('--output', default=None,
+                            help='Write the JSON report to this file')
+
+    async def run_level(self, url, concurrency, total, bust_cache):
+        latencies, errors = [], 0
+        remaining = iter(range(total))
+
+        async def client():
+            nonlocal errors
+            for _ in remaining:
+                target = url
+                if bust_cache:
+                    sep = '&' if '?' in url else '?'
+                    target = f'{url}{sep}nocache={uuid.uuid4().hex}'
+                started = time.perf_counter()
+                try:
+                    status = await _get(target)
+                except OSError:
+                    status = None
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        ms = np.array(latencies) * 1000
+        return {
+            'requests': total,
+            'errors': errors,
+            'requests_per_sec': round(total / elapsed, 1),
+            'p50_ms': round(float(np.percentile(ms, 50)), 2),
+            'p99_ms': round(float(np.percentile(ms, 99)), 2),
+            'max_ms': round(float(ms.max()), 2),
+        }
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, base = target.partition('=')
+            if not sep or not base:
+                raise CommandError(f'--target must look like NAME=URL, got {target!r}')
+            targets.append((name, base))
+        paths = [path for path in options['paths'].split(',') if path]
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        results = []
+        for path in paths:
+            for level in levels:
+                for name, base in targets:
+                    result = asyncio.run(self.run_level(
+                        base + path, level, options['requests'],
+                        options['bust_cache']))
+                    results.append({'target': name, 'path': path,
+                                    'concurrency': level, **result})
+                    self.stdout.write(
+                        f"{name} {path} x{level}: "
+                        f"{result['requests_per_sec']} req/s, "
+                        f"p99 {result['p99_ms']} ms, {result['errors']} errors")
+
+        output = json.dumps({'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote report to {options['output']}"))
+        else:
+            self.stdout.write(output)
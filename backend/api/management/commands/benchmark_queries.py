@@ -0,0 +1,94 @@
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Q
+from api.models import StockData
+
+
+class Command(BaseCommand):
+    help = 'Record EXPLAIN plans and latencies of typical dashboard queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trade-code', default=None,
+                            help='Trade code to query (defaults to the busiest one)')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Timed runs per query')
+        parser.add_argument('--output', default=None,
+                            help='Write the JSON report to this file')
+
+    def dashboard_queries(self, trade_code):
+        latest = StockData.objects.filter(trade_code=trade_code).order_by('-date').first()
+        end = latest.date if latest else None
+        start = end.replace(day=1) if end else None
+        middle = StockData.objects.order_by('-date', '-id')[
+            StockData.objects.count() // 2]
+
+        return {
+            'list_by_trade_code': StockData.objects.filter(
+                trade_code=trade_code).order_by('-date', '-id')[:100],
+            'list_by_trade_code_and_range': StockData.objects.filter(
+                trade_code=trade_code, date__gte=start, date__lte=end,
+            ).order_by('-date', '-id')[:100],
+            'list_all_first_page': StockData.objects.order_by('-date', '-id')[:100],
+            'list_all_keyset_middle': StockData.objects.filter(
+                Q(date__lt=middle.date) | Q(date=middle.date, id__lt=middle.id)
+            ).order_by('-date', '-id')[:100],
+            'chart_series': StockData.objects.filter(
+                trade_code=trade_code).order_by('date').values_list(
+                'date', 'open', 'high', 'low', 'close', 'volume'),
+            'count_by_trade_code': StockData.objects.filter(trade_code=trade_code),
+            'unique_trade_codes': StockData.objects.values_list(
+                'trade_code', flat=True).distinct(),
+        }
+
+    def time_query(self, name, queryset, repeat):
+        if name.startswith('count'):
+            run = queryset.count
+        else:
+            def run():
+                return list(queryset.all())
+
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        return {
+            'plan': queryset.explain(),
+            'median_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+            'max_ms': round(samples[-1], 3),
+        }
+
+    def handle(self, *args, **options):
+        if not StockData.objects.exists():
+            self.stdout.write(self.style.ERROR('No stock data to benchmark'))
+            return
+
+        trade_code = options['trade_code'] or StockData.objects.values(
+            'trade_code').annotate(n=Count('id')).order_by('-n')[0]['trade_code']
+        report = {
+            'vendor': connection.vendor,
+            'rows': StockData.objects.count(),
+            'trade_code': trade_code,
+            'repeat': options['repeat'],
+            'queries': {},
+        }
+        for name, queryset in self.dashboard_queries(trade_code).items():
+            report['queries'][name] = self.time_query(
+                name, queryset, options['repeat'])
+            self.stdout.write(
+                f"{name}: median {report['queries'][name]['median_ms']} ms")
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote report to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
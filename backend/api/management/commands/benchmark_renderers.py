@@ -0,0 +1,69 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from api.models import StockData
+from api.renderers import COLUMNAR_FIELDS, ColumnarJSONRenderer, rows_to_columns
+from api.serializers import StockDataSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the serializer read path with the columnar one at several sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma separated row counts')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per size; the best one is reported')
+        parser.add_argument('--output', default=None,
+                            help='Write the JSON report to this file')
+
+    def serializer_path(self, n):
+        rows = list(StockData.objects.order_by('-date', '-id')[:n])
+        data = StockDataSerializer(rows, many=True).data
+        return JSONRenderer().render(data)
+
+    def columnar_path(self, n):
+        rows = list(StockData.objects.order_by('-date', '-id').values_list(
+            *COLUMNAR_FIELDS)[:n])
+        return ColumnarJSONRenderer().render(rows_to_columns(rows))
+
+    def best_of(self, func, n, repeat):
+        best, size = None, 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            size = len(func(n))
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return {'ms': round(best * 1000, 2), 'bytes': size}
+
+    def handle(self, *args, **options):
+        available = StockData.objects.count()
+        results = []
+        for n in [int(size) for size in options['sizes'].split(',')]:
+            if n > available:
+                self.stdout.write(self.style.WARNING(
+                    f'Skipping {n} rows: only {available} in the database'))
+                continue
+            serializer = self.best_of(self.serializer_path, n, options['repeat'])
+            columnar = self.best_of(self.columnar_path, n, options['repeat'])
+            speedup = serializer['ms'] / columnar['ms'] if columnar['ms'] else None
+            results.append({
+                'rows': n,
+                'serializer': serializer,
+                'columnar': columnar,
+                'speedup': round(speedup, 2) if speedup else None,
+            })
+            self.stdout.write(
+                f"{n} rows: serializer {serializer['ms']} ms, "
+                f"columnar {columnar['ms']} ms")
+
+        output = json.dumps({'rows_available': available, 'results': results},
+                            indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote report to {options['output']}"))
+        else:
+            self.stdout.write(output)
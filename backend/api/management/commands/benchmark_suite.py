@@ -0,0 +1,197 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+import django
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from api.ingest import ingest_csv
+from api.models import ImportCheckpoint, StockData
+from api.snapshot import clear_stock_data, dump_snapshot, load_frames, restore_snapshot
+from api.synthetic import shape_for_rows, synthetic_frames
+
+
+def _summary(samples, queries):
+    samples = sorted(samples)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[max(0, int(len(samples) * 0.95) - 1)], 3),
+        'max_ms': round(samples[-1], 3),
+        'queries': max(queries),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Time the importers, list/filter/paginate reads and CRUD on synthetic '
+            'data at several table sizes, reporting JSON for tracking regressions. '
+            'Replaces StockData while it runs and restores it afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10000,1000000,10000000',
+                            help='Comma separated StockData row counts')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed requests per endpoint and scale')
+        parser.add_argument('--import-limit', type=int, default=1000000,
+                            help='Most rows pushed through the streaming CSV importer')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--label', default='',
+                            help='Free text stored in the report, e.g. a version')
+        parser.add_argument('--output', default=None,
+                            help='Write the JSON report to this file')
+        parser.add_argument('--replace-data', action='store_true',
+                            help='Confirm that StockData may be replaced during the run')
+
+    def request(self, client, method, url, repeat, data=None):
+        """Time repeat requests; GETs get a unique parameter to miss the cache."""
+        if method == 'get' and not callable(url):
+            # Untimed, so imports and first-use setup aren't counted
+            client.get(url)
+        samples, queries = [], []
+        for i in range(repeat):
+            target = url(i) if callable(url) else url
+            kwargs = {}
+            if method == 'get':
+                target += ('&' if '?' in target else '?') + f'_bench={time.time_ns()}'
+            elif data is not None:
+                kwargs = {'data': data(i) if callable(data) else data,
+                          'content_type': 'application/json'}
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(target, **kwargs)
+                samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f'{method.upper()} {target} returned '
+                                   f'{response.status_code}: {response.content[:200]}')
+            queries.append(len(captured))
+        return _summary(samples, queries)
+
+    def endpoints(self, rows):
+        code = StockData.objects.values_list('trade_code', flat=True).first()
+        last = StockData.objects.order_by('-date').values_list('date', flat=True)[0]
+        quarter = (last - timedelta(days=91)).isoformat()
+        month = (last - timedelta(days=30)).isoformat()
+        middle_page = max(1, rows // 100 // 2)
+        return {
+            'list_first_page': '/api/stocks/',
+            'list_middle_page': f'/api/stocks/?page={middle_page}',
+            'list_keyset_first_page': '/api/stocks/?pagination=keyset',
+            'list_columnar_1000': '/api/stocks/?format=columnar&page_size=1000',
+            'filter_trade_code': f'/api/stocks/?trade_code={code}',
+            'filter_trade_code_quarter':
+                f'/api/stocks/?trade_code={code}&start_date={quarter}',
+            'filter_date_month': f'/api/stocks/?start_date={month}',
+            'unique_trade_codes': '/api/stocks/unique_trade_codes/',
+            'catalog': '/api/stocks/catalog/',
+            'ohlcv_weekly': f'/api/stocks/ohlcv/?trade_code={code}',
+            'series': f'/api/stocks/series/?trade_code={code}',
+        }
+
+    def crud(self, client, repeat):
+        first = date(1990, 1, 1)
+
+        def row(i):
+            return {'trade_code': 'BENCH', 'date': (first + timedelta(days=i)).isoformat(),
+                    'high': 11.0, 'low': 9.0, 'open': 10.0, 'close': 10.5,
+                    'volume': 1000}
+
+        report = {'create': self.request(client, 'post', '/api/stocks/', repeat, row)}
+        created = list(StockData.objects.filter(trade_code='BENCH').order_by(
+            'date').values_list('id', flat=True))
+        report['retrieve'] = self.request(
+            client, 'get', lambda i: f'/api/stocks/{created[i]}/', repeat)
+        report['update'] = self.request(
+            client, 'patch', lambda i: f'/api/stocks/{created[i]}/', repeat,
+            {'close': 10.7})
+        report['delete'] = self.request(
+            client, 'delete', lambda i: f'/api/stocks/{created[i]}/', repeat)
+        return report
+
+    def run_scale(self, rows, options, workdir):
+        symbols, days = shape_for_rows(rows)
+        result = {'rows': rows, 'symbols': symbols, 'days': days}
+
+        # The streaming importer, into an empty table
+        import_rows = min(rows, options['import_limit'])
+        path = os.path.join(workdir, f'synthetic_{import_rows}.csv')
+        started = time.perf_counter()
+        for index, df in enumerate(synthetic_frames(
+                symbols, days, seed=options['seed'], limit=import_rows)):
+            df.to_csv(path, mode='w' if index == 0 else 'a',
+                      header=index == 0, index=False)
+        generated = time.perf_counter() - started
+        clear_stock_data()
+        stats = ingest_csv(path, resume=False)
+        ImportCheckpoint.objects.filter(source=os.path.abspath(path)).delete()
+        os.remove(path)
+        result['generate_csv'] = {'rows': import_rows,
+                                  'seconds': round(generated, 3)}
+        result['ingest_csv'] = {'rows': import_rows,
+                                'seconds': round(stats.elapsed, 3),
+                                'rows_per_sec': round(stats.rows_per_sec, 1)}
+        self.stdout.write(f'{rows}: ingest_csv {stats.rows_per_sec:.0f} rows/s')
+
+        # The bulk loader, at full size
+        loaded, seconds = load_frames(
+            synthetic_frames(symbols, days, seed=options['seed'], limit=rows),
+            replace=True)
+        result['bulk_load'] = {'rows': loaded, 'seconds': round(seconds, 3),
+                               'rows_per_sec': round(loaded / seconds, 1)}
+        self.stdout.write(f'{rows}: bulk load {loaded / seconds:.0f} rows/s')
+
+        client = Client(HTTP_HOST='localhost')
+        result['endpoints'] = {}
+        for name, url in self.endpoints(rows).items():
+            result['endpoints'][name] = self.request(
+                client, 'get', url, options['repeat'])
+            self.stdout.write(
+                f"{rows}: {name} median {result['endpoints'][name]['median_ms']} ms")
+        result['crud'] = self.crud(client, options['repeat'])
+        return result
+
+    def handle(self, *args, **options):
+        if not options['replace_data']:
+            raise CommandError('The suite replaces every StockData row while it '
+                               'runs; pass --replace-data to confirm')
+        scales = [int(scale) for scale in options['scales'].split(',')]
+        report = {
+            'label': options['label'],
+            'started_at': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'pandas': pd.__version__,
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'scales': [],
+        }
+
+        with tempfile.TemporaryDirectory() as workdir:
+            backup = os.path.join(workdir, 'backup.ndjson.gz')
+            had_data = StockData.objects.exists()
+            if had_data:
+                dump_snapshot(backup)
+            try:
+                for rows in scales:
+                    report['scales'].append(self.run_scale(rows, options, workdir))
+            finally:
+                if had_data:
+                    restore_snapshot(backup)
+                else:
+                    load_frames([], replace=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote report to {options['output']}"))
+        else:
+            self.stdout.write(output)
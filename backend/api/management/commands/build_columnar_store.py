@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.columnar_store import columnar_store
+
+
+class Command(BaseCommand):
+    help = 'Write memory-mapped columnar snapshots of StockData per trade code'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trade-code', action='append', dest='trade_codes',
+                            help='Only snapshot this trade code (repeatable)')
+        parser.add_argument('--changed-only', action='store_true',
+                            help='Skip trade codes whose snapshot is still current')
+
+    def handle(self, *args, **options):
+        written = columnar_store.build(options['trade_codes'],
+                                       changed_only=options['changed_only'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} snapshots to {settings.COLUMNAR_STORE_DIR}'))
+        if settings.STOCK_READ_BACKEND != 'columnar':
+            self.stdout.write(self.style.WARNING(
+                'Set STOCK_READ_BACKEND=columnar to serve reads from the store'))
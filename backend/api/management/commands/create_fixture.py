@@ -1,19 +1,20 @@
 import os
-import json
 import pandas as pd
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from datetime import datetime
+from api.ingest import check_frame
+from api.snapshot import DEFAULT_SNAPSHOT, write_frames
+from api.validation import add_jumps, count_reasons
 
 
 class Command(BaseCommand):
-    help = 'Create fixture from CSV file'
+    help = 'Create a stock data snapshot (NDJSON, gzipped for .gz) from the CSV file'
 
-    def clean_number(self, value):
-        if isinstance(value, str):
-            return float(value.replace(',', ''))
-        return float(value)
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=DEFAULT_SNAPSHOT,
+                            help='Snapshot file to write; a .gz suffix compresses it')
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
         try:
             # Try different possible paths for the CSV file
             possible_paths = [
@@ -37,57 +38,28 @@ class Command(BaseCommand):
             # Read the CSV file
             self.stdout.write(self.style.SUCCESS(
                 f"Reading CSV from {csv_path}"))
-            df = pd.read_csv(csv_path)
-
-            # Clean data
-            df['volume'] = df['volume'].apply(
-                lambda x: str(x).replace(',', ''))
-            df['trade_code'] = df['trade_code'].astype(str)
-
-            # Remove duplicates based on trade_code and date
-            initial_count = len(df)
-            df = df.drop_duplicates(
-                subset=['trade_code', 'date'], keep='first')
-            removed_count = initial_count - len(df)
-
-            if removed_count > 0:
+            df = pd.read_csv(csv_path, dtype=str)
+
+            # Run the importers' data-quality checks; the whole history is
+            # in the file, so the jump check needs no stored closes
+            _, df, problems = check_frame(df)
+            add_jumps(df, problems, None, settings.STOCK_IMPORT_MAX_DAILY_MOVE,
+                      settings.STOCK_IMPORT_JUMP_STREAK)
+            for rule, count in sorted(count_reasons(problems).items()):
                 self.stdout.write(self.style.WARNING(
-                    f"Removed {removed_count} duplicate entries"))
+                    f"Dropped {count} rows: {rule}"))
+            df = df[~problems.any(axis=1)].astype({'volume': 'int64'})
 
             # Sort by date and trade_code
             df = df.sort_values(['date', 'trade_code'])
 
-            # Convert data to fixture format
-            fixture_data = []
-            for index, row in df.iterrows():
-                try:
-                    fixture_data.append({
-                        "model": "api.stockdata",
-                        "pk": len(fixture_data) + 1,
-                        "fields": {
-                            "date": row['date'],
-                            "trade_code": str(row['trade_code']),
-                            "high": self.clean_number(row['high']),
-                            "low": self.clean_number(row['low']),
-                            "open": self.clean_number(row['open']),
-                            "close": self.clean_number(row['close']),
-                            "volume": int(row['volume'])
-                        }
-                    })
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(
-                        f"Error processing row {index}: {str(e)}"))
-                    continue
-
-            # Write to fixture file
-            fixture_path = os.path.join('api', 'fixtures', 'initial_data.json')
-            os.makedirs(os.path.dirname(fixture_path), exist_ok=True)
-
-            with open(fixture_path, 'w') as f:
-                json.dump(fixture_data, f, indent=4)
+            # Write to snapshot file
+            output = options['output']
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+            count = write_frames([df], output)
 
             self.stdout.write(self.style.SUCCESS(
-                f'Successfully created fixture with {len(fixture_data)} records'))
+                f'Successfully created snapshot with {count} records at {output}'))
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
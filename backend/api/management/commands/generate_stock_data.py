@@ -0,0 +1,57 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.snapshot import load_frames
+from api.synthetic import DEFAULT_START, shape_for_rows, synthetic_frames
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic random-walk OHLCV data for load testing, '
+            'into a CSV file or straight into the database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=None,
+                            help='Total rows; picks --symbols and --days to match')
+        parser.add_argument('--symbols', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=2500,
+                            help='Trading days per symbol')
+        parser.add_argument('--start', default=DEFAULT_START,
+                            help='First trading day (YYYY-MM-DD)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Same seed and sizes give the same data')
+        parser.add_argument('--no-trade-ratio', type=float, default=0.05,
+                            help='Share of untraded days per symbol')
+        parser.add_argument('--output', default=None,
+                            help='CSV file to write (.gz compresses it)')
+        parser.add_argument('--database', action='store_true',
+                            help='Bulk load the rows into StockData instead')
+        parser.add_argument('--replace', action='store_true',
+                            help='With --database, delete existing rows first')
+
+    def handle(self, *args, **options):
+        if bool(options['output']) == options['database']:
+            raise CommandError('Give exactly one of --output and --database')
+
+        symbols, days = options['symbols'], options['days']
+        if options['rows']:
+            symbols, days = shape_for_rows(options['rows'], days)
+        frames = synthetic_frames(
+            symbols, days, start=options['start'], seed=options['seed'],
+            no_trade_ratio=options['no_trade_ratio'], limit=options['rows'])
+
+        if options['database']:
+            count, elapsed = load_frames(frames, replace=options['replace'])
+        else:
+            started = time.perf_counter()
+            output = options['output']
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+            count = 0
+            for index, df in enumerate(frames):
+                df.to_csv(output, mode='w' if index == 0 else 'a',
+                          header=index == 0, index=False)
+                count += len(df)
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {count} rows for {symbols} symbols over {days} days '
+            f'in {elapsed:.2f}s'))
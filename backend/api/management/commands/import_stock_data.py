@@ -0,0 +1,89 @@
+import glob
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from api.ingest import ingest_file, ingest_files
+
+EXTENSIONS = ('.csv', '.json')
+
+
+def _expand(path):
+    """Sorted files named by a directory or glob pattern; None for a plain path."""
+    if os.path.isdir(path):
+        path = os.path.join(path, '*')
+    elif not glob.has_magic(path):
+        return None
+    return sorted(name for name in glob.glob(path)
+                  if os.path.isfile(name) and name.lower().endswith(EXTENSIONS))
+
+
+class Command(BaseCommand):
+    help = ('Stream a CSV or JSON file of stock data into the database, or '
+            'import every file in a directory or glob in parallel')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='A .csv or .json file, a directory, '
+                                         'or a quoted glob such as "feeds/*.csv"')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows read and committed per chunk')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per insert batch')
+        parser.add_argument('--no-resume', action='store_true',
+                            help='Ignore any checkpoint and start from the top '
+                                 '(single files only; directories keep none)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes parsing files of a directory or glob '
+                                 '(default: one per CPU)')
+        parser.add_argument('--report', default=None,
+                            help='Also write the summary report as JSON to this file')
+
+    def import_many(self, paths, options):
+        stats, files = ingest_files(
+            paths,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            chunksize=options['chunk_size'],
+        )
+        for report in files:
+            if 'error' in report:
+                self.stdout.write(self.style.ERROR(
+                    f"{report['path']}: {report['error']}"))
+            else:
+                self.stdout.write(
+                    f"{report['path']}: {report['rows']} rows, "
+                    f"{report['created']} created, parse {report['parse_seconds']:.2f}s, "
+                    f"write {report['write_seconds']:.2f}s")
+        report = stats.as_dict()
+        report['files'] = files
+        return stats, report
+
+    def handle(self, *args, **options):
+        paths = _expand(options['path'])
+        if paths == []:
+            raise CommandError(f"No .csv or .json files match {options['path']}")
+        if paths and options['no_resume']:
+            raise CommandError('--no-resume only applies to a single file; '
+                               'directory and glob imports keep no checkpoints')
+        try:
+            if paths is None:
+                stats = ingest_file(
+                    options['path'],
+                    chunksize=options['chunk_size'],
+                    batch_size=options['batch_size'],
+                    resume=not options['no_resume'],
+                )
+                report = stats.as_dict()
+                if stats.resumed_from:
+                    self.stdout.write(
+                        f"Resumed after {stats.resumed_from} committed rows")
+            else:
+                stats, report = self.import_many(paths, options)
+            self.stdout.write(self.style.SUCCESS(str(stats)))
+            for rule, count in sorted(stats.rejections.items()):
+                self.stdout.write(self.style.WARNING(
+                    f"Quarantined {count} rows: {rule}"))
+            if options['report']:
+                with open(options['report'], 'w') as f:
+                    json.dump(report, f, indent=2)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
@@ -1,38 +1,35 @@
-import os
 import pandas as pd
 from django.core.management.base import BaseCommand
-from api.models import StockData
-from api.serializers import StockDataSerializer
-from datetime import datetime
+from django.db import transaction
+from api.caching import invalidate_all
+from api.catalog import rebuild_catalog
+from api.changes import reset_change_log
+from api.ingest import ingest_frame
+from api.snapshot import clear_stock_data
 
+CSV_PATH = 'dataset/stock_market_data.csv'
 
-class Command(BaseCommand):
-    help = 'Load stock market data from CSV file'
 
-    def handle(self, *args, **kwargs):
-        # Clear existing data
-        StockData.objects.all().delete()
+class Command(BaseCommand):
+    help = 'Replace the stock data with the rows of the bundled CSV file'
 
-        # Read the CSV file
-        df = pd.read_csv('dataset/stock_market_data.csv')
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per insert batch')
 
-        # Convert data to list of StockData objects
-        stock_objects = []
-        for _, row in df.iterrows():
-            stock_objects.append(
-                StockData(
-                    date=datetime.strptime(row['date'], '%Y-%m-%d').date(),
-                    trade_code=row['trade_code'],
-                    high=row['high'],
-                    low=row['low'],
-                    open=row['open'],
-                    close=row['close'],
-                    volume=row['volume']
-                )
-            )
+    def handle(self, *args, **options):
+        df = pd.read_csv(CSV_PATH)
 
-        # Bulk create the objects
-        StockData.objects.bulk_create(stock_objects)
+        # Clear existing data; the rows are reloaded through the same
+        # validation and refresh path as every other import
+        with transaction.atomic():
+            clear_stock_data()
+            reset_change_log()
+            rebuild_catalog()
+            invalidate_all()
 
-        self.stdout.write(self.style.SUCCESS(
-            f'Successfully loaded {len(stock_objects)} stock records'))
+        stats = ingest_frame(df, batch_size=options['batch_size'], source=CSV_PATH)
+        self.stdout.write(self.style.SUCCESS(str(stats)))
+        for rule, count in sorted(stats.rejections.items()):
+            self.stdout.write(self.style.WARNING(
+                f"Quarantined {count} rows: {rule}"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.partitioning import INTERVALS, partition_stock_data, partitions
+
+
+class Command(BaseCommand):
+    help = ('Partition StockData by range on date (PostgreSQL), converting '
+            'the table on the first run and adding new periods afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', choices=INTERVALS, default='year',
+                            help='One partition per year or per month')
+        parser.add_argument('--ahead', type=int, default=1,
+                            help='Empty partitions to create past the current period')
+        parser.add_argument('--list', action='store_true',
+                            help='Only list the partitions and their row counts')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Declarative partitioning needs PostgreSQL; on this database '
+                'use archive_stock_data to split off a cold archive table')
+
+        if not options['list']:
+            created = partition_stock_data(options['interval'], options['ahead'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Created {len(created)} partitions'))
+
+        with connection.cursor() as cursor:
+            for name, lo, hi in partitions(cursor):
+                cursor.execute(f'SELECT count(*) FROM {connection.ops.quote_name(name)}')
+                bounds = f'{lo} to {hi}' if lo else 'default'
+                self.stdout.write(f'{name}: {bounds}, {cursor.fetchone()[0]} rows')
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from api.jobs import claim_next_job, run_job
+from api.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = 'Run queued import jobs (use with STOCK_IMPORT_JOB_RUNNER=worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to wait between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Waiting for import jobs...')
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f'Running import job {job.pk} for {job.source}')
+            job = run_job(job)
+            if job.status == ImportJob.COMPLETED:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.pk} loaded {job.rows_created} new records '
+                    f'({job.rows_per_sec:.0f} rows/sec)'))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'Job {job.pk} failed: {job.error}'))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.caching import invalidate_all
+from api.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Drop old delete tombstones from the /api/stocks/changes/ feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.CHANGE_TOMBSTONE_RETENTION_DAYS,
+                            help='Keep tombstones for deletions newer than this')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        count = prune_tombstones(before)
+        if count:
+            # Cached change responses may span the pruned range
+            invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {count} tombstones older than {options['days']} days"))
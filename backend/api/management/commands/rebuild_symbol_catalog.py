@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from api.catalog import rebuild_catalog
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-trade-code summary catalog from StockData'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt catalog for {count} trade codes'))
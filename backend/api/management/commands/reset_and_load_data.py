@@ -1,6 +1,9 @@
 from django.core.management.base import BaseCommand
-from django.db import connection
+from api.caching import invalidate_all
+from api.catalog import rebuild_catalog
+from api.changes import reset_change_log
 from api.models import StockData
+from api.snapshot import DEFAULT_SNAPSHOT, clear_stock_data, restore_snapshot
 from django.core.management import call_command
 import os
 
@@ -8,49 +11,42 @@ import os
 class Command(BaseCommand):
     help = 'Reset database and load initial data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT,
+                            help='Snapshot written by create_fixture or snapshot_stock_data')
+
+    def handle(self, *args, **options):
         try:
-            # Check if fixture exists
+            snapshot_path = options['snapshot']
+            if os.path.exists(snapshot_path):
+                # Replaces every row in one transaction; COPY on PostgreSQL
+                self.stdout.write(f'Restoring snapshot {snapshot_path}...')
+                count, elapsed = restore_snapshot(snapshot_path)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Successfully loaded {count} records in {elapsed:.2f}s'))
+                return
+
+            # Fall back to a legacy JSON fixture
             fixture_path = os.path.join('api', 'fixtures', 'initial_data.json')
             if not os.path.exists(fixture_path):
                 self.stdout.write(self.style.ERROR(
-                    f'Fixture file not found at {fixture_path}'))
+                    f'Neither {snapshot_path} nor {fixture_path} was found'))
                 return
 
-            # Clear all data from StockData table
             self.stdout.write('Clearing existing data...')
-            try:
-                count = StockData.objects.all().count()
-                StockData.objects.all().delete()
-                self.stdout.write(self.style.SUCCESS(
-                    f'Cleared {count} existing records'))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'Error clearing data: {str(e)}'))
-                return
+            count = StockData.objects.all().count()
+            clear_stock_data()
+            self.stdout.write(self.style.SUCCESS(
+                f'Cleared {count} existing records'))
 
-            # Reset the sequence
-            try:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT setval(pg_get_serial_sequence('api_stockdata', 'id'), 1, false);")
-                self.stdout.write(self.style.SUCCESS('Reset ID sequence'))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'Error resetting sequence: {str(e)}'))
-                return
-
-            # Load the fixture
             self.stdout.write('Loading fixture data...')
-            try:
-                call_command('loaddata', fixture_path, verbosity=2)
-                count = StockData.objects.all().count()
-                self.stdout.write(self.style.SUCCESS(
-                    f'Successfully loaded {count} records'))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'Error loading fixture: {str(e)}'))
-                return
+            call_command('loaddata', fixture_path, verbosity=2)
+            count = StockData.objects.all().count()
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully loaded {count} records'))
+            rebuild_catalog()
+            reset_change_log()
+            invalidate_all()
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Unexpected error: {str(e)}'))
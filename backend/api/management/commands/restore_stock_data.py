@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api.snapshot import DEFAULT_SNAPSHOT, restore_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Replace all StockData rows with the contents of a snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_SNAPSHOT,
+                            help='Snapshot file to restore')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per bulk_create batch')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows read from the snapshot at a time')
+
+    def handle(self, *args, **options):
+        count, elapsed = restore_snapshot(
+            options['path'], options['batch_size'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Restored {count} rows in {elapsed:.2f}s'))
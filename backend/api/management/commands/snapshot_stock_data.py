@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from api.snapshot import DEFAULT_SNAPSHOT, dump_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write every StockData row to an NDJSON snapshot (gzipped for .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_SNAPSHOT,
+                            help='Snapshot file to write')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows fetched and serialised at a time')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = dump_snapshot(options['path'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} rows to {options['path']} "
+            f"in {time.perf_counter() - started:.2f}s"))
@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max, Window
+from django.db.models.functions import Lag, RowNumber
+
+from .caching import dates_version
+from .models import StockData, TradeCodeSummary
+
+SNAPSHOT_FIELDS = ['trade_code', 'close', 'prev_close', 'change_pct', 'range',
+                   'range_pct', 'volume', 'volume_rank']
+
+
+def latest_trading_date():
+    return TradeCodeSummary.objects.aggregate(latest=Max('last_date'))['latest']
+
+
+def _snapshot_frame(day):
+    """
+    One row per symbol traded on day, with its previous close.
+
+    A single query over the lookback window: LAG gives each row the close of
+    the symbol's previous trading day and ROW_NUMBER keeps the newest row
+    per symbol.
+    """
+    lookback = day - timedelta(days=settings.SNAPSHOT_LOOKBACK_DAYS)
+    rows = StockData.objects.filter(
+        date__gte=lookback, date__lte=day,
+    ).annotate(
+        prev_close=Window(Lag('close'), partition_by=[F('trade_code')],
+                          order_by=F('date').asc()),
+        recency=Window(RowNumber(), partition_by=[F('trade_code')],
+                       order_by=F('date').desc()),
+    ).filter(recency=1).values_list(
+        'trade_code', 'date', 'high', 'low', 'close', 'volume', 'prev_close')
+
+    df = pd.DataFrame.from_records(
+        list(rows),
+        columns=['trade_code', 'date', 'high', 'low', 'close', 'volume',
+                 'prev_close'])
+    # Symbols whose newest row predates day did not trade on it. An empty
+    # result comes back with object columns, hence the casts
+    return df[df['date'] == day].drop(columns='date').astype(
+        {'high': float, 'low': float, 'close': float, 'volume': 'int64'})
+
+
+def _records(df):
+    out = df[SNAPSHOT_FIELDS].replace({np.nan: None})
+    return out.to_dict('records')
+
+
+def compute_snapshot(day, top):
+    """The snapshot for day, or None if no symbol traded on it."""
+    df = _snapshot_frame(day)
+    if df.empty:
+        return None
+    # A zero close in the feed means no trade, not a price of zero
+    df['prev_close'] = df['prev_close'].astype(float).where(df['prev_close'] > 0)
+    prev_close = df['prev_close']
+    df['change_pct'] = ((df['close'] / prev_close - 1) * 100).round(4)
+    df['range'] = (df['high'] - df['low']).round(4)
+    df['range_pct'] = (df['range'] / prev_close * 100).round(4)
+    df['volume_rank'] = df['volume'].rank(
+        ascending=False, method='min').astype(int)
+
+    changed = df.dropna(subset=['change_pct'])
+    advancers = int((changed['change_pct'] > 0).sum())
+    decliners = int((changed['change_pct'] < 0).sum())
+    return {
+        'date': day.isoformat(),
+        'symbols': len(df),
+        'total_volume': int(df['volume'].sum()),
+        'breadth': {
+            'advancers': advancers,
+            'decliners': decliners,
+            'unchanged': int((changed['change_pct'] == 0).sum()),
+            'no_previous_close': len(df) - len(changed),
+            'advance_decline_ratio': (
+                round(advancers / decliners, 4) if decliners else None),
+        },
+        'top_gainers': _records(changed.nlargest(top, 'change_pct')),
+        'top_losers': _records(changed.nsmallest(top, 'change_pct')),
+        'most_traded': _records(df.nsmallest(top, 'volume_rank')),
+        'all': _records(df.sort_values('trade_code')),
+    }
+
+
+def market_snapshot(day, top=10):
+    """
+    Return the cross-sectional snapshot for day, cached per day, or None
+    if no symbol traded on it.
+
+    The cache key folds in the write versions of every date in the lookback
+    window, so a past day's snapshot is computed once and only recomputed if
+    one of the days it was built from is written to.
+    """
+    window = [day - timedelta(days=offset)
+              for offset in range(settings.SNAPSHOT_LOOKBACK_DAYS + 1)]
+    key = f'market-snapshot:{day.isoformat()}:{top}:{dates_version(window)}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = compute_snapshot(day, top)
+        if snapshot is None:
+            return None
+        cache.set(key, snapshot, settings.RESPONSE_CACHE_SECONDS)
+    return snapshot
@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .archive import archived_frame, archived_ranges
+from .caching import code_versions, epoch_version
+from .models import StockData
+
+
+class PriceMatrix:
+    """
+    In-process wide matrix of closes, one row per date and one column per symbol.
+
+    Columns are pivoted from StockData, plus any rows api.archive has moved
+    out of it, the first time a symbol is asked for and kept in memory.
+    Each column remembers the write version of its symbol (see
+    api.caching), so after a write only that symbol's column is reloaded,
+    and a reload or reset of the whole table drops everything. Beyond
+    PRICE_MATRIX_MAX_SYMBOLS the least recently requested columns go.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.epoch = None
+        self.dates = np.empty(0, dtype='datetime64[D]')
+        # Column of each symbol, least recently requested first
+        self.columns = OrderedDict()
+        self.versions = {}
+        self.closes = np.empty((0, 0))
+
+    def _frame(self, trade_codes):
+        rows = StockData.objects.filter(trade_code__in=trade_codes).values_list(
+            'trade_code', 'date', 'close')
+        df = pd.DataFrame.from_records(
+            list(rows), columns=['trade_code', 'date', 'close'])
+        df['date'] = pd.to_datetime(df['date'])
+        if not archived_ranges():
+            return df
+        archived = [frame[['date', 'close']].assign(trade_code=code)
+                    for code in trade_codes
+                    if (frame := archived_frame(code)) is not None]
+        # As in timeseries.load_frame, a hot row wins a date it shares
+        df = pd.concat(archived + [df], ignore_index=True)
+        return df.drop_duplicates(['trade_code', 'date'], keep='last')
+
+    def _load(self, trade_codes):
+        wide = self._frame(trade_codes).pivot(
+            index='date', columns='trade_code', values='close')
+        new_dates = wide.index.to_numpy().astype('datetime64[D]')
+
+        dates = np.union1d(self.dates, new_dates)
+        if len(dates) != len(self.dates):
+            # Re-home the existing rows onto the widened date index
+            closes = np.full((len(dates), self.closes.shape[1]), np.nan)
+            closes[np.searchsorted(dates, self.dates)] = self.closes
+            self.dates, self.closes = dates, closes
+
+        added = [code for code in trade_codes if code not in self.columns]
+        if added:
+            for offset, code in enumerate(added):
+                self.columns[code] = self.closes.shape[1] + offset
+            self.closes = np.hstack(
+                [self.closes, np.full((len(self.dates), len(added)), np.nan)])
+
+        rows_at = np.searchsorted(self.dates, new_dates)
+        for code in trade_codes:
+            column = self.columns[code]
+            self.closes[:, column] = np.nan
+            if code in wide:
+                self.closes[rows_at, column] = wide[code].to_numpy()
+
+    def _evict(self, keep):
+        """Drop the least recently requested columns not in keep over the cap."""
+        excess = len(self.columns) - settings.PRICE_MATRIX_MAX_SYMBOLS
+        victims = [code for code in self.columns if code not in keep][:max(excess, 0)]
+        if not victims:
+            return
+        for code in victims:
+            del self.columns[code]
+            self.versions.pop(code, None)
+        self.closes = self.closes[:, list(self.columns.values())]
+        self.columns = OrderedDict((code, i) for i, code in enumerate(self.columns))
+        # Dates only the dropped symbols traded on go too
+        used = ~np.isnan(self.closes).all(axis=1)
+        self.dates, self.closes = self.dates[used], self.closes[used]
+
+    def closes_for(self, trade_codes, start_date=None, end_date=None):
+        """Return (dates, closes) for trade_codes, refreshing stale columns."""
+        epoch = epoch_version()
+        versions = code_versions(trade_codes)
+        with self._lock:
+            if epoch != self.epoch:
+                self._clear()
+                self.epoch = epoch
+            stale = [code for code in trade_codes
+                     if self.versions.get(code) != versions[code]]
+            if stale:
+                self._load(stale)
+                self.versions.update({code: versions[code] for code in stale})
+            for code in trade_codes:
+                self.columns.move_to_end(code)
+            self._evict(set(trade_codes))
+
+            mask = np.ones(len(self.dates), dtype=bool)
+            if start_date:
+                mask &= self.dates >= np.datetime64(start_date)
+            if end_date:
+                mask &= self.dates <= np.datetime64(end_date)
+            columns = [self.columns[code] for code in trade_codes]
+            return self.dates[mask], self.closes[np.ix_(mask, columns)]
+
+
+price_matrix = PriceMatrix()
+
+
+def _rounded(values):
+    return [None if np.isnan(v) else round(float(v), 6) for v in values]
+
+
+def correlation_report(trade_codes, start_date=None, end_date=None, window=20):
+    """
+    Aligned daily returns, correlation/covariance and rolling correlations.
+
+    Only dates on which every requested symbol has a positive close are
+    used, so all return series line up. Rolling correlations are of each
+    symbol against the first one requested.
+    """
+    dates, closes = price_matrix.closes_for(trade_codes, start_date, end_date)
+    closes = np.where(closes > 0, closes, np.nan)
+    complete = ~np.isnan(closes).any(axis=1)
+    dates, closes = dates[complete], closes[complete]
+
+    returns = closes[1:] / closes[:-1] - 1
+    dates = dates[1:]
+    if len(returns) >= 2:
+        # A flat price series has no variance; its correlations come out NaN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = np.corrcoef(returns, rowvar=False)
+        covariance = np.cov(returns, rowvar=False)
+    else:
+        correlation = covariance = np.full((len(trade_codes),) * 2, np.nan)
+    correlation = np.atleast_2d(correlation)
+    covariance = np.atleast_2d(covariance)
+
+    frame = pd.DataFrame(returns, columns=trade_codes)
+    rolling = frame.rolling(window).corr(frame[trade_codes[0]])
+
+    return {
+        'trade_codes': trade_codes,
+        'dates': [str(d) for d in dates],
+        'returns': {code: _rounded(returns[:, i])
+                    for i, code in enumerate(trade_codes)},
+        'correlation': [_rounded(row) for row in correlation],
+        'covariance': [_rounded(row) for row in covariance],
+        'rolling_correlation': {
+            'window': window,
+            'base': trade_codes[0],
+            'values': {code: _rounded(rolling[code].to_numpy())
+                       for code in trade_codes},
+        },
+    }
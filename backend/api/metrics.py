@@ -0,0 +1,224 @@
+import hmac
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+
+# Measurements of the request being handled, if any. asgiref copies the
+# context into sync_to_async threads, so queries an async view runs
+# elsewhere are still counted against it.
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it is handled."""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+    def server_timing(self, total):
+        return (f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+                f'serialize;dur={self.serialize_time * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Per-process request metrics, keyed by (view, method)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.db_seconds = defaultdict(float)
+            self.serialize_seconds = defaultdict(float)
+            self.response_bytes = defaultdict(int)
+            self.cache = defaultdict(int)
+
+    def record(self, view, method, status, metrics, latency, size):
+        key = (view, method)
+        with self._lock:
+            self.requests[key + (str(status),)] += 1
+            self.latency[key].observe(latency)
+            self.queries[key].observe(metrics.queries)
+            self.db_seconds[key] += metrics.db_time
+            self.serialize_seconds[key] += metrics.serialize_time
+            self.response_bytes[key] += size
+
+    def record_cache(self, result):
+        """Count a cached read, result being 'hit' or 'miss'."""
+        with self._lock:
+            self.cache[result] += 1
+
+    def cache_results(self, result):
+        with self._lock:
+            return self.cache[result]
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def labels(key, names=('view', 'method')):
+            return ','.join(f'{name}="{value}"' for name, value in zip(names, key))
+
+        def counter(name, help_text, values, names=('view', 'method')):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for key, value in sorted(values.items()):
+                lines.append(f'{name}{{{labels(key, names)}}} {value}')
+
+        def histogram(name, help_text, values):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, hist in sorted(values.items()):
+                base = labels(key)
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{base},le="+Inf"}} {hist.count}')
+                lines.append(f'{name}_sum{{{base}}} {hist.sum}')
+                lines.append(f'{name}_count{{{base}}} {hist.count}')
+
+        with self._lock:
+            counter('http_requests_total', 'Requests handled, by view and status.',
+                    self.requests, ('view', 'method', 'status'))
+            histogram('http_request_duration_seconds',
+                      'Time from the request reaching Django to the response.',
+                      self.latency)
+            histogram('http_request_db_queries', 'SQL queries run per request.',
+                      self.queries)
+            counter('http_request_db_seconds_total',
+                    'Time spent executing SQL.', self.db_seconds)
+            counter('http_request_serialize_seconds_total',
+                    'Time spent rendering response bodies.', self.serialize_seconds)
+            counter('http_response_bytes_total',
+                    'Bytes of non-streaming response bodies.', self.response_bytes)
+            counter('response_cache_requests_total', 'Cached reads by outcome.',
+                    {(result,): count for result, count in self.cache.items()},
+                    ('result',))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning('Slow query (%.1f ms) in %s: %s',
+                           elapsed * 1000, metrics.path, sql)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Time the queries of every connection, whichever thread opened it.
+
+    This is what connection.execute_wrapper() does, made permanent: a
+    request's queries may run on several threads' connections.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def start_request(request):
+    metrics = RequestMetrics(request.path)
+    return metrics, _current.set(metrics)
+
+
+def finish_request(request, response, metrics, token):
+    """Record a finished request and add its Server-Timing header."""
+    _current.reset(token)
+    latency = time.perf_counter() - metrics.started
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name if match else None) or 'unmatched'
+    size = 0 if response.streaming else len(response.content)
+    registry.record(view, request.method, response.status_code, metrics,
+                    latency, size)
+    if settings.SERVER_TIMING_HEADER:
+        response['Server-Timing'] = metrics.server_timing(latency)
+    return response
+
+
+def time_render(response):
+    """Count the rendering of a template response as serialization time."""
+    metrics = _current.get()
+    if metrics is None:
+        return response
+    started = time.perf_counter()
+
+    def rendered(response):
+        metrics.serialize_time += time.perf_counter() - started
+    response.add_post_render_callback(rendered)
+    return response
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed block as serialization time of the current request."""
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.serialize_time += time.perf_counter() - started
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Needs a bearer token if METRICS_TOKEN is
+    set; without one it is only served with DEBUG on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                 f'Bearer {token}'.encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,77 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from .metrics import finish_request, start_request, time_render
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware chain.
+
+    The stock middleware is sync-only, which makes Django run everything
+    below it, async views included, on the single sync thread under ASGI.
+    This one only leaves the event loop to serve an actual static file.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=None):
+        if settings is None:
+            super().__init__(get_response)
+        else:
+            super().__init__(get_response, settings)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Record per-view latency, SQL query count and time, serialization time
+    and response size for /metrics, and report them to the client in a
+    Server-Timing header. Place it first so the latency covers every other
+    middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Django awaits a coroutine hook directly but would run a plain
+            # one in a thread for every response under ASGI
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics, token = start_request(request)
+        response = self.get_response(request)
+        return finish_request(request, response, metrics, token)
+
+    async def __acall__(self, request):
+        metrics, token = start_request(request)
+        response = await self.get_response(request)
+        return finish_request(request, response, metrics, token)
+
+    def process_template_response(self, request, response):
+        return time_render(response)
+
+    async def _aprocess_template_response(self, request, response):
+        return time_render(response)
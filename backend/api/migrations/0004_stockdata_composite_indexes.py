@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_importjob'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockdata',
+            name='api_stockda_trade_c_20bdf0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='stockdata',
+            name='api_stockda_date_4091b7_idx',
+        ),
+        migrations.AddIndex(
+            model_name='stockdata',
+            index=models.Index(fields=['trade_code', '-date', '-id'], include=('open', 'high', 'low', 'close', 'volume'), name='api_stock_code_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockdata',
+            index=models.Index(fields=['-date', '-id'], name='api_stock_date_id_idx'),
+        ),
+    ]
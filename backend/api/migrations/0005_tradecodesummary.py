@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_stockdata_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradeCodeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trade_code', models.CharField(max_length=20, unique=True)),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('row_count', models.IntegerField()),
+                ('latest_close', models.FloatField()),
+                ('high_52w', models.FloatField()),
+                ('low_52w', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['trade_code'],
+            },
+        ),
+    ]
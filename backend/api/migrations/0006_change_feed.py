@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:03
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_rows(apps, schema_editor):
+    StockData = apps.get_model('api', 'StockData')
+    ChangeCounter = apps.get_model('api', 'ChangeCounter')
+    StockData.objects.update(seq=F('id'))
+    last = StockData.objects.aggregate(last=Max('id'))['last'] or 0
+    ChangeCounter.objects.create(pk=1, value=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_tradecodesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+                ('pruned_through', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockDataTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_id', models.BigIntegerField()),
+                ('trade_code', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('seq', models.BigIntegerField(unique=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stockdata',
+            name='seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='stockdata',
+            index=models.Index(fields=['seq'], name='api_stock_seq_idx'),
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+    ]
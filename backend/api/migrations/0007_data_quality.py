@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='rejections',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='QuarantinedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500)),
+                ('row_number', models.BigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField()),
+                ('reasons', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['source', 'row_number'],
+                'indexes': [models.Index(fields=['source', 'row_number'], name='api_quarantine_source_idx')],
+            },
+        ),
+    ]
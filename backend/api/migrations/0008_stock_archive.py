@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_data_quality'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('storage', models.CharField(choices=[('table', 'Archive table'), ('file', 'Columnar file')], max_length=10)),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('row_count', models.BigIntegerField()),
+                ('path', models.CharField(blank=True, max_length=500)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['first_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockDataArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('trade_code', models.CharField(max_length=20)),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('open', models.FloatField()),
+                ('close', models.FloatField()),
+                ('volume', models.BigIntegerField()),
+                ('seq', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trade_code', 'date'], name='api_archive_code_date_idx')],
+            },
+        ),
+    ]
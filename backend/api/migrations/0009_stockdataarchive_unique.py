@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def drop_duplicate_archived_rows(apps, schema_editor):
+    """Keep the first archived copy of each (trade_code, date)."""
+    StockDataArchive = apps.get_model('api', 'StockDataArchive')
+    duplicated = (StockDataArchive.objects.values('trade_code', 'date')
+                  .annotate(copies=Count('id'), keep=Min('id'))
+                  .filter(copies__gt=1))
+    for row in duplicated:
+        StockDataArchive.objects.filter(
+            trade_code=row['trade_code'], date=row['date'],
+        ).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_stock_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_archived_rows, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='stockdataarchive',
+            name='api_archive_code_date_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='stockdataarchive',
+            unique_together={('trade_code', 'date')},
+        ),
+    ]
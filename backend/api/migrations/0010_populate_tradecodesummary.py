@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+import pandas as pd
+from django.db import migrations
+from django.db.models import Count, Max, Min
+
+
+def rebuild_catalog(apps, schema_editor):
+    """
+    Fill TradeCodeSummary for databases loaded before it existed, as
+    api.catalog.rebuild_catalog does, but against the historical models.
+    """
+    StockData = apps.get_model('api', 'StockData')
+    TradeCodeSummary = apps.get_model('api', 'TradeCodeSummary')
+    totals = list(StockData.objects.values('trade_code').annotate(
+        first_date=Min('date'), last_date=Max('date'), row_count=Count('id')))
+    if not totals:
+        return
+
+    # Only the last year of each symbol matters for the close and 52w range
+    earliest = min(row['last_date'] for row in totals) - timedelta(days=365)
+    columns = ['trade_code', 'date', 'high', 'low', 'open', 'close', 'volume']
+    recent = pd.DataFrame.from_records(
+        list(StockData.objects.filter(date__gte=earliest).values_list(*columns)),
+        columns=columns)
+    last_dates = pd.Series({row['trade_code']: row['last_date'] for row in totals},
+                           name='last_date')
+    recent = recent.join(pd.to_datetime(last_dates), on='trade_code')
+    recent['date'] = pd.to_datetime(recent['date'])
+    recent = recent[recent['date'] >= recent['last_date'] - pd.Timedelta(days=365)]
+    latest = recent[recent['date'] == recent['last_date']].set_index(
+        'trade_code')['close']
+    # Untraded days (zero high/low/open and volume) stay out of the 52w
+    # range, as in api.validation._no_trade
+    traded = ~((recent['volume'] == 0)
+               & (recent[['high', 'low', 'open']] == 0).all(axis=1))
+    window = recent[traded].groupby('trade_code').agg(
+        high_52w=('high', 'max'), low_52w=('low', 'min')).reindex(latest.index)
+    window = window.fillna({'high_52w': latest, 'low_52w': latest})
+
+    TradeCodeSummary.objects.all().delete()
+    TradeCodeSummary.objects.bulk_create([
+        TradeCodeSummary(
+            trade_code=row['trade_code'],
+            first_date=row['first_date'],
+            last_date=row['last_date'],
+            row_count=row['row_count'],
+            latest_close=float(latest[row['trade_code']]),
+            high_52w=float(window.at[row['trade_code'], 'high_52w']),
+            low_52w=float(window.at[row['trade_code'], 'low_52w']),
+        )
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_stockdataarchive_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_catalog, migrations.RunPython.noop),
+    ]
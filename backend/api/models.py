@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 
 # Create your models here.
 
@@ -11,14 +12,211 @@ class StockData(models.Model):
     open = models.FloatField()
     close = models.FloatField()
     volume = models.BigIntegerField()
+    # Position in the change feed, set by api.changes on every write
+    seq = models.BigIntegerField(default=0)
 
     class Meta:
         # Create a composite index on trade_code and date for faster queries
         unique_together = ('trade_code', 'date')
         indexes = [
-            models.Index(fields=['trade_code']),
-            models.Index(fields=['date']),
+            # Serves "one trade code, newest first" and date ranges within it.
+            # On PostgreSQL the INCLUDE makes chart reads index-only scans;
+            # other backends create the index without it.
+            models.Index(
+                fields=['trade_code', '-date', '-id'],
+                include=['open', 'high', 'low', 'close', 'volume'],
+                name='api_stock_code_date_idx',
+            ),
+            # Serves the unfiltered list and keyset pagination on (date, id)
+            models.Index(fields=['-date', '-id'], name='api_stock_date_id_idx'),
+            # Serves /api/stocks/changes/
+            models.Index(fields=['seq'], name='api_stock_seq_idx'),
         ]
 
     def __str__(self):
         return f"{self.trade_code} - {self.date}"
+
+    @classmethod
+    def check(cls, **kwargs):
+        errors = super().check(**kwargs)
+        # models.W040 warns that a backend ignores INCLUDE. That is intended
+        # for api_stock_code_date_idx alone, so only then is it dropped
+        covering = [index.name for index in cls._meta.indexes if index.include]
+        if covering == ['api_stock_code_date_idx']:
+            errors = [error for error in errors if error.id != 'models.W040']
+        return errors
+
+
+class StockDataTombstone(models.Model):
+    """Record of a deleted StockData row, so the change feed can report it."""
+    row_id = models.BigIntegerField()
+    trade_code = models.CharField(max_length=20)
+    date = models.DateField()
+    seq = models.BigIntegerField(unique=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+
+    def __str__(self):
+        return f"{self.trade_code} - {self.date} (deleted)"
+
+
+class ChangeCounter(models.Model):
+    """
+    Single-row counter handing out StockData change sequence numbers.
+
+    Tokens below pruned_through may have lost tombstones to pruning or a
+    full reload, so clients holding one must resync.
+    """
+    value = models.BigIntegerField(default=0)
+    pruned_through = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"seq {self.value}"
+
+
+class TradeCodeSummary(models.Model):
+    """Per-symbol catalog row, kept in step with StockData by api.catalog."""
+    trade_code = models.CharField(max_length=20, unique=True)
+    first_date = models.DateField()
+    last_date = models.DateField()
+    row_count = models.IntegerField()
+    latest_close = models.FloatField()
+    high_52w = models.FloatField()
+    low_52w = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['trade_code']
+
+    def __str__(self):
+        return self.trade_code
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of a streaming import, committed together with each chunk."""
+    source = models.CharField(max_length=500, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    rows_committed = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} - {self.rows_committed} rows"
+
+
+class ImportJob(models.Model):
+    """A background import of one data file, reported by /api/import-jobs/."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [PENDING, RUNNING]
+
+    source = models.CharField(max_length=500)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    rows_processed = models.BigIntegerField(default=0)
+    rows_created = models.BigIntegerField(default=0)
+    rows_skipped = models.BigIntegerField(default=0)
+    rows_invalid = models.BigIntegerField(default=0)
+    rows_per_sec = models.FloatField(default=0)
+    # Rows rejected by each validation rule, see api.validation
+    rejections = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the running job after every chunk; see api.jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # Times the job has been claimed, counting runs a dead worker abandoned
+    attempts = models.IntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Only one pending or running job per file at a time
+            models.UniqueConstraint(
+                fields=['source'],
+                condition=Q(status__in=['pending', 'running']),
+                name='unique_active_import_per_source',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source} - {self.status}"
+
+
+class QuarantinedRow(models.Model):
+    """A row an import rejected, kept with its raw values for review."""
+    source = models.CharField(max_length=500)
+    # 1-based position of the record in the source file
+    row_number = models.BigIntegerField(null=True, blank=True)
+    data = models.JSONField()
+    reasons = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['source', 'row_number']
+        indexes = [models.Index(fields=['source', 'row_number'],
+                                name='api_quarantine_source_idx')]
+
+    def __str__(self):
+        return f"{self.source}:{self.row_number} - {self.reasons}"
+
+
+class StockDataArchive(models.Model):
+    """
+    Cold tier of StockData on databases without table partitioning.
+
+    api.archive moves old rows here, ids and all, so the hot table and
+    its indexes only hold recent history.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    date = models.DateField()
+    trade_code = models.CharField(max_length=20)
+    high = models.FloatField()
+    low = models.FloatField()
+    open = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField()
+    seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        # Also serves one trade code's archived rows by date
+        unique_together = ('trade_code', 'date')
+
+    def __str__(self):
+        return f"{self.trade_code} - {self.date} (archived)"
+
+
+class ArchivedRange(models.Model):
+    """A date range of StockData moved out of the hot table by api.archive."""
+    TABLE = 'table'
+    FILE = 'file'
+    STORAGE_CHOICES = [
+        (TABLE, 'Archive table'),
+        (FILE, 'Columnar file'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True)
+    storage = models.CharField(max_length=10, choices=STORAGE_CHOICES)
+    first_date = models.DateField()
+    last_date = models.DateField()
+    row_count = models.BigIntegerField()
+    # The compressed columnar file, for FILE ranges
+    path = models.CharField(max_length=500, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['first_date']
+
+    def __str__(self):
+        return f"{self.name} ({self.first_date} to {self.last_date})"
@@ -0,0 +1,146 @@
+import base64
+import hashlib
+import json
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _max_page_size(request):
+    # Columnar responses skip the serializer, so they can afford bigger pages
+    if request.GET.get('format') == 'columnar':
+        return settings.COLUMNAR_MAX_PAGE_SIZE
+    return settings.MAX_PAGE_SIZE
+
+
+def _page_size(request, default):
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, _max_page_size(request)))
+
+
+class StockPageNumberPagination(PageNumberPagination):
+    """Page number pagination that honours the client's page_size."""
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        return _page_size(request, self.page_size)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek pagination over ('-date', '-id') with opaque cursors.
+
+    Each page is fetched with a WHERE on the last seen (date, id) instead of
+    an OFFSET, so deep pages cost the same as the first and rows inserted or
+    deleted elsewhere don't shift the pages. The total count is only
+    computed when asked for with ?count=true, and is cached for
+    STOCK_COUNT_CACHE_SECONDS.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = _page_size(request, settings.REST_FRAMEWORK['PAGE_SIZE'])
+        self.count = None
+        if request.query_params.get('count', '').lower() in ('1', 'true'):
+            self.count = self._cached_count(queryset)
+
+        position, reverse = self._decode_cursor(
+            request.query_params.get(self.cursor_query_param))
+        if position is None:
+            page = queryset.order_by('-date', '-id')
+        elif reverse:
+            seek_date, seek_id = position
+            page = queryset.filter(
+                Q(date__gt=seek_date) | Q(date=seek_date, id__gt=seek_id)
+            ).order_by('date', 'id')
+        else:
+            seek_date, seek_id = position
+            page = queryset.filter(
+                Q(date__lt=seek_date) | Q(date=seek_date, id__lt=seek_id)
+            ).order_by('-date', '-id')
+
+        rows = list(page[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Going backwards, "more" lies before the page; forwards, after it
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        self.first = rows[0] if rows else None
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            self._encode_cursor(self.last, reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            self._encode_cursor(self.first, reverse=True))
+
+    def _encode_cursor(self, row, reverse):
+        payload = {'d': row.date.isoformat(), 'i': row.id}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def _decode_cursor(self, encoded):
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded))
+            position = (date.fromisoformat(payload['d']), int(payload['i']))
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _cached_count(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        key = 'stock-count:' + hashlib.md5(
+            f"{sql}|{params}".encode()).hexdigest()
+        return cache.get_or_set(
+            key, queryset.count, settings.STOCK_COUNT_CACHE_SECONDS)
@@ -0,0 +1,171 @@
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import StockData
+
+INTERVALS = ['year', 'month']
+_BOUNDS = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def period_start(day, interval):
+    if interval == 'year':
+        return date(day.year, 1, 1)
+    return date(day.year, day.month, 1)
+
+
+def next_period(day, interval):
+    """First day of the period after the one day falls in."""
+    day = period_start(day, interval)
+    if interval == 'year':
+        return date(day.year + 1, 1, 1)
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def periods(first, last, interval):
+    """Half-open (lo, hi) ranges of whole periods covering first to last."""
+    lo = period_start(first, interval)
+    while lo <= last:
+        hi = next_period(lo, interval)
+        yield lo, hi
+        lo = hi
+
+
+def partition_name(lo, interval, table=None):
+    table = table or StockData._meta.db_table
+    suffix = f'y{lo.year}' if interval == 'year' else f'm{lo.year}{lo.month:02d}'
+    return f'{table}_{suffix}'
+
+
+def default_partition():
+    return f'{StockData._meta.db_table}_default'
+
+
+def is_partitioned(cursor):
+    if connection.vendor != 'postgresql':
+        return False
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+                   [StockData._meta.db_table])
+    return cursor.fetchone() is not None
+
+
+def partitions(cursor):
+    """
+    (name, lo, hi) of each partition of StockData in date order, with lo
+    and hi of None for the default partition, which comes last.
+    """
+    cursor.execute(
+        'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+        'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass', [StockData._meta.db_table])
+    bounded, default = [], []
+    for name, bound in cursor.fetchall():
+        match = _BOUNDS.search(bound)
+        if match:
+            bounded.append((name, date.fromisoformat(match[1]),
+                            date.fromisoformat(match[2])))
+        else:
+            default.append((name, None, None))
+    return sorted(bounded, key=lambda p: p[1]) + default
+
+
+def create_partition(cursor, name, lo, hi):
+    """
+    Add a partition for dates in [lo, hi), moving over any rows the
+    default partition holds for that range.
+
+    The table is filled before it is attached; ATTACH refuses while the
+    default partition still has rows that belong to the new range.
+    """
+    table, part = _qn(StockData._meta.db_table), _qn(name)
+    cursor.execute(f'CREATE TABLE {part} (LIKE {table} INCLUDING DEFAULTS)')
+    if any(bound is None for _, bound, _ in partitions(cursor)):
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {_qn(default_partition())} '
+            f'WHERE date >= %s AND date < %s RETURNING *) '
+            f'INSERT INTO {part} SELECT * FROM moved', [lo, hi])
+    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {part} "
+                   f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')")
+
+
+def _convert(cursor, interval):
+    """Rebuild the plain StockData table as one partitioned by range on date."""
+    table = StockData._meta.db_table
+    old = f'{table}_unpartitioned'
+    cursor.execute(f'LOCK TABLE {_qn(table)} IN ACCESS EXCLUSIVE MODE')
+    constraints = connection.introspection.get_constraints(cursor, table)
+    primary = next(name for name, c in constraints.items() if c['primary_key'])
+    unique = next(name for name, c in constraints.items()
+                  if c['unique'] and not c['primary_key']
+                  and c['columns'] == ['trade_code', 'date'])
+
+    cursor.execute(f'ALTER TABLE {_qn(table)} RENAME TO {_qn(old)}')
+    # LIKE leaves the identity behind; the id sequence is recreated below
+    cursor.execute(f'CREATE TABLE {_qn(table)} (LIKE {_qn(old)} INCLUDING DEFAULTS) '
+                   f'PARTITION BY RANGE (date)')
+    cursor.execute(f'CREATE TABLE {_qn(default_partition())} '
+                   f'PARTITION OF {_qn(table)} DEFAULT')
+    cursor.execute(f'SELECT min(date), max(date), max(id) FROM {_qn(old)}')
+    first, last, last_id = cursor.fetchone()
+    if first is not None:
+        for lo, hi in periods(first, last, interval):
+            create_partition(cursor, partition_name(lo, interval), lo, hi)
+    cursor.execute(f'INSERT INTO {_qn(table)} SELECT * FROM {_qn(old)}')
+    cursor.execute(f'DROP TABLE {_qn(old)}')
+
+    sequence = f'{table}_id_seq'
+    cursor.execute(f'CREATE SEQUENCE {_qn(sequence)} OWNED BY {_qn(table)}.id')
+    cursor.execute(f"ALTER TABLE {_qn(table)} ALTER COLUMN id "
+                   f"SET DEFAULT nextval('{sequence}')")
+    cursor.execute('SELECT setval(%s, %s, %s)', [sequence, last_id or 1, bool(last_id)])
+
+    # Unique constraints on a partitioned table must include the partition
+    # key, so the primary key becomes (id, date); ids stay unique as they
+    # all come from the one sequence
+    cursor.execute(f'ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(primary)} '
+                   f'PRIMARY KEY (id, date)')
+    cursor.execute(f'ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(unique)} '
+                   f'UNIQUE (trade_code, date)')
+    editor = connection.schema_editor()
+    for index in StockData._meta.indexes:
+        cursor.execute(str(index.create_sql(StockData, editor)))
+    cursor.execute(f'ANALYZE {_qn(table)}')
+
+
+def partition_stock_data(interval='year', ahead=1):
+    """
+    Partition StockData by range on date, one partition per year or month.
+
+    The first run converts the table in place under an exclusive lock,
+    keeping ids, and adds a default partition for dates outside every
+    range. Later runs add partitions for new periods: each period holding
+    data, from the first row through ahead periods past the later of the
+    last row and today. Periods already covered are left alone, so runs
+    with a different interval only fill gaps. Queries filtering on date
+    then only scan the partitions the range overlaps. PostgreSQL only.
+    Returns the names of the partitions created.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f'interval must be one of {", ".join(INTERVALS)}')
+    table = _qn(StockData._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        before = {name for name, _, _ in partitions(cursor)}
+        if not is_partitioned(cursor):
+            _convert(cursor, interval)
+
+        cursor.execute(f'SELECT min(date), max(date) FROM {table}')
+        first, last = cursor.fetchone()
+        today = date.today()
+        end = period_start(max(last or today, today), interval)
+        for _ in range(ahead):
+            end = next_period(end, interval)
+        existing = [(lo, hi) for _, lo, hi in partitions(cursor) if lo]
+        for lo, hi in periods(first or today, end, interval):
+            if not any(lo < other_hi and other_lo < hi for other_lo, other_hi in existing):
+                create_partition(cursor, partition_name(lo, interval), lo, hi)
+        return [name for name, _, _ in partitions(cursor) if name not in before]
@@ -0,0 +1,43 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+COLUMNAR_FIELDS = ['id', 'date', 'trade_code', 'high', 'low', 'open', 'close',
+                   'volume']
+
+
+def is_columnar(request):
+    return request.query_params.get('format') == ColumnarJSONRenderer.format
+
+
+def rows_to_columns(rows, fields=COLUMNAR_FIELDS):
+    """Turn values_list tuples into one list per field, e.g. {'close': [...]}."""
+    if not rows:
+        return {field: [] for field in fields}
+    columns = dict(zip(fields, (list(column) for column in zip(*rows))))
+    if 'date' in columns:
+        columns['date'] = [d.isoformat() for d in columns['date']]
+    return columns
+
+
+class ColumnarJSONRenderer(BaseRenderer):
+    """
+    Compact JSON renderer for ?format=columnar responses.
+
+    Uses orjson when it is installed and the standard library otherwise.
+    """
+    media_type = 'application/json'
+    format = 'columnar'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, separators=(',', ':'), default=str).encode()
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import StockData
+from .models import ImportJob, QuarantinedRow, StockData
 
 
 class StockDataSerializer(serializers.ModelSerializer):
@@ -7,3 +7,53 @@ class StockDataSerializer(serializers.ModelSerializer):
         model = StockData
         fields = ['id', 'date', 'trade_code',
                   'high', 'low', 'open', 'close', 'volume']
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'source', 'status', 'rows_processed', 'rows_created',
+                  'rows_skipped', 'rows_invalid', 'rows_per_sec', 'rejections',
+                  'error', 'attempts',
+                  'created_at', 'started_at', 'heartbeat_at', 'finished_at']
+        read_only_fields = fields
+
+
+class QuarantinedRowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuarantinedRow
+        fields = ['row_number', 'data', 'reasons', 'created_at']
+        read_only_fields = fields
+
+
+class BulkStockDataSerializer(StockDataSerializer):
+    """
+    Field validation for rows written through /api/stocks/bulk/.
+
+    The (trade_code, date) uniqueness check is left out here: the bulk
+    endpoint does it for the whole batch with one query instead of one per
+    row.
+    """
+    class Meta(StockDataSerializer.Meta):
+        validators = []
+
+
+class BulkOperationSerializer(serializers.Serializer):
+    """One create, update or delete in a /api/stocks/bulk/ request."""
+    OPS = ('create', 'update', 'delete')
+
+    op = serializers.ChoiceField(choices=OPS)
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+    if_match = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        op = attrs['op']
+        if op == 'create' and ('id' in attrs or 'if_match' in attrs):
+            raise serializers.ValidationError(
+                'create takes only data; id is assigned by the database.')
+        if op != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': f'{op} requires an id.'})
+        if op != 'delete' and not attrs.get('data'):
+            raise serializers.ValidationError({'data': f'{op} requires data.'})
+        return attrs
@@ -0,0 +1,246 @@
+import gzip
+import io
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .caching import invalidate_all
+from .catalog import rebuild_catalog
+from .changes import reset_change_log
+from .ingest import COLUMNS
+from .models import StockData
+
+SNAPSHOT_COLUMNS = ['id'] + COLUMNS
+# Written by create_fixture and restored by reset_and_load_data
+DEFAULT_SNAPSHOT = os.path.join('api', 'fixtures', 'stock_data.ndjson.gz')
+
+
+def _open(path, mode):
+    # A .gz suffix selects gzip; level 6 is most of the size win for far
+    # less CPU than the default 9
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', compresslevel=6, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def write_frames(frames, path):
+    """
+    Write frames of stock rows as newline-delimited JSON records.
+
+    Each frame is serialised in one vectorized to_json call and appended,
+    so memory stays bounded by the frame size. Returns the rows written.
+    """
+    written = 0
+    with _open(path, 'w') as f:
+        for df in frames:
+            if df.empty:
+                continue
+            df = df.copy()
+            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+            f.write(df.to_json(orient='records', lines=True,
+                               double_precision=15))
+            written += len(df)
+    return written
+
+
+def _database_frames(chunk_size):
+    rows = StockData.objects.order_by('id').values_list(
+        *SNAPSHOT_COLUMNS).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield pd.DataFrame.from_records(chunk, columns=SNAPSHOT_COLUMNS)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame.from_records(chunk, columns=SNAPSHOT_COLUMNS)
+
+
+def dump_snapshot(path, chunk_size=None):
+    """Stream every StockData row, ids included, into a snapshot file."""
+    chunk_size = chunk_size or settings.STOCK_IMPORT_CHUNK_SIZE
+    return write_frames(_database_frames(chunk_size), path)
+
+
+def read_snapshot(path, chunk_size=None):
+    """Yield frames of at most chunk_size rows from a snapshot file."""
+    chunk_size = chunk_size or settings.STOCK_IMPORT_CHUNK_SIZE
+    with _open(path, 'r') as f:
+        reader = pd.read_json(f, lines=True, chunksize=chunk_size,
+                              dtype={'trade_code': str}, convert_dates=False,
+                              precise_float=True)
+        for df in reader:
+            df['date'] = pd.to_datetime(df['date']).dt.date
+            yield df
+
+
+def _quoted(names):
+    return ', '.join(connection.ops.quote_name(name) for name in names)
+
+
+def _load_frame(df):
+    """Columns and values of one snapshot frame, ready for a raw insert."""
+    columns = [c for c in SNAPSHOT_COLUMNS if c in df.columns]
+    # seq is renumbered by reset_change_log once the load is done
+    df = df[columns].assign(seq=0, date=df['date'].astype(str))
+    return columns + ['seq'], df
+
+
+def clear_stock_data():
+    """
+    Delete every StockData row with one statement and restart the id
+    sequence. The ORM's delete() is avoided as it may fetch rows first.
+    """
+    table = connection.ops.quote_name(StockData._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'TRUNCATE {table} RESTART IDENTITY')
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s',
+                           [StockData._meta.db_table])
+        else:
+            StockData.objects.all().delete()
+
+
+@contextmanager
+def _without_indexes(cursor):
+    """
+    Drop StockData's secondary indexes for the duration of a load and
+    build them once at the end, rather than updating them row by row.
+    The unique (trade_code, date) index stays to keep the data honest.
+    """
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        yield
+        return
+    indexes = StockData._meta.indexes
+    for index in indexes:
+        cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+    yield
+    # Only the CREATE statements are generated, so the editor is never
+    # entered; entering it inside a transaction is not allowed on SQLite
+    editor = connection.schema_editor()
+    for index in indexes:
+        cursor.execute(str(index.create_sql(StockData, editor)))
+    # Fresh statistics so the planner sees the reloaded table
+    cursor.execute(f'ANALYZE {connection.ops.quote_name(StockData._meta.db_table)}')
+
+
+def _copy_frames(cursor, table, frames):
+    """PostgreSQL: stream each frame through COPY FROM STDIN as CSV."""
+    restored = 0
+    for df in frames:
+        columns, df = _load_frame(df)
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        sql = f'COPY {table} ({_quoted(columns)}) FROM STDIN WITH (FORMAT csv)'
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+        restored += len(df)
+    return restored
+
+
+def _insert_frames(cursor, table, frames, batch_size):
+    """SQLite: plain executemany batches, skipping model instantiation."""
+    restored = 0
+    for df in frames:
+        columns, df = _load_frame(df)
+        placeholders = ', '.join(['%s'] * len(columns))
+        sql = f'INSERT INTO {table} ({_quoted(columns)}) VALUES ({placeholders})'
+        rows = list(df.itertuples(index=False, name=None))
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+        restored += len(df)
+    return restored
+
+
+@contextmanager
+def _relaxed_durability():
+    """
+    On SQLite, skip fsyncs and enlarge the page cache during a load. A
+    crash mid-load can at worst lose the load itself, which is rerun from
+    the snapshot anyway. SQLite refuses the change inside a transaction,
+    so a load within a caller's transaction runs with its settings.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        synchronous = cursor.fetchone()[0]
+        cursor.execute('PRAGMA cache_size')
+        cache_size = cursor.fetchone()[0]
+        cursor.execute('PRAGMA synchronous = OFF')
+        cursor.execute('PRAGMA cache_size = -65536')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA synchronous = {int(synchronous)}')
+            cursor.execute(f'PRAGMA cache_size = {int(cache_size)}')
+
+
+def _load(cursor, frames, batch_size):
+    table = connection.ops.quote_name(StockData._meta.db_table)
+    if connection.vendor == 'postgresql':
+        return _copy_frames(cursor, table, frames)
+    if connection.vendor == 'sqlite':
+        return _insert_frames(cursor, table, frames, batch_size)
+    restored = 0
+    for df in frames:
+        columns = [c for c in SNAPSHOT_COLUMNS if c in df.columns]
+        StockData.objects.bulk_create(
+            [StockData(**row) for row in df[columns].to_dict('records')],
+            batch_size=batch_size)
+        restored += len(df)
+    return restored
+
+
+def load_frames(frames, batch_size=None, replace=False):
+    """
+    Bulk load frames of stock rows, replacing every row first if replace.
+
+    Rows go in through COPY on PostgreSQL and executemany on SQLite, with
+    secondary indexes rebuilt after the load, and through bulk_create
+    elsewhere, all in one transaction and without per-row validation.
+    Derived state (the catalog, the change feed and cached responses) is
+    rebuilt afterwards. Returns (rows loaded, seconds taken).
+    """
+    batch_size = batch_size or settings.STOCK_IMPORT_BATCH_SIZE
+    started = time.perf_counter()
+    with _relaxed_durability(), transaction.atomic():
+        if replace:
+            clear_stock_data()
+        with connection.cursor() as cursor:
+            with _without_indexes(cursor):
+                loaded = _load(cursor, frames, batch_size)
+                # Renumbering touches every row; do it before seq is indexed
+                reset_change_log()
+
+            # Explicit ids leave PostgreSQL's id sequence behind; move it on
+            for sql in connection.ops.sequence_reset_sql(no_style(), [StockData]):
+                cursor.execute(sql)
+
+        rebuild_catalog()
+        invalidate_all()
+    return loaded, time.perf_counter() - started
+
+
+def restore_snapshot(path, batch_size=None, chunk_size=None):
+    """
+    Replace every StockData row with the contents of a snapshot, keeping
+    ids when the snapshot has them. Returns (rows restored, seconds taken).
+    """
+    return load_frames(read_snapshot(path, chunk_size), batch_size,
+                       replace=True)
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .changes import (CHANGE_FIELDS, ResyncRequired, change_log_reset,
+                      changes_committed, changes_since, current_token)
+from .models import StockData, StockDataTombstone
+
+CHANNEL = 'stockdata'
+
+
+class Subscription:
+    """A queue of broker messages feeding one stream."""
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        # Set when a message had to be dropped because the client is slow
+        self.lost = False
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.lost = True
+
+
+class LocalBroker:
+    """
+    In-process pub/sub.
+
+    publish() may be called from any thread; messages are handed to each
+    subscriber's event loop, so one published update is shared by every
+    stream in the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self):
+        subscription = Subscription(asyncio.get_running_loop(),
+                                    settings.STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, message):
+        self.deliver(message)
+
+    def deliver(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Pub/sub through Redis, for deployments with several processes.
+
+    Each process holds one Redis subscription and fans its messages out to
+    its local streams, so writes made in any process (including import
+    workers) reach every viewer.
+    """
+
+    def __init__(self):
+        super().__init__()
+        import redis
+        self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        self._listener = None
+
+    def has_subscribers(self):
+        # Other processes may be listening
+        return True
+
+    def subscribe(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+        return super().subscribe()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        for item in pubsub.listen():
+            self.deliver(json.loads(item['data']))
+
+    def publish(self, message):
+        self._redis.publish(CHANNEL, json.dumps(message))
+
+
+BROKERS = {'local': LocalBroker, 'redis': RedisBroker}
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker chosen by STREAM_BROKER."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            name = settings.STREAM_BROKER
+            _broker = (BROKERS[name] if name in BROKERS else import_string(name))()
+        return _broker
+
+
+def _jsonable(row):
+    return {**row, 'date': row['date'].isoformat()}
+
+
+@receiver(changes_committed)
+def publish_committed(sender, first, last, **kwargs):
+    """Publish the rows written and deleted by one committed transaction."""
+    broker = get_broker()
+    if not broker.has_subscribers():
+        return
+    changes = defaultdict(lambda: {'upserts': [], 'deletes': []})
+    for row in StockData.objects.filter(seq__range=(first, last)).values(*CHANGE_FIELDS):
+        changes[row['trade_code']]['upserts'].append(_jsonable(row))
+    for row in StockDataTombstone.objects.filter(seq__range=(first, last)).values(
+            'row_id', 'trade_code', 'date', 'seq'):
+        changes[row['trade_code']]['deletes'].append(
+            _jsonable({'id': row.pop('row_id'), **row}))
+    if changes:
+        broker.publish({'type': 'change', 'seq': last, 'changes': changes})
+
+
+@receiver(change_log_reset)
+def publish_reset(sender, **kwargs):
+    get_broker().publish({'type': 'resync', 'seq': current_token()['value']})
+
+
+def _event(name, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {name}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def _select(changes, trade_codes):
+    if not trade_codes:
+        return changes
+    return {code: changes[code] for code in trade_codes if code in changes}
+
+
+async def _replay(since, trade_codes):
+    """Yield catch-up events for everything after since, page by page."""
+    while True:
+        page = await sync_to_async(changes_since)(
+            since, settings.MAX_PAGE_SIZE, trade_codes)
+        changes = defaultdict(lambda: {'upserts': [], 'deletes': []})
+        for row in page['upserts']:
+            changes[row['trade_code']]['upserts'].append(_jsonable(row))
+        for row in page['deletes']:
+            changes[row['trade_code']]['deletes'].append(_jsonable(row))
+        since = page['token']
+        if changes:
+            yield since, _event('change', {'seq': since, 'changes': changes}, since)
+        if not page['has_more']:
+            return
+
+
+async def stream_events(trade_codes, since=None):
+    """
+    Server-Sent Events for changes to trade_codes (all symbols if empty).
+
+    With since (a change token, or the Last-Event-ID the browser sends on
+    reconnect) the stream first replays what was missed. It also replays
+    after dropping messages for a client that fell behind, and tells the
+    client to reload when the change log was reset.
+    """
+    broker = get_broker()
+    subscription = broker.subscribe()
+    try:
+        # Subscribe before reading the token so nothing falls in between
+        token = (await sync_to_async(current_token)())['value']
+        if since is not None:
+            try:
+                async for token, event in _replay(since, trade_codes):
+                    yield event
+            except ResyncRequired as e:
+                yield _event('resync', {'error': str(e)}, token)
+        yield _event('ready', {'token': token}, token)
+
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.queue.get(), settings.STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if subscription.lost:
+                subscription.lost = False
+                async for token, event in _replay(token, trade_codes):
+                    yield event
+            if message['seq'] <= token:
+                continue
+            token = message['seq']
+            if message['type'] == 'resync':
+                yield _event('resync', {'token': token}, token)
+                continue
+            changes = _select(message['changes'], trade_codes)
+            if changes:
+                yield _event('change', {'seq': token, 'changes': changes}, token)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# The exchange trades Sunday to Thursday and halts a symbol at a 10% move
+WEEKMASK = 'Sun Mon Tue Wed Thu'
+DAILY_LIMIT = 0.1
+# Prices tick in 0.1 steps; below 1.0 a single tick is a move of 10% or more
+MIN_PRICE = 1.0
+DEFAULT_START = '2010-01-03'
+
+
+def trading_days(start, count):
+    return pd.bdate_range(start, periods=count, freq='C', weekmask=WEEKMASK).date
+
+
+def symbol_names(count):
+    width = max(4, len(str(count)))
+    return [f'SYN{i:0{width}d}' for i in range(count)]
+
+
+def shape_for_rows(rows, max_days=2500):
+    """(symbols, days) covering at least rows, up to ten years per symbol."""
+    days = max(1, min(rows, max_days))
+    return math.ceil(rows / days), days
+
+
+def _group(rng, codes, dates, no_trade_ratio):
+    n, d = len(codes), len(dates)
+    volatility = rng.uniform(0.005, 0.03, (n, 1))
+    traded = rng.random((n, d)) >= no_trade_ratio
+
+    # A random walk in log space; untraded days carry the close forward
+    returns = rng.normal(0.0002, volatility, (n, d)).clip(-DAILY_LIMIT, DAILY_LIMIT)
+    returns[~traded] = 0
+    first = np.maximum(rng.lognormal(3.5, 1.0, (n, 1)).round(1), MIN_PRICE)
+    close = np.maximum((first * np.exp(np.cumsum(returns, axis=1))).round(1), MIN_PRICE)
+
+    previous = np.concatenate([first, close[:, :-1]], axis=1)
+    gap = rng.normal(0, volatility / 3, (n, d)).clip(-DAILY_LIMIT, DAILY_LIMIT)
+    open_ = np.maximum((previous * (1 + gap)).round(1), MIN_PRICE)
+    body_high = np.maximum(open_, close)
+    body_low = np.minimum(open_, close)
+    # Round the wicks outwards so low <= open/close <= high survives rounding
+    high = np.ceil(body_high * (1 + np.abs(rng.normal(0, volatility / 2, (n, d)))) * 10) / 10
+    low = np.maximum(
+        np.floor(body_low * (1 - np.abs(rng.normal(0, volatility / 2, (n, d)))) * 10) / 10,
+        MIN_PRICE - 0.1)
+    volume = rng.lognormal(11, 1.5, (n, d)).astype('int64') + 1
+
+    for column in (high, low, open_, volume):
+        column[~traded] = 0
+    return pd.DataFrame({
+        'date': np.tile(dates, n),
+        'trade_code': np.repeat(codes, d),
+        'high': high.ravel(),
+        'low': low.ravel(),
+        'open': open_.ravel(),
+        'close': close.ravel(),
+        'volume': volume.ravel(),
+    })
+
+
+def synthetic_frames(symbols, days, start=DEFAULT_START, seed=0,
+                     no_trade_ratio=0.05, chunk_rows=100000, limit=None):
+    """
+    Yield frames of realistic synthetic OHLCV rows, symbol by symbol.
+
+    Prices are per-symbol random walks held within the daily limit, with
+    the occasional no-trade day reported the way the exchange does (zero
+    high/low/open and volume, close carried forward), so the rows pass
+    api.validation. The output depends only on the arguments. At most
+    limit rows are produced when it is given.
+    """
+    codes = np.array(symbol_names(symbols))
+    dates = trading_days(start, days)
+    per_group = max(1, chunk_rows // days)
+    remaining = symbols * days if limit is None else limit
+    for index, first in enumerate(range(0, symbols, per_group)):
+        if remaining <= 0:
+            return
+        rng = np.random.default_rng([seed, index])
+        df = _group(rng, codes[first:first + per_group], dates, no_trade_ratio)
+        df = df.iloc[:remaining]
+        remaining -= len(df)
+        yield df
@@ -1,3 +1,703 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import caching
+from .archive import archive_before, restore_range
+from .caching import cache_stats
+from .catalog import refresh_symbols
+from .columnar_store import ColumnarStore
+from .indicators import compute_indicators, parse_indicators
+from .ingest import (ingest_csv, ingest_files, ingest_frame, ingest_json,
+                     iter_json_records)
+from .jobs import claim_next_job, enqueue_import, recover_stale_jobs, run_job
+from .matrix import PriceMatrix, correlation_report
+from .metrics import registry
+from .models import (ArchivedRange, ChangeCounter, ImportCheckpoint, ImportJob, QuarantinedRow,
+                     StockData, StockDataArchive, StockDataTombstone, TradeCodeSummary)
+from .snapshot import clear_stock_data, dump_snapshot, restore_snapshot
+from .synthetic import synthetic_frames
+from .timeseries import load_frame, resample_ohlcv
+from .validation import find_problems
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def rows(trade_code, closes, start=date(2020, 1, 1), volume=100):
+    """Raw import rows for trade_code, one trading day per close."""
+    return pd.DataFrame([
+        {'date': (start + timedelta(days=i)).isoformat(), 'trade_code': trade_code,
+         'high': close + 1, 'low': max(close - 1, 0.5), 'open': close,
+         'close': close, 'volume': volume}
+        for i, close in enumerate(closes)
+    ])
+
+
+def parsed(df):
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date']).dt.date
+    return df
+
+
+@override_settings(CACHES=LOCMEM)
+class CacheClearingTestCase(TestCase):
+    """Starts each test with an empty private cache, which outlives test data."""
+
+    def setUp(self):
+        cache.clear()
+
+
+class ValidationRulesTests(TestCase):
+    def test_row_rules(self):
+        df = parsed(rows('A', [10, 10, 10, 10]))
+        df.loc[1, 'close'] = -1
+        df.loc[2, 'high'] = 5
+        df.loc[3, 'date'] = df.loc[0, 'date']
+        problems = find_problems(df)
+        self.assertEqual(problems['negative_price'].tolist(), [False, True, False, False])
+        self.assertEqual(problems['price_range'].tolist(), [False, False, True, False])
+        self.assertEqual(problems['duplicate'].tolist(), [False, False, False, True])
+
+    def test_single_spike_only_rejects_itself(self):
+        problems = find_problems(parsed(rows('A', [10, 30, 10, 10.5])), max_move=0.5)
+        self.assertEqual(problems['price_jump'].tolist(), [False, True, False, False])
+
+    def test_jump_check_follows_a_new_level(self):
+        problems = find_problems(parsed(rows('A', [10, 30, 30, 30, 30, 30])),
+                                 max_move=0.5, max_streak=3)
+        self.assertEqual(problems['price_jump'].tolist(),
+                         [False, True, True, True, False, False])
+
+    def test_no_trade_rows_are_not_jumps(self):
+        df = parsed(rows('A', [10, 10, 10]))
+        df.loc[1, ['high', 'low', 'open', 'volume']] = 0
+        problems = find_problems(df, max_move=0.5)
+        self.assertFalse(problems.any(axis=1).any())
+
+
+@override_settings(STOCK_IMPORT_MAX_DAILY_MOVE=0.5, STOCK_IMPORT_JUMP_STREAK=3)
+class IngestTests(CacheClearingTestCase):
+    def test_stored_no_trade_row_does_not_anchor_jumps(self):
+        ingest_frame(rows('A', [300, 300]))
+        no_trade = rows('A', [10], start=date(2020, 1, 3))
+        no_trade[['high', 'low', 'open', 'volume']] = 0
+        ingest_frame(no_trade)
+
+        stats = ingest_frame(rows('A', [296, 298], start=date(2020, 1, 4)))
+        self.assertEqual(stats.created, 2)
+        self.assertEqual(stats.invalid, 0)
+
+    def test_rejections_in_separate_runs_count_towards_the_streak(self):
+        ingest_frame(rows('A', [10]))
+        created = [ingest_frame(rows('A', [30], start=date(2020, 1, day))).created
+                   for day in range(2, 7)]
+        self.assertEqual(created, [0, 0, 0, 1, 1])
+
+    def test_load_stock_data_replaces_rows_through_ingest(self):
+        ingest_frame(rows('OLD', [10, 11]))
+        df = pd.concat([rows('A', [10, 11]), rows('B', [-5])])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'stocks.csv')
+            df.to_csv(path, index=False)
+            with mock.patch('api.management.commands.load_stock_data.CSV_PATH', path):
+                call_command('load_stock_data', stdout=io.StringIO())
+
+        self.assertEqual(sorted(StockData.objects.values_list('trade_code', flat=True)),
+                         ['A', 'A'])
+        self.assertEqual(list(TradeCodeSummary.objects.values_list('trade_code', flat=True)),
+                         ['A'])
+        self.assertEqual(QuarantinedRow.objects.get().reasons, 'negative_price')
+
+
+class Interrupted(Exception):
+    pass
+
+
+class StreamingImportTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.df = pd.concat([rows('A', [10, 11, 12, 13]), rows('B', [20, 21, 22])],
+                            ignore_index=True)
+        self.csv = os.path.join(tmp.name, 'prices.csv')
+        self.df.to_csv(self.csv, index=False)
+        self.json = os.path.join(tmp.name, 'prices.json')
+        records = self.df.to_dict('records')
+        records[0]['note'] = 'braces } and ] inside, a string'
+        with open(self.json, 'w') as f:
+            json.dump(records, f, indent=2)
+
+    def stored(self):
+        return list(StockData.objects.order_by('trade_code', 'date').values_list(
+            'trade_code', 'date', 'close'))
+
+    def test_records_split_across_reads(self):
+        with open(self.json) as f:
+            expected = json.load(f)
+        for read_size in (1, 7, 64):
+            self.assertEqual(list(iter_json_records(self.json, read_size=read_size)),
+                             expected)
+
+    def test_resume_after_committed_chunks(self):
+        for ingest, path in ((ingest_csv, self.csv), (ingest_json, self.json)):
+            StockData.objects.all().delete()
+            chunks = []
+
+            def stop_after_two(stats):
+                chunks.append(stats.total)
+                if len(chunks) == 2:
+                    raise Interrupted
+
+            with self.assertRaises(Interrupted):
+                ingest(path, chunksize=2, progress=stop_after_two)
+            self.assertEqual(StockData.objects.count(), 4)
+
+            stats = ingest(path, chunksize=2)
+            self.assertEqual(stats.resumed_from, 4)
+            self.assertEqual((stats.total, stats.created, stats.skipped), (3, 3, 0))
+            self.assertEqual(len(self.stored()), len(self.df))
+            self.assertEqual(ImportCheckpoint.objects.get(
+                source=os.path.abspath(path)).rows_committed, len(self.df))
+
+    def test_changed_file_starts_over(self):
+        ImportCheckpoint.objects.create(source=os.path.abspath(self.csv),
+                                        fingerprint='stale', rows_committed=4)
+        stats = ingest_csv(self.csv, chunksize=2)
+        self.assertEqual(stats.resumed_from, 0)
+        self.assertEqual((stats.total, stats.created), (7, 7))
+
+
+@override_settings(STOCK_IMPORT_JOB_RUNNER='worker', STOCK_IMPORT_JOB_TIMEOUT=60,
+                   STOCK_IMPORT_JOB_MAX_ATTEMPTS=2)
+class ImportJobTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'prices.csv')
+        rows('A', [10, 11, 12]).to_csv(self.path, index=False)
+
+    def test_same_file_is_queued_once(self):
+        job, created = enqueue_import(self.path)
+        self.assertTrue(created)
+        self.assertEqual(enqueue_import(self.path), (job, False))
+
+        claim_next_job()
+        self.assertEqual(enqueue_import(self.path), (job, False))
+        run_job(ImportJob.objects.get(pk=job.pk))
+        self.assertTrue(enqueue_import(self.path)[1])
+
+    def test_view_reports_a_running_import(self):
+        messages = [self.client.post('/api/load-from-csv/').json()['message']
+                    for _ in range(2)]
+        self.assertEqual(messages, ['Import queued', 'Import already in progress'])
+
+    def test_claim_and_run(self):
+        job, _ = enqueue_import(self.path)
+        claimed = claim_next_job()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts),
+                         (job.pk, ImportJob.RUNNING, 1))
+        # A claimed job is not handed to a second worker
+        self.assertIsNone(claim_next_job())
+
+        job = run_job(claimed)
+        self.assertEqual((job.status, job.rows_processed, job.rows_created),
+                         (ImportJob.COMPLETED, 3, 3))
+        self.assertEqual(StockData.objects.count(), 3)
+
+    def test_silent_jobs_are_requeued_until_out_of_attempts(self):
+        old = timezone.now() - timedelta(minutes=5)
+        job, _ = enqueue_import(self.path)
+        claim_next_job()
+        self.assertEqual(recover_stale_jobs(), [])
+
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=old)
+        self.assertEqual(recover_stale_jobs(), [job.pk])
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, ImportJob.PENDING)
+
+        # Claimed before heartbeats existed: only started_at tells its age
+        claim_next_job()
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=None, started_at=old)
+        self.assertEqual(recover_stale_jobs(), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImportJob.FAILED, 2))
+
+
+class KeysetPaginationTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        # Three symbols share every date, so pages split rows of one date
+        for code in ('A', 'B', 'C'):
+            ingest_frame(rows(code, [10, 11, 12, 13]))
+        self.expected = list(StockData.objects.order_by('-date', '-id').values_list(
+            'id', flat=True))
+
+    def page(self, url):
+        data = self.client.get(url).json()
+        return [row['id'] for row in data['results']], data
+
+    def test_walk_forward_and_back(self):
+        url = '/api/stocks/?pagination=keyset&page_size=5'
+        forward = []
+        while url:
+            ids, data = self.page(url)
+            forward.append(ids)
+            url = data['next']
+        self.assertEqual([len(ids) for ids in forward], [5, 5, 2])
+        self.assertEqual(sum(forward, []), self.expected)
+
+        backward = []
+        url = data['previous']
+        while url:
+            ids, data = self.page(url)
+            backward.append(ids)
+            url = data['previous']
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_count_is_cached(self):
+        _, data = self.page('/api/stocks/?pagination=keyset&page_size=5&count=true')
+        self.assertEqual(data['count'], 12)
+        with CaptureQueriesContext(connection) as queries:
+            _, data = self.page(data['next'])
+        self.assertEqual(data['count'], 12)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+
+class IndicatorTests(CacheClearingTestCase):
+    SPEC = 'sma:5,ema:5,rsi:5,macd:3:6:2,bb:5'
+
+    def setUp(self):
+        super().setUp()
+        closes = (20 + 3 * np.sin(np.arange(40) / 3)).round(2).tolist()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_frame(rows('A', closes))
+
+    def compute(self):
+        return compute_indicators('A', parse_indicators(self.SPEC))
+
+    def recomputed(self):
+        cache.clear()
+        return self.compute()
+
+    def assertSameResult(self, result, expected):
+        self.assertEqual(result[0], expected[0])
+        self.assertEqual(result[1].keys(), expected[1].keys())
+        for name, values in expected[1].items():
+            np.testing.assert_allclose(
+                np.array(result[1][name], dtype=float), np.array(values, dtype=float),
+                rtol=1e-9, atol=1e-6, err_msg=name)
+
+    def test_appended_day_extends_the_cached_result(self):
+        self.compute()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_frame(rows('A', [21.5], start=date(2020, 2, 10)))
+        result = self.compute()
+        self.assertEqual(result[0][-1], '2020-02-10')
+        self.assertSameResult(result, self.recomputed())
+
+    def test_edited_past_row_drops_the_cached_result(self):
+        before = self.compute()
+        row = StockData.objects.get(trade_code='A', date=date(2020, 1, 10))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/stocks/{row.id}/', {'close': 25, 'high': 26},
+                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        result = self.compute()
+        self.assertNotEqual(result[1]['sma_5'], before[1]['sma_5'])
+        self.assertSameResult(result, self.recomputed())
+
+
+class ColumnarStoreTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = ColumnarStore(tmp.name)
+        ingest_frame(rows('A', [10, 11, 12]))
+        ingest_frame(rows('B', [20]))
+        self.assertEqual(self.store.build(), 2)
+
+    def test_range_reads(self):
+        df = self.store.read('A', date(2020, 1, 2), date(2020, 1, 3))
+        self.assertEqual(df['close'].tolist(), [11, 12])
+        self.assertIsNone(self.store.read('C'))
+
+    def test_write_makes_the_snapshot_stale_until_rebuilt(self):
+        ingest_frame(rows('A', [13], start=date(2020, 1, 4)))
+        self.assertIsNone(self.store.read('A'))
+        self.assertEqual(self.store.read('B')['close'].tolist(), [20])
+
+        self.assertEqual(self.store.build(changed_only=True), 1)
+        self.assertEqual(self.store.read('A')['close'].tolist(), [10, 11, 12, 13])
+
+    def test_catalog_refresh_alone_makes_the_snapshot_stale(self):
+        # An edit that keeps the row count and last date still moves updated_at
+        StockData.objects.filter(trade_code='A', date=date(2020, 1, 2)).update(close=11.5)
+        refresh_symbols(['A'])
+        self.assertIsNone(self.store.read('A'))
+        self.store.build(['A'], changed_only=True)
+        self.assertEqual(self.store.read('A')['close'].tolist(), [10, 11.5, 12])
+
+
+class BulkTests(CacheClearingTestCase):
+    url = '/api/stocks/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        ingest_frame(rows('A', [10, 11]))
+        self.first, self.second = StockData.objects.order_by('date')
+
+    def post(self, operations):
+        return self.client.post(self.url, operations, content_type='application/json')
+
+    def new_row(self, day, close=12):
+        return {'trade_code': 'A', 'date': day, 'high': close + 1, 'low': close - 1,
+                'open': close, 'close': close, 'volume': 100}
+
+    def test_batch_applies_every_operation(self):
+        etag = self.client.get(f'/api/stocks/{self.first.id}/')['ETag']
+        response = self.post([
+            {'op': 'create', 'data': self.new_row('2020-01-03')},
+            {'op': 'update', 'id': self.first.id, 'data': {'volume': 5}, 'if_match': etag},
+            {'op': 'delete', 'id': self.second.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.json()['results']], [201, 200, 204])
+        self.assertEqual(list(StockData.objects.order_by('date').values_list(
+            'date', 'volume')), [(date(2020, 1, 1), 5), (date(2020, 1, 3), 100)])
+
+    def test_stale_etag_rejects_the_batch(self):
+        response = self.post([
+            {'op': 'create', 'data': self.new_row('2020-01-03')},
+            {'op': 'update', 'id': self.first.id, 'data': {'volume': 5},
+             'if_match': '"not-the-current-version"'},
+        ])
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual([r['status'] for r in response.json()['results']], [424, 412])
+        self.assertEqual(StockData.objects.count(), 2)
+        self.assertEqual(StockData.objects.get(pk=self.first.id).volume, 100)
+
+    def test_taken_key_conflicts(self):
+        response = self.post([{'op': 'create', 'data': self.new_row('2020-01-02')}])
+        self.assertEqual(response.status_code, 409)
+        # A key freed by a delete in the same batch can be reused
+        response = self.post([
+            {'op': 'delete', 'id': self.second.id},
+            {'op': 'create', 'data': self.new_row('2020-01-02', close=20)},
+        ])
+        self.assertEqual(response.status_code, 200)
+
+    def test_empty_batch(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post({'op': 'delete'}).status_code, 400)
+
+
+class ChangeFeedTests(CacheClearingTestCase):
+    url = '/api/stocks/changes/'
+
+    def setUp(self):
+        super().setUp()
+        ingest_frame(rows('A', [10, 11]))
+        self.token = self.client.get(self.url).json()['token']
+
+    def test_updates_and_deletes_since_a_token(self):
+        first, second = StockData.objects.order_by('date')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/stocks/{first.id}/', {'volume': 7},
+                              content_type='application/json')
+            self.client.delete(f'/api/stocks/{second.id}/')
+
+        feed = self.client.get(self.url, {'since': self.token}).json()
+        self.assertEqual([(row['id'], row['volume']) for row in feed['upserts']],
+                         [(first.id, 7)])
+        self.assertEqual([(row['id'], row['date']) for row in feed['deletes']],
+                         [(second.id, '2020-01-02')])
+        self.assertFalse(feed['has_more'])
+
+        # Nothing new after the returned token
+        feed = self.client.get(self.url, {'since': feed['token']}).json()
+        self.assertEqual((feed['upserts'], feed['deletes']), ([], []))
+
+    def test_pruned_tombstones_force_a_resync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/stocks/{StockData.objects.first().id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('prune_change_log', days=0, stdout=io.StringIO())
+        self.assertFalse(StockDataTombstone.objects.exists())
+
+        response = self.client.get(self.url, {'since': self.token})
+        self.assertEqual(response.status_code, 410)
+        # A fresh token works again
+        token = self.client.get(self.url).json()['token']
+        self.assertEqual(self.client.get(self.url, {'since': token}).status_code, 200)
+
+
+class ParallelImportTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.paths = []
+        # One file per day, as daily feeds arrive
+        for day in range(5):
+            df = pd.concat([rows(code, [10 + day + i], start=date(2020, 1, 1 + day))
+                            for i, code in enumerate(['C', 'A', 'B'])])
+            if day == 2:
+                df.loc[df['trade_code'] == 'B', 'high'] = 0
+            path = os.path.join(tmp.name, f'day{day}.csv')
+            df.to_csv(path, index=False)
+            self.paths.append(path)
+
+    def imported(self, workers):
+        clear_stock_data()
+        ChangeCounter.objects.all().delete()
+        QuarantinedRow.objects.all().delete()
+        stats, reports = ingest_files(self.paths, workers=workers, chunksize=4)
+        self.assertEqual((stats.created, stats.invalid), (14, 1))
+        self.assertEqual([report['path'] for report in reports], self.paths)
+        return list(StockData.objects.order_by('id').values_list(
+            'id', 'seq', 'trade_code', 'date'))
+
+    def test_same_rows_with_any_number_of_workers(self):
+        self.assertEqual(self.imported(workers=2), self.imported(workers=1))
+
+
+class PriceMatrixTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_frame(rows('A', [10, 11, 10.5, 12, 12.5], start=date(2019, 12, 29)))
+        ingest_frame(rows('B', [20, 21, 22, 21, 23], start=date(2019, 12, 29)))
+        ingest_frame(rows('C', [5, 6], start=date(2020, 1, 2)))
+
+    def test_archived_rows_stay_in_the_matrix(self):
+        before = correlation_report(['A', 'B'])
+        self.assertEqual(len(before['dates']), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_before(date(2020, 1, 1))
+        self.assertEqual(correlation_report(['A', 'B']), before)
+
+    @override_settings(PRICE_MATRIX_MAX_SYMBOLS=2)
+    def test_least_recently_requested_symbols_are_dropped(self):
+        matrix = PriceMatrix()
+        for code in ('A', 'B', 'A', 'C'):
+            matrix.closes_for([code])
+        self.assertEqual(list(matrix.columns), ['A', 'C'])
+
+        # A single request may ask for more than the cap
+        dates, closes = matrix.closes_for(['A', 'B', 'C'])
+        self.assertEqual(list(matrix.columns), ['A', 'B', 'C'])
+        self.assertEqual(len(dates), 6)
+        self.assertEqual(closes[:5, 1].tolist(), [20, 21, 22, 21, 23])
+        self.assertEqual(closes[4:, 2].tolist(), [5, 6])
+
+
+class CatalogTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_frame(rows('A', [10, 12, 11, 11]))
+        untraded = rows('A', [11], start=date(2020, 1, 5))
+        untraded[['high', 'low', 'open', 'volume']] = 0
+        ingest_frame(untraded)
+        ingest_frame(untraded.assign(trade_code='B'))
+
+    def summaries(self):
+        return list(TradeCodeSummary.objects.values_list(
+            'trade_code', 'latest_close', 'high_52w', 'low_52w'))
+
+    def test_untraded_days_stay_out_of_the_52_week_range(self):
+        self.assertEqual(self.summaries(), [('A', 11, 13, 9), ('B', 11, 11, 11)])
+
+    def test_migration_agrees_with_refreshes(self):
+        refreshed = self.summaries()
+        migration = import_module('api.migrations.0010_populate_tradecodesummary')
+        migration.rebuild_catalog(apps, None)
+        self.assertEqual(self.summaries(), refreshed)
+
+
+class SnapshotTests(CacheClearingTestCase):
+    COLUMNS = ['id', 'date', 'trade_code', 'high', 'low', 'open', 'close', 'volume']
+
+    def setUp(self):
+        super().setUp()
+        ingest_frame(rows('A', [10, 11, 12]))
+        ingest_frame(rows('B', [20.25, 21.5]))
+        # A gap in the ids, which the restore must keep
+        StockData.objects.filter(trade_code='A', date=date(2020, 1, 2)).delete()
+
+    def indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, StockData._meta.db_table)
+        return {name: (c['columns'], c['unique']) for name, c in constraints.items()
+                if c['index']}
+
+    def test_round_trip(self):
+        before = list(StockData.objects.order_by('id').values_list(*self.COLUMNS))
+        indexes = self.indexes()
+        last_seq = StockData.objects.order_by('-seq').values_list('seq', flat=True)[0]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'snapshot.ndjson.gz')
+            self.assertEqual(dump_snapshot(path, chunk_size=2), 4)
+            clear_stock_data()
+            self.assertFalse(StockData.objects.exists())
+            with self.captureOnCommitCallbacks(execute=True):
+                count, _ = restore_snapshot(path, batch_size=3, chunk_size=2)
+
+        self.assertEqual(count, 4)
+        self.assertEqual(list(StockData.objects.order_by('id').values_list(*self.COLUMNS)),
+                         before)
+        self.assertEqual(self.indexes(), indexes)
+        # Every row gets a fresh seq past any token handed out before
+        ids, seqs = zip(*StockData.objects.order_by('id').values_list('id', 'seq'))
+        self.assertGreater(seqs[0], last_seq)
+        self.assertEqual([seq - seqs[0] for seq in seqs], [i - ids[0] for i in ids])
+        # New rows are numbered after the restored ones
+        ingest_frame(rows('C', [5]))
+        self.assertGreater(StockData.objects.get(trade_code='C').id, ids[-1])
+
+
+class ArchiveTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_frame(rows('A', [10, 11, 12], start=date(2019, 12, 30)))
+        ingest_frame(rows('B', [20, 21], start=date(2019, 12, 31)))
+
+    def archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive_before(date(2020, 1, 1))
+
+    def test_round_trip(self):
+        before = list(StockData.objects.order_by('id').values_list())
+        archived = self.archive()
+
+        self.assertEqual([row.name for row in archived], ['api_stockdataarchive_y2019'])
+        self.assertEqual(StockDataArchive.objects.count(), 3)
+        self.assertFalse(StockData.objects.filter(date__lt=date(2020, 1, 1)).exists())
+        # History reads still include archived rows
+        self.assertEqual(load_frame('A')['close'].tolist(), [10, 11, 12])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(restore_range(archived[0].name), 3)
+        after = list(StockData.objects.order_by('id').values_list())
+        # Restoring resets the change feed, so compare everything but seq
+        self.assertEqual([row[:-1] for row in after], [row[:-1] for row in before])
+        self.assertFalse(ArchivedRange.objects.exists())
+
+    def test_reimport_does_not_duplicate_archived_rows(self):
+        self.archive()
+        stats = ingest_frame(rows('A', [10, 11], start=date(2019, 12, 30)))
+        self.assertEqual(stats.created, 0)
+        self.assertEqual(stats.rejections, {'archived_range': 2})
+        self.assertEqual(QuarantinedRow.objects.filter(reasons='archived_range').count(), 2)
+
+        self.archive()
+        self.assertEqual(StockDataArchive.objects.count(), 3)
+        self.assertEqual(load_frame('A')['date'].dt.date.tolist(),
+                         [date(2019, 12, 30), date(2019, 12, 31), date(2020, 1, 1)])
+
+
+class MarketSnapshotTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_frame(rows('A', [10, 11]))
+
+    def test_day_without_trades_is_not_found(self):
+        for day in ['2030-01-01', '2019-06-01']:
+            response = self.client.get('/api/market/snapshot/', {'date': day})
+            self.assertEqual(response.status_code, 404)
+
+    def test_day_with_trades(self):
+        response = self.client.get('/api/market/snapshot/', {'date': '2020-01-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['top_gainers'][0]['trade_code'], 'A')
+
+
+class CacheInvalidationTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_frame(rows('A', [10, 11]))
+
+    def test_write_expires_cached_reads(self):
+        url = '/api/stocks/'
+        first = self.client.get(url, {'trade_code': 'A'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url, {'trade_code': 'A'})['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_frame(rows('A', [12], start=date(2020, 1, 3)))
+        second = self.client.get(url, {'trade_code': 'A'})
+        self.assertEqual(second['X-Cache'], 'MISS')
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.json()['count'], 3)
+
+    def test_catalog_follows_imports(self):
+        url = '/api/stocks/unique_trade_codes/'
+        self.assertEqual(self.client.get(url).json(), ['A'])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_frame(rows('B', [5]))
+        self.assertEqual(self.client.get(url).json(), ['A', 'B'])
+
+    def test_large_write_expires_everything_with_one_bump(self):
+        url = '/api/stocks/'
+        self.client.get(url, {'trade_code': 'A'})
+        code_version = cache.get(caching._code_key('A'))
+        with mock.patch.object(caching, 'MAX_TARGETED_BUMPS', 2), \
+                self.captureOnCommitCallbacks(execute=True):
+            ingest_frame(rows('A', [12, 13], start=date(2020, 1, 3)))
+        self.assertEqual(cache.get(caching._code_key('A')), code_version)
+        self.assertEqual(self.client.get(url, {'trade_code': 'A'})['X-Cache'], 'MISS')
+
+    def test_hits_and_misses_are_counted_in_process(self):
+        registry.reset()
+        url = '/api/stocks/'
+        for _ in range(3):
+            self.client.get(url, {'trade_code': 'A'})
+        self.assertEqual(self.client.get('/api/cache-stats/').json()['hits'], 2)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+
+class ResampleTests(TestCase):
+    def test_no_trade_days_only_count_towards_close_and_volume(self):
+        df = parsed(rows('A', [10, 11, 11, 11, 12, 13, 13, 13, 13]))
+        df['date'] = pd.to_datetime(df['date'])
+        df.loc[[2, 3, 6, 7, 8], ['high', 'low', 'open', 'volume']] = 0
+
+        bars = resample_ohlcv(df, '3D')
+        self.assertEqual(bars[['open', 'high', 'low', 'close', 'volume']].values.tolist(),
+                         [[10, 12, 9, 11, 200], [12, 14, 11, 13, 200], [13, 13, 13, 13, 0]])
+
+
+class SyntheticDataTests(TestCase):
+    def frame(self, **kwargs):
+        return next(synthetic_frames(20, 250, **kwargs))
+
+    def test_same_arguments_give_the_same_rows(self):
+        self.assertTrue(self.frame(seed=7).equals(self.frame(seed=7)))
+        self.assertFalse(self.frame(seed=7).equals(self.frame(seed=8)))
+
+    def test_rows_pass_validation(self):
+        df = self.frame(no_trade_ratio=0.2)
+        self.assertTrue((df['volume'] == 0).any())
+        self.assertFalse(find_problems(df, max_move=0.1).any(axis=1).any())
+
+    def test_limit(self):
+        frames = list(synthetic_frames(30, 100, chunk_rows=1000, limit=2500))
+        self.assertEqual([len(df) for df in frames], [1000, 1000, 500])
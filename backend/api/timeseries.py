@@ -0,0 +1,169 @@
+import re
+
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .archive import aarchived_frame, archived_frame
+from .columnar_store import read_columnar
+from .models import StockData
+from .validation import _no_trade
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# e.g. 5D (five trading days), 1W, 2W, 1M, 3M
+_INTERVAL = re.compile(r'^(\d+)([DWM])$')
+
+
+def _frame_queryset(trade_code, start_date, end_date):
+    queryset = StockData.objects.filter(trade_code=trade_code)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    return queryset.order_by('date')
+
+
+def _to_frame(rows):
+    df = pd.DataFrame.from_records(rows, columns=['date'] + OHLCV_COLUMNS)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def _with_archived(archived, df):
+    """Put archived rows in front of hot ones; a hot row wins a shared date."""
+    if archived is None:
+        return df
+    if df.empty:
+        return archived
+    df = pd.concat([archived, df], ignore_index=True)
+    return df.sort_values('date', kind='stable').drop_duplicates(
+        'date', keep='last').reset_index(drop=True)
+
+
+def load_frame(trade_code, start_date=None, end_date=None):
+    """
+    Fetch the daily rows of one trade code as a date-ordered DataFrame,
+    including rows api.archive has moved out of the hot table.
+    """
+    df = read_columnar(trade_code, start_date, end_date)
+    if df is None:
+        queryset = _frame_queryset(trade_code, start_date, end_date)
+        df = _to_frame(list(queryset.values_list('date', *OHLCV_COLUMNS)))
+    return _with_archived(archived_frame(trade_code, start_date, end_date), df)
+
+
+async def aload_frame(trade_code, start_date=None, end_date=None):
+    """load_frame for async views, reading rows with the async ORM."""
+    df = None
+    if settings.STOCK_READ_BACKEND == 'columnar':
+        df = await sync_to_async(read_columnar)(trade_code, start_date, end_date)
+    if df is None:
+        # values_list() runs its query before aiterator() can hand it to a
+        # thread, so the async path reads dicts
+        queryset = _frame_queryset(trade_code, start_date, end_date).values(
+            'date', *OHLCV_COLUMNS)
+        df = _to_frame([row async for row in queryset.aiterator()])
+    return _with_archived(
+        await aarchived_frame(trade_code, start_date, end_date), df)
+
+
+def parse_interval(interval):
+    """Split an interval such as '2W' into (2, 'W'), or raise ValueError."""
+    match = _INTERVAL.match((interval or '').strip().upper())
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(
+            "interval must look like 5D, 1W or 1M (N trading days, weeks or months)")
+    return int(match.group(1)), match.group(2)
+
+
+def resample_ohlcv(df, interval):
+    """
+    Aggregate daily rows into OHLCV bars.
+
+    Each bar takes the first open, highest high, lowest low, last close and
+    summed volume of its days, and is dated by its first trading day. D bars
+    count trading days; W and M bars follow the calendar. Days the symbol
+    did not trade (zero open/high/low, close carried forward) only count
+    towards the close and volume; a bar of nothing but such days is flat
+    at its close.
+    """
+    count, unit = parse_interval(interval)
+    if df.empty:
+        return df[['date'] + OHLCV_COLUMNS]
+
+    if unit == 'D':
+        keys = np.arange(len(df)) // count
+    elif unit == 'W':
+        weeks = df['date'].dt.to_period('W').astype('int64').to_numpy()
+        keys = (weeks - weeks[0]) // count
+    else:
+        months = df['date'].dt.to_period('M').astype('int64').to_numpy()
+        keys = (months - months[0]) // count
+
+    prices = df[['open', 'high', 'low']].mask(_no_trade(df), axis=0)
+    df = df.assign(open=prices['open'], high=prices['high'], low=prices['low'])
+    bars = df.groupby(keys, sort=True).agg(
+        date=('date', 'first'),
+        open=('open', 'first'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        close=('close', 'last'),
+        volume=('volume', 'sum'),
+    )
+    for column in ('open', 'high', 'low'):
+        bars[column] = bars[column].fillna(bars['close'])
+    return bars.reset_index(drop=True)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Pick threshold indices of (x, y) with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Every other bucket keeps the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket, which preserves peaks and troughs.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    bounds = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        if i + 2 < len(bounds):
+            next_start, next_end = bounds[i + 1], bounds[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_series(df, max_points):
+    """Reduce a daily frame to at most max_points rows using LTTB on close."""
+    if len(df) <= max_points:
+        return df
+    x = df['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    keep = lttb_indices(x, df['close'].to_numpy(), max_points)
+    return df.iloc[keep].reset_index(drop=True)
+
+
+def frame_to_records(df):
+    """Convert a frame with a datetime 'date' column into JSON-ready dicts."""
+    out = df.copy()
+    out['date'] = out['date'].dt.strftime('%Y-%m-%d')
+    return out.to_dict('records')
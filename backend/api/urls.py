@@ -1,12 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'stocks', views.StockDataViewSet)
+router.register(r'import-jobs', views.ImportJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('load-from-json/', views.load_data_from_json, name='load-from-json'),
     path('load-from-csv/', views.load_data_from_csv, name='load-from-csv'),
+    path('cache-stats/', views.response_cache_stats, name='cache-stats'),
+    path('market/snapshot/', views.market_snapshot, name='market-snapshot'),
+    path('stream/', views.stream_changes, name='stream'),
+    # Async twins of the hot read endpoints, for serving under ASGI
+    path('async/stocks/', async_views.stock_list, name='async-stock-list'),
+    path('async/stocks/catalog/', async_views.catalog, name='async-catalog'),
+    path('async/stocks/ohlcv/', async_views.ohlcv, name='async-ohlcv'),
+    path('async/stocks/series/', async_views.series, name='async-series'),
 ]
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ['high', 'low', 'open', 'close']
+# Rules in the order their names appear in a row's reasons
+RULES = ['unparseable', 'negative_price', 'negative_volume', 'price_range',
+         'duplicate', 'archived_range', 'price_jump']
+
+
+ANCHOR_COLUMNS = ['trade_code', 'date', 'close', 'streak', 'level']
+
+
+def _no_trade(df):
+    # The exchange reports untraded days with zero high/low/open and volume,
+    # carrying the previous close forward
+    return (df['volume'] == 0) & (df[['high', 'low', 'open']] == 0).all(axis=1)
+
+
+def _scan(dates, closes, anchor, max_move, max_streak):
+    """
+    Walk one symbol's traded rows in date order. Each row is compared with
+    the last accepted close; a rejected row leaves that close in place.
+    Once max_streak rows in a row have been rejected, rows are compared
+    with the latest rejected close instead, so the check follows a real
+    change of level. Returns the rejected mask and the final anchor.
+    """
+    rejected = np.zeros(len(closes), dtype=bool)
+    day, close, streak, level = anchor
+    for i in range(len(closes)):
+        base = level if max_streak and streak >= max_streak else close
+        if base is not None and base > 0 and abs(closes[i] / base - 1) > max_move:
+            rejected[i] = True
+            streak, level = streak + 1, closes[i]
+        else:
+            day, close, streak, level = dates[i], closes[i], 0, None
+    return rejected, (day, close, streak, level)
+
+
+def _jumps(df, previous, max_move, max_streak):
+    """
+    Flag traded rows whose close moved more than max_move (a fraction)
+    from the symbol's last accepted traded close.
+
+    previous holds each symbol's anchor from earlier data, a frame of
+    ANCHOR_COLUMNS: the date and close of its last accepted traded row,
+    how many traded rows since were rejected (streak) and the close of
+    the latest of those (level). An anchor only applies when it is older
+    than the symbol's first row here. Returns the mask and the anchors as
+    the rows leave them.
+    """
+    traded = df[~_no_trade(df)].sort_values(['trade_code', 'date'], kind='stable')
+    anchors = {}
+    if previous is not None:
+        anchors = {row[0]: row[1:] for row in previous[ANCHOR_COLUMNS].itertuples(
+            index=False, name=None)}
+    rejected = np.zeros(len(traded), dtype=bool)
+    codes = traded['trade_code'].to_numpy()
+    dates = traded['date'].to_numpy()
+    closes = traded['close'].to_numpy(dtype='float64')
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else []
+    ends = list(starts[1:]) + [len(codes)]
+    result = []
+    for lo, hi in zip(starts, ends):
+        code = codes[lo]
+        anchor = anchors.get(code)
+        if anchor is None or anchor[0] is None or not anchor[0] < dates[lo]:
+            anchor = (None, None, 0, None)
+        day, close, streak, level = anchor
+        if not streak:
+            # Usually nothing moves too far, and comparing each row with the
+            # one before is then the same as the walk below
+            before = np.r_[close if close else np.nan, closes[lo:hi - 1]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                move = np.abs(closes[lo:hi] / before - 1)
+            if not (move > max_move).any():
+                result.append((code, dates[hi - 1], closes[hi - 1], 0, None))
+                continue
+        rejected[lo:hi], anchor = _scan(dates[lo:hi], closes[lo:hi], anchor,
+                                        max_move, max_streak)
+        result.append((code,) + anchor)
+    mask = pd.Series(rejected, index=traded.index).reindex(df.index, fill_value=False)
+    return mask, pd.DataFrame.from_records(result, columns=ANCHOR_COLUMNS)
+
+
+def find_problems(df, previous=None, max_move=0, max_streak=0):
+    """
+    Run the data-quality rules over a parsed frame of stock rows.
+
+    Every rule is a vectorized mask over the whole frame. Returns a frame
+    of booleans with one column per entry in RULES; a row is rejected if
+    any of its columns is set. Duplicates and jumps are only looked for
+    among rows that passed the other rules, so a bad first copy of a row
+    does not shadow a good second one. max_move of 0 leaves the jump
+    check out; add_jumps can run it later.
+    """
+    problems = pd.DataFrame(False, index=df.index, columns=RULES)
+    unparseable = df.isna().any(axis=1) | (df['trade_code'] == '')
+    problems['unparseable'] = unparseable
+
+    prices = df[PRICE_COLUMNS]
+    negative = (prices < 0).any(axis=1)
+    problems['negative_price'] = negative & ~unparseable
+    problems['negative_volume'] = (df['volume'] < 0) & ~unparseable
+
+    body_low = df[['open', 'close']].min(axis=1)
+    body_high = df[['open', 'close']].max(axis=1)
+    in_range = (df['low'] > 0) & (df['low'] <= body_low) & (body_high <= df['high'])
+    problems['price_range'] = ~(in_range | _no_trade(df)) & ~(unparseable | negative)
+
+    ok = ~problems.any(axis=1)
+    problems['duplicate'] = df[ok].duplicated(
+        ['trade_code', 'date']).reindex(df.index, fill_value=False)
+    add_jumps(df, problems, previous, max_move, max_streak)
+    return problems
+
+
+def add_jumps(df, problems, previous, max_move, max_streak=0):
+    """
+    Fill in the price_jump column of a problems frame from find_problems,
+    looking only at rows no other rule rejected. Splitting this out lets
+    the rules that need no stored data run elsewhere, before previous is
+    known. max_move of 0 disables the check; max_streak of 0 never lets
+    it follow a new level. Returns the symbols' anchors after df, to pass
+    as previous for the data that follows, or None when disabled.
+    """
+    if not max_move:
+        return None
+    ok = ~problems.drop(columns='price_jump').any(axis=1)
+    jumps, anchors = _jumps(df[ok], previous, max_move, max_streak)
+    problems['price_jump'] = jumps.reindex(df.index, fill_value=False)
+    return anchors
+
+
+def describe(problems):
+    """Comma separated rule names for each rejected row of a problems frame."""
+    rejected = problems[problems.any(axis=1)]
+    # bool * str keeps the name where the rule fired and '' elsewhere
+    return rejected.dot(rejected.columns + ',').str.rstrip(',')
+
+
+def count_reasons(problems):
+    """Number of rows each rule rejected, leaving out rules that never fired."""
+    counts = problems.sum()
+    return {rule: int(count) for rule, count in counts.items() if count}
@@ -1,87 +1,416 @@
-from django.shortcuts import render
-import json
+from datetime import date
 import pandas as pd
-from django.http import JsonResponse
-from rest_framework import viewsets, status
+from django.shortcuts import render
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.urls import reverse
+from django.utils.http import quote_etag
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
-from .models import StockData
-from .serializers import StockDataSerializer
+from rest_framework.settings import api_settings
+from .bulk import apply_operations, row_etag
+from .caching import cache_stats, cached_read, invalidate
+from .catalog import get_catalog, refresh_symbols
+from .changes import (ResyncRequired, allocate_seqs, changes_since,
+                      current_token, record_deletes)
+from .indicators import (compute_indicators, invalidate_backfills,
+                         invalidate_history, parse_indicators)
+from .jobs import enqueue_import
+from .market import latest_trading_date
+from .matrix import correlation_report
+from .market import market_snapshot as build_market_snapshot
+from .models import ImportJob, QuarantinedRow, StockData
+from .pagination import KeysetPagination, StockPageNumberPagination
+from .renderers import (COLUMNAR_FIELDS, ColumnarJSONRenderer, is_columnar,
+                        rows_to_columns)
+from .serializers import (BulkOperationSerializer, ImportJobSerializer,
+                          QuarantinedRowSerializer, StockDataSerializer)
+from .streaming import stream_events
+from .timeseries import (downsample_series, frame_to_records, load_frame,
+                         resample_ohlcv)
 
 # Create your views here.
 
 
+def _date_param(request, name):
+    """Parse an optional YYYY-MM-DD query parameter."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise serializers.ValidationError(
+            {name: 'Date must be in YYYY-MM-DD format.'})
+
+
 class StockDataViewSet(viewsets.ModelViewSet):
     """
     API viewset for CRUD operations on StockData.
     """
     queryset = StockData.objects.all().order_by('-date')
     serializer_class = StockDataSerializer
+    pagination_class = StockPageNumberPagination
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarJSONRenderer]
+
+    @property
+    def paginator(self):
+        """Use keyset pagination when a cursor or ?pagination=keyset is given."""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if 'cursor' in params or params.get('pagination') == 'keyset':
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
-        queryset = StockData.objects.all().order_by('-date')
+        # (date, id) gives a stable order that the composite indexes serve
+        queryset = StockData.objects.all().order_by('-date', '-id')
 
         # Filter by trade_code if provided
         trade_code = self.request.query_params.get('trade_code')
         if trade_code:
             queryset = queryset.filter(trade_code=trade_code)
 
+        # Filter by date range if provided
+        start_date = _date_param(self.request, 'start_date')
+        if start_date:
+            queryset = queryset.filter(date__gte=start_date)
+        end_date = _date_param(self.request, 'end_date')
+        if end_date:
+            queryset = queryset.filter(date__lte=end_date)
+
         return queryset
 
+    def _data_changed(self, trade_codes, dates):
+        refresh_symbols(trade_codes)
+        invalidate(trade_codes, dates)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            # Appending a new day keeps cached indicators; back-filling doesn't
+            invalidate_backfills(pd.DataFrame([{
+                'trade_code': serializer.validated_data['trade_code'],
+                'date': serializer.validated_data['date'],
+            }]))
+            instance = serializer.save(seq=allocate_seqs())
+            self._data_changed([instance.trade_code], [instance.date])
+
+    def perform_update(self, serializer):
+        old_trade_code = serializer.instance.trade_code
+        old_date = serializer.instance.date
+        with transaction.atomic():
+            instance = serializer.save(seq=allocate_seqs())
+            invalidate_history({old_trade_code, instance.trade_code})
+            self._data_changed({old_trade_code, instance.trade_code},
+                               {old_date, instance.date})
+
+    def perform_destroy(self, instance):
+        trade_code = instance.trade_code
+        day = instance.date
+        with transaction.atomic():
+            record_deletes([instance])
+            instance.delete()
+            invalidate_history([trade_code])
+            self._data_changed([trade_code], [day])
+
+    @cached_read
+    def list(self, request, *args, **kwargs):
+        if not is_columnar(request):
+            return super().list(request, *args, **kwargs)
+
+        # Bulk read path: plain tuples into per-field arrays, no serializer
+        queryset = self.filter_queryset(self.get_queryset()).values_list(
+            *COLUMNAR_FIELDS, named=True)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        columns = rows_to_columns(rows)
+        if page is not None:
+            return self.get_paginated_response(columns)
+        return Response(columns)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Get one row. Its ETag is the row's version, which bulk updates and
+        deletes accept as "if_match"; If-None-Match with it answers 304.
+        """
+        instance = self.get_object()
+        etag = quote_etag(row_etag(instance))
+        tags = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+        if etag in tags or '*' in tags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag
+        return response
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Apply a list of create/update/delete operations in one transaction.
+
+        Each item is {"op": "create", "data": {...}}, {"op": "update", "id":
+        1, "data": {...}} or {"op": "delete", "id": 1}. Updates and deletes
+        may pass "if_match" with the row's etag, as returned by retrieve or
+        an earlier bulk call; the batch is rejected with 412 if the row
+        changed since.
+        """
+        serializer = BulkOperationSerializer(
+            data=request.data, many=True, allow_empty=False,
+            max_length=settings.BULK_MAX_OPERATIONS)
+        serializer.is_valid(raise_exception=True)
+        results, status_code = apply_operations(serializer.validated_data)
+        return Response({'results': results}, status=status_code)
+
     @action(detail=False, methods=['get'])
+    @cached_read
     def unique_trade_codes(self, request):
         """Get all unique trade codes for dropdown."""
-        trade_codes = StockData.objects.values_list(
-            'trade_code', flat=True).distinct()
-        return Response(list(trade_codes))
+        return Response([row['trade_code'] for row in get_catalog()])
+
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def catalog(self, request):
+        """Get every trade code with its date span, row count and 52-week range."""
+        return Response(get_catalog())
+
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def ohlcv(self, request):
+        """Get OHLCV bars for one trade code, e.g. ?trade_code=X&interval=1W."""
+        trade_code = request.query_params.get('trade_code')
+        interval = request.query_params.get('interval', '1W')
+        if not trade_code:
+            return Response({'error': 'trade_code is required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            df = load_frame(trade_code,
+                            _date_param(request, 'start_date'),
+                            _date_param(request, 'end_date'))
+            bars = resample_ohlcv(df, interval)
+        except ValueError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'trade_code': trade_code,
+            'interval': interval.upper(),
+            'bars': frame_to_records(bars),
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def indicators(self, request):
+        """Get technical indicators, e.g. ?trade_code=X&ind=sma:20,rsi:14,macd."""
+        trade_code = request.query_params.get('trade_code')
+        if not trade_code:
+            return Response({'error': 'trade_code is required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            indicators = parse_indicators(request.query_params.get('ind'))
+        except ValueError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dates, values = compute_indicators(
+            trade_code, indicators,
+            _date_param(request, 'start_date'),
+            _date_param(request, 'end_date'))
+        return Response({
+            'trade_code': trade_code,
+            'indicators': [indicator.key for indicator in indicators],
+            'dates': dates,
+            'values': values,
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def correlation(self, request):
+        """Get aligned returns and correlations, e.g. ?trade_codes=A,B,C&window=20."""
+        trade_codes = list(dict.fromkeys(
+            code.strip() for code in
+            request.query_params.get('trade_codes', '').split(',') if code.strip()))
+        try:
+            if len(trade_codes) < 2:
+                raise ValueError('trade_codes needs at least two codes')
+            if len(trade_codes) > settings.CORRELATION_MAX_SYMBOLS:
+                raise ValueError(
+                    f'At most {settings.CORRELATION_MAX_SYMBOLS} trade_codes')
+            known = {row['trade_code'] for row in get_catalog()}
+            unknown = [code for code in trade_codes if code not in known]
+            if unknown:
+                raise ValueError(f"Unknown trade_codes: {', '.join(unknown)}")
+            window = int(request.query_params.get('window', 20))
+            if window < 2:
+                raise ValueError('window must be at least 2')
+        except ValueError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(correlation_report(
+            trade_codes,
+            _date_param(request, 'start_date'),
+            _date_param(request, 'end_date'),
+            window))
+
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def series(self, request):
+        """Get a downsampled close/volume series for charting one trade code."""
+        trade_code = request.query_params.get('trade_code')
+        if not trade_code:
+            return Response({'error': 'trade_code is required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            max_points = int(request.query_params.get(
+                'max_points', settings.SERIES_DEFAULT_POINTS))
+            if max_points < 3:
+                raise ValueError('max_points must be at least 3')
+            max_points = min(max_points, settings.SERIES_MAX_POINTS)
+            df = load_frame(trade_code,
+                            _date_param(request, 'start_date'),
+                            _date_param(request, 'end_date'))
+        except ValueError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        points = downsample_series(df[['date', 'close', 'volume']], max_points)
+        return Response({
+            'trade_code': trade_code,
+            'total_points': len(df),
+            'points': frame_to_records(points),
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def changes(self, request):
+        """
+        Get the rows inserted, updated and deleted since a change token.
+
+        Without since, only the current token is returned: take it before a
+        full load, then poll with since=<token> for what changed. Answers
+        410 when the token is too old to be served incrementally.
+        """
+        if 'since' not in request.query_params:
+            return Response({'token': current_token()['value']})
+        trade_code = request.query_params.get('trade_code')
+        try:
+            since = int(request.query_params['since'])
+            limit = int(request.query_params.get('limit', settings.MAX_PAGE_SIZE))
+            if since < 0 or limit < 1:
+                raise ValueError('since must be >= 0 and limit >= 1')
+        except ValueError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(changes_since(
+                since, min(limit, settings.MAX_PAGE_SIZE),
+                [trade_code] if trade_code else None))
+        except ResyncRequired as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API viewset reporting the progress of background imports.
+    """
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+
+    @action(detail=True, methods=['get'])
+    def quarantine(self, request, pk=None):
+        """Rows of the job's file that failed validation, with the reasons."""
+        job = self.get_object()
+        rows = QuarantinedRow.objects.filter(source=job.source)
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(
+            QuarantinedRowSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+def market_snapshot(request):
+    """Get top gainers, losers, most traded and breadth for ?date=YYYY-MM-DD."""
+    day = _date_param(request, 'date') or latest_trading_date()
+    if day is None:
+        return Response({'error': 'No stock data loaded'},
+                        status=status.HTTP_404_NOT_FOUND)
+    try:
+        top = int(request.query_params.get('top', 10))
+        if not 1 <= top <= 100:
+            raise ValueError('top must be between 1 and 100')
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    snapshot = build_market_snapshot(day, top)
+    if snapshot is None:
+        return Response({'error': f'No trades on {day.isoformat()}'},
+                        status=status.HTTP_404_NOT_FOUND)
+    snapshot = dict(snapshot)
+    # The per-symbol table is large; only send it when asked for
+    if request.query_params.get('all', '').lower() not in ('1', 'true'):
+        snapshot.pop('all')
+    return Response(snapshot)
+
+
+@api_view(['GET'])
+def response_cache_stats(request):
+    """Get hit/miss counters of the read response cache in this worker process."""
+    return Response(cache_stats())
+
+
+async def stream_changes(request):
+    """
+    Push new, changed and deleted rows as Server-Sent Events.
+
+    ?trade_codes=A,B limits the stream to those symbols. Reconnecting
+    clients resume from their Last-Event-ID (or ?since=<token>). Needs the
+    ASGI application; a WSGI worker cannot hold the stream open.
+    """
+    trade_codes = list(dict.fromkeys(
+        code.strip() for code in
+        request.GET.get('trade_codes', '').split(',') if code.strip()))
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({'error': 'since must be a change token'},
+                                status=status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(stream_events(trade_codes, since),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _queue_import(request, path):
+    job, created = enqueue_import(path)
+    data = ImportJobSerializer(job).data
+    data['status_url'] = request.build_absolute_uri(
+        reverse('importjob-detail', args=[job.pk]))
+    data['message'] = 'Import queued' if created else 'Import already in progress'
+    return Response(data, status=status.HTTP_202_ACCEPTED)
 
 
 @api_view(['POST'])
 def load_data_from_json(request):
-    """Load data from JSON file into the database."""
+    """Queue a background import of the JSON file into the database."""
     try:
-        with open('../dataset/stock_market_data.json', 'r') as file:
-            data = json.load(file)
-
-        count = 0
-        for item in data:
-            # Convert volume string to integer (remove commas)
-            if isinstance(item['volume'], str):
-                item['volume'] = int(item['volume'].replace(',', ''))
-
-            # Check if record already exists
-            if not StockData.objects.filter(trade_code=item['trade_code'], date=item['date']).exists():
-                serializer = StockDataSerializer(data=item)
-                if serializer.is_valid():
-                    serializer.save()
-                    count += 1
-
-        return JsonResponse({'message': f'Successfully loaded {count} new records'})
+        return _queue_import(request, '../dataset/stock_market_data.json')
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
 
 @api_view(['POST'])
 def load_data_from_csv(request):
-    """Load data from CSV file into the database."""
+    """Queue a background import of the CSV file into the database."""
     try:
-        df = pd.read_csv('../dataset/stock_market_data.csv')
-
-        # Convert volume strings to integers
-        df['volume'] = df['volume'].apply(lambda x: int(
-            str(x).replace(',', '')) if isinstance(x, str) else x)
-
-        count = 0
-        for _, row in df.iterrows():
-            data = row.to_dict()
-
-            # Check if record already exists
-            if not StockData.objects.filter(trade_code=data['trade_code'], date=data['date']).exists():
-                serializer = StockDataSerializer(data=data)
-                if serializer.is_valid():
-                    serializer.save()
-                    count += 1
-
-        return JsonResponse({'message': f'Successfully loaded {count} new records'})
+        return _queue_import(request, '../dataset/stock_market_data.csv')
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stockmarket_project.settings')
+# Persistent DB connections leak under ASGI; close them after each request
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -52,8 +52,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',  # Per-view timings for /metrics; keep first
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
+    'api.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files (async-capable)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.middleware.common.CommonMiddleware',
@@ -94,11 +95,47 @@ DATABASES = {
     }
 }
 
-# Use PostgreSQL on Render
+# Use PostgreSQL on Render. Connections persist between requests unless
+# CONN_MAX_AGE says otherwise; asgi.py sets it to 0, since under ASGI they
+# are held per thread or async context and leak
 DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
     DATABASES['default'] = dj_database_url.config(
-        default=DATABASE_URL, conn_max_age=600)
+        default=DATABASE_URL, conn_max_age=int(os.environ.get('CONN_MAX_AGE', 600)))
+
+
+# Cache used for read responses, the trade code catalog and the version
+# counters that expire them. Writes made by one process (management
+# commands included) must reach every web worker, so the default 'file'
+# cache is shared by all processes on the host; use 'redis' (needs the
+# redis package) across hosts. 'locmem' is private to each process and
+# only suits a single process such as the development server.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'file')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.file_cache.FileCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / '.cache'),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Lifetime of cached read responses; writes expire them sooner via versions
+RESPONSE_CACHE_SECONDS = int(os.environ.get('RESPONSE_CACHE_SECONDS', 300))
 
 
 # Password validation
@@ -164,3 +201,84 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,  # Adjust based on your needs
 }
+
+# Largest page_size a client may request from the stocks list
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+COLUMNAR_MAX_PAGE_SIZE = int(os.environ.get('COLUMNAR_MAX_PAGE_SIZE', 20000))
+
+# How long keyset pagination caches the optional total count
+STOCK_COUNT_CACHE_SECONDS = int(os.environ.get('STOCK_COUNT_CACHE_SECONDS', 60))
+
+# Number of rows written per bulk_create batch by the importers in api/ingest.py
+STOCK_IMPORT_BATCH_SIZE = int(os.environ.get('STOCK_IMPORT_BATCH_SIZE', 1000))
+
+# Rows read per chunk (and committed per checkpoint) by the streaming importers
+STOCK_IMPORT_CHUNK_SIZE = int(os.environ.get('STOCK_IMPORT_CHUNK_SIZE', 10000))
+
+# How queued import jobs run: 'thread' uses an in-process pool, 'worker'
+# leaves them for `python manage.py process_import_jobs`
+STOCK_IMPORT_JOB_RUNNER = os.environ.get('STOCK_IMPORT_JOB_RUNNER', 'thread')
+STOCK_IMPORT_THREADS = int(os.environ.get('STOCK_IMPORT_THREADS', 1))
+# A running job that has not reported progress for this many seconds is
+# taken to have died with its process and is queued again, resuming from
+# its checkpoint; after this many attempts it is marked failed instead
+STOCK_IMPORT_JOB_TIMEOUT = int(os.environ.get('STOCK_IMPORT_JOB_TIMEOUT', 300))
+STOCK_IMPORT_JOB_MAX_ATTEMPTS = int(os.environ.get('STOCK_IMPORT_JOB_MAX_ATTEMPTS', 3))
+
+# Imported rows whose close moves more than this fraction from the symbol's
+# previous traded close are quarantined as implausible; 0 turns the check off
+STOCK_IMPORT_MAX_DAILY_MOVE = float(os.environ.get('STOCK_IMPORT_MAX_DAILY_MOVE', 0.5))
+# After this many of a symbol's rows in a row are rejected as jumps, later
+# rows are compared with the latest rejected close, so a real change of
+# level (a split, say) is only rejected this many times; 0 never follows
+STOCK_IMPORT_JUMP_STREAK = int(os.environ.get('STOCK_IMPORT_JUMP_STREAK', 3))
+
+# Point budget for /api/stocks/series/ (default and upper bound for max_points)
+SERIES_DEFAULT_POINTS = int(os.environ.get('SERIES_DEFAULT_POINTS', 500))
+SERIES_MAX_POINTS = int(os.environ.get('SERIES_MAX_POINTS', 5000))
+
+# Calendar days searched back for a symbol's previous close in market snapshots
+SNAPSHOT_LOOKBACK_DAYS = int(os.environ.get('SNAPSHOT_LOOKBACK_DAYS', 14))
+
+# Largest number of trade codes accepted by /api/stocks/correlation/
+CORRELATION_MAX_SYMBOLS = int(os.environ.get('CORRELATION_MAX_SYMBOLS', 100))
+
+# Largest number of operations accepted by one /api/stocks/bulk/ request
+BULK_MAX_OPERATIONS = int(os.environ.get('BULK_MAX_OPERATIONS', 1000))
+
+# Days delete tombstones are kept for /api/stocks/changes/ by
+# `python manage.py prune_change_log`; clients that sync less often resync
+CHANGE_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('CHANGE_TOMBSTONE_RETENTION_DAYS', 30))
+
+# Backend for per-symbol history reads (series, ohlcv, indicators): 'orm', or
+# 'columnar' to serve memory-mapped snapshots written by
+# `python manage.py build_columnar_store`, falling back to the ORM for
+# symbols changed since their snapshot
+STOCK_READ_BACKEND = os.environ.get('STOCK_READ_BACKEND', 'orm')
+COLUMNAR_STORE_DIR = os.environ.get('COLUMNAR_STORE_DIR', BASE_DIR / 'columnar_store')
+
+# Symbols the correlation endpoint's in-process price matrix keeps; the
+# least recently used are dropped beyond this
+PRICE_MATRIX_MAX_SYMBOLS = int(os.environ.get('PRICE_MATRIX_MAX_SYMBOLS', 200))
+
+# Where `python manage.py archive_stock_data` writes the compressed columnar
+# files of StockData partitions it detaches (PostgreSQL only)
+STOCK_ARCHIVE_DIR = os.environ.get('STOCK_ARCHIVE_DIR', BASE_DIR / 'stock_archive')
+
+# Pub/sub behind /api/stream/: 'local' fans out within one process, 'redis'
+# (using REDIS_URL) across processes; a dotted path selects a custom broker
+STREAM_BROKER = os.environ.get('STREAM_BROKER', 'local')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1')
+# Seconds between keepalive comments, and messages buffered per slow client
+STREAM_HEARTBEAT_SECONDS = int(os.environ.get('STREAM_HEARTBEAT_SECONDS', 15))
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 100))
+
+# Request metrics (api.metrics): log SQL statements slower than this many
+# milliseconds (0 disables), send timings to clients in a Server-Timing
+# header (by default only with DEBUG, as it exposes DB time and query
+# counts), and require "Authorization: Bearer <token>" on /metrics. With no
+# token, /metrics is only served with DEBUG on.
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 0))
+SERVER_TIMING_HEADER = os.environ.get(
+    'SERVER_TIMING_HEADER', str(DEBUG)).lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')